@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Arrival detection for S3 targets.
+
+The scripts used to poll HeadObject every POLL_INTERVAL_SECONDS and require
+several stable polls, which put a 30-40s floor under every measured
+pipeline latency and burned API calls while waiting.
+
+wait_for_s3_object combines two sources:
+- S3 event notifications delivered to an SQS queue (directly, via SNS, or
+  via EventBridge), consumed with long polling. An ObjectCreated event for
+  the key is accepted once one HeadObject confirms the expected size and
+  the event's ETag, so completion is declared as soon as S3 reports it.
+- HeadObject polling with exponential backoff and jitter, as a fallback for
+  missed or unconfigured notifications. Polls stop once the object reports
+  the expected size with the same ETag for `stable_polls` polls.
+wait_for_s3_object_async is the same wait as a coroutine, for e2e_runner:
+requests run on poll executors and backoff sleeps are asyncio sleeps.
+
+Both cost requests per waiting file. When many probes wait at once that
+becomes N x HEAD and ends in 503 SlowDown, so BatchWaiter resolves every
+registered (bucket, key or filename, size) from periodic ListObjectsV2
+sweeps of the shared discovery index instead: requests scale with the
+number of prefixes, and each caller waits on a Future.
+"""
+
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Generator, Iterator, List, Optional
+from urllib.parse import unquote_plus
+
+import botocore
+
+from e2e_discovery import DiscoveryIndex, ObjectInfo, get_discovery_index
+from e2e_limits import endpoint_io, s3_endpoint
+
+LOG = logging.getLogger("e2e-arrival")
+
+DEFAULT_POLL_INITIAL_SECONDS = 0.5
+DEFAULT_POLL_MAX_SECONDS = 10.0
+DEFAULT_SQS_WAIT_SECONDS = 20  # SQS long-poll maximum
+DEFAULT_SWEEP_INTERVAL_SECONDS = 5.0
+
+_MISSING_CODES = ("404", "NoSuchKey", "NotFound")
+
+
+@dataclass
+class Arrival:
+    key: str
+    size: int
+    etag: str
+    source: str     # "event", "poll" or "sweep"
+    seconds: float
+    head_calls: int
+    sqs_receives: int
+    first_seen_seconds: Optional[float] = None  # key first visible (any size); None if not observed
+
+
+@dataclass
+class S3Event:
+    bucket: str
+    key: str
+    size: Optional[int]
+    etag: Optional[str]
+
+
+def backoff_delays(initial: float = DEFAULT_POLL_INITIAL_SECONDS,
+                   maximum: float = DEFAULT_POLL_MAX_SECONDS,
+                   factor: float = 2.0) -> Iterator[float]:
+    """Exponential backoff with equal jitter: each delay is in [d/2, d]."""
+    delay = max(0.01, initial)
+    while True:
+        yield delay / 2 + random.uniform(0, delay / 2)
+        delay = min(maximum, delay * factor)
+
+
+# -----------------------------
+# S3 event notifications
+# -----------------------------
+def parse_s3_events(body: str) -> List[S3Event]:
+    """
+    ObjectCreated events in an SQS message body. Handles S3 -> SQS, S3 -> SNS
+    -> SQS (raw or wrapped) and EventBridge "Object Created" payloads; test
+    events and anything else yield [].
+    """
+    try:
+        msg = json.loads(body)
+    except (TypeError, ValueError):
+        return []
+    if isinstance(msg, dict) and "Message" in msg and "Records" not in msg:
+        try:
+            msg = json.loads(msg["Message"])  # SNS envelope
+        except (TypeError, ValueError):
+            return []
+    if not isinstance(msg, dict):
+        return []
+
+    events: List[S3Event] = []
+    if msg.get("detail-type") == "Object Created":
+        detail = msg.get("detail") or {}
+        obj = detail.get("object") or {}
+        events.append(S3Event(
+            bucket=(detail.get("bucket") or {}).get("name", ""),
+            key=obj.get("key", ""),
+            size=obj.get("size"),
+            etag=obj.get("etag"),
+        ))
+        return events
+
+    for rec in msg.get("Records") or []:
+        if not str(rec.get("eventName", "")).startswith("ObjectCreated:"):
+            continue
+        s3 = rec.get("s3") or {}
+        obj = s3.get("object") or {}
+        events.append(S3Event(
+            bucket=(s3.get("bucket") or {}).get("name", ""),
+            # Keys in S3 notifications are URL-encoded with '+' for spaces.
+            key=unquote_plus(obj.get("key", "")),
+            size=obj.get("size"),
+            etag=obj.get("eTag"),
+        ))
+    return events
+
+
+def _receive_matching(sqs, queue_url: str, bucket: str, key: str, wait_seconds: int) -> List[S3Event]:
+    """
+    One long poll. Messages about our key are deleted; others are made
+    visible again right away so that other waiters on the queue see them.
+    A queue dedicated to the test prefix keeps that re-delivery churn low.
+    """
+    resp = sqs.receive_message(
+        QueueUrl=queue_url,
+        MaxNumberOfMessages=10,
+        WaitTimeSeconds=max(0, min(DEFAULT_SQS_WAIT_SECONDS, int(wait_seconds))),
+    )
+    matched: List[S3Event] = []
+    consumed, released = [], []
+    for i, m in enumerate(resp.get("Messages") or []):
+        hits = [e for e in parse_s3_events(m.get("Body", "")) if e.bucket == bucket and e.key == key]
+        entry = {"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]}
+        if hits:
+            matched.extend(hits)
+            consumed.append(entry)
+        else:
+            released.append(dict(entry, VisibilityTimeout=0))
+    if consumed:
+        sqs.delete_message_batch(QueueUrl=queue_url, Entries=consumed)
+    if released:
+        sqs.change_message_visibility_batch(QueueUrl=queue_url, Entries=released)
+    return matched
+
+
+# -----------------------------
+# Waiter
+# -----------------------------
+def _head(s3, bucket: str, key: str) -> Optional[dict]:
+    try:
+        return s3.head_object(Bucket=bucket, Key=key)
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in _MISSING_CODES:
+            return None
+        raise
+
+
+def _etag(meta_or_event_etag: Optional[str]) -> str:
+    return (meta_or_event_etag or "").strip('"')
+
+
+def _arrival_steps(bucket: str,
+                   key: str,
+                   expected_size: int,
+                   timeout_seconds: float,
+                   expected_etag: Optional[str],
+                   events: bool,
+                   stable_polls: int,
+                   poll_initial_seconds: float,
+                   poll_max_seconds: float) -> Generator[tuple, object, Arrival]:
+    """
+    The waiting logic of wait_for_s3_object, without the I/O: yields
+    ("head",) for HeadObject metadata (or None), ("receive", seconds) for
+    matching S3Events and ("sleep", seconds), and returns the Arrival. The
+    sync and asyncio drivers below perform the steps.
+    """
+    start = time.monotonic()
+    deadline = start + timeout_seconds
+    delays = backoff_delays(poll_initial_seconds, poll_max_seconds)
+    next_poll = start
+    head_calls = receives = 0
+    stable = 0
+    last_etag = None
+    first_seen = None
+
+    def done(size: int, etag: str, source: str) -> Arrival:
+        elapsed = time.monotonic() - start
+        LOG.info("S3 object arrived via %s after %.2fs: s3://%s/%s size=%d etag=%s (head=%d sqs=%d)",
+                 source, elapsed, bucket, key, size, etag, head_calls, receives)
+        return Arrival(key, size, etag, source, elapsed, head_calls, receives,
+                       first_seen if first_seen is not None else elapsed)
+
+    def matches(size: Optional[int], etag: str) -> bool:
+        return size == expected_size and (not expected_etag or etag == _etag(expected_etag))
+
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            raise TimeoutError(f"Timed out waiting for s3://{bucket}/{key} "
+                               f"(size={expected_size}) after {timeout_seconds}s")
+
+        if now >= next_poll:
+            meta = yield ("head",)
+            head_calls += 1
+            if meta is None:
+                stable, last_etag = 0, None
+                LOG.debug("Not in S3 yet: %s", key)
+            else:
+                if first_seen is None:
+                    first_seen = time.monotonic() - start
+                size, etag = int(meta.get("ContentLength", -1)), _etag(meta.get("ETag"))
+                LOG.info("S3 size observed: %d bytes (expected=%d)", size, expected_size)
+                if matches(size, etag):
+                    stable = stable + 1 if etag == last_etag or stable == 0 else 1
+                    last_etag = etag
+                    if stable >= stable_polls:
+                        return done(size, etag, "poll")
+                else:
+                    stable, last_etag = 0, None
+            next_poll = time.monotonic() + next(delays)
+            continue
+
+        if not events:
+            yield ("sleep", max(0.0, min(next_poll, deadline) - now))
+            continue
+
+        # Long-poll events until the next fallback poll is due.
+        receives += 1
+        for event in (yield ("receive", min(next_poll, deadline) - now)):
+            etag = _etag(event.etag)
+            if not matches(event.size, etag):
+                LOG.info("Ignoring ObjectCreated event for %s: size=%s etag=%s", key, event.size, etag)
+                continue
+            # The event may describe an older version; confirm it is current.
+            meta = yield ("head",)
+            head_calls += 1
+            if meta and int(meta.get("ContentLength", -1)) == expected_size and _etag(meta.get("ETag")) == etag:
+                return done(expected_size, etag, "event")
+
+
+def wait_for_s3_object(s3,
+                       bucket: str,
+                       key: str,
+                       expected_size: int,
+                       timeout_seconds: float,
+                       expected_etag: Optional[str] = None,
+                       sqs=None,
+                       queue_url: Optional[str] = None,
+                       stable_polls: int = 1,
+                       poll_initial_seconds: float = DEFAULT_POLL_INITIAL_SECONDS,
+                       poll_max_seconds: float = DEFAULT_POLL_MAX_SECONDS) -> Arrival:
+    """
+    Blocks until s3://bucket/key has `expected_size` bytes (and `expected_etag`
+    if given). Uses SQS events when `sqs` and `queue_url` are given, with
+    backoff polling underneath either way.
+    """
+    steps = _arrival_steps(bucket, key, expected_size, timeout_seconds, expected_etag,
+                           sqs is not None and bool(queue_url), stable_polls,
+                           poll_initial_seconds, poll_max_seconds)
+    result = None
+    try:
+        while True:
+            step = steps.send(result)
+            if step[0] == "head":
+                result = _head(s3, bucket, key)
+            elif step[0] == "receive":
+                result = _receive_matching(sqs, queue_url, bucket, key, step[1])
+            else:
+                time.sleep(step[1])
+                result = None
+    except StopIteration as stop:
+        return stop.value
+
+
+async def wait_for_s3_object_async(s3,
+                                   bucket: str,
+                                   key: str,
+                                   expected_size: int,
+                                   timeout_seconds: float,
+                                   expected_etag: Optional[str] = None,
+                                   sqs=None,
+                                   queue_url: Optional[str] = None,
+                                   stable_polls: int = 1,
+                                   poll_initial_seconds: float = DEFAULT_POLL_INITIAL_SECONDS,
+                                   poll_max_seconds: float = DEFAULT_POLL_MAX_SECONDS) -> Arrival:
+    """
+    wait_for_s3_object as a coroutine: HeadObject and SQS receives run on
+    the bucket's and queue's poll executors, and the backoff sleeps are
+    asyncio sleeps, so a waiting scenario holds no thread between polls.
+    """
+    steps = _arrival_steps(bucket, key, expected_size, timeout_seconds, expected_etag,
+                           sqs is not None and bool(queue_url), stable_polls,
+                           poll_initial_seconds, poll_max_seconds)
+    s3_ep = s3_endpoint(bucket)
+    result = None
+    try:
+        while True:
+            step = steps.send(result)
+            if step[0] == "head":
+                result = await endpoint_io(s3_ep, _head, s3, bucket, key, slot=False)
+            elif step[0] == "receive":
+                result = await endpoint_io(queue_url, _receive_matching, sqs, queue_url, bucket, key, step[1],
+                                           slot=False)
+            else:
+                await asyncio.sleep(step[1])
+                result = None
+    except StopIteration as stop:
+        return stop.value
+
+
+# -----------------------------
+# Batch waiter (listing sweeps)
+# -----------------------------
+@dataclass
+class _Pending:
+    index: DiscoveryIndex
+    expected_size: int
+    key: Optional[str]
+    filename: Optional[str]
+    expected_etag: Optional[str]
+    deadline: float
+    registered: float = field(default_factory=time.monotonic)
+    future: Future = field(default_factory=Future)
+
+    def resolve(self) -> Optional[ObjectInfo]:
+        info = self.index.object_for_key(self.key) if self.key else self.index.lookup_object(self.filename)
+        if info is None or info.size != self.expected_size:
+            return None
+        if self.expected_etag and info.etag != _etag(self.expected_etag):
+            return None
+        return info
+
+
+class BatchWaiter:
+    """
+    Shared waiter: callers register expected objects and get a Future that
+    resolves to an Arrival. One background thread sweeps each distinct
+    prefix (in parallel) every `interval_seconds` while anything is pending.
+    """
+    def __init__(self, s3,
+                 interval_seconds: float = DEFAULT_SWEEP_INTERVAL_SECONDS,
+                 max_workers: int = 8,
+                 **index_kwargs):
+        self.s3 = s3
+        self.interval_seconds = interval_seconds
+        self.max_workers = max(1, max_workers)
+        self.index_kwargs = index_kwargs
+        self._lock = threading.Lock()
+        self._pending: List[_Pending] = []
+        self._indexes: Dict[int, DiscoveryIndex] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.sweeps = 0
+
+    def register(self, bucket: str, expected_size: int, timeout_seconds: float,
+                 key: Optional[str] = None,
+                 filename: Optional[str] = None,
+                 prefix: Optional[str] = None,
+                 expected_etag: Optional[str] = None) -> "Future[Arrival]":
+        """
+        Waits for `key`, or for any key under `prefix` whose last segment is
+        `filename`. Exact keys are swept under their own folder unless
+        `prefix` is given.
+        """
+        if not key and not filename:
+            raise ValueError("register() needs a key or a filename")
+        if prefix is None:
+            prefix = key.rsplit("/", 1)[0] + "/" if key and "/" in key else ""
+        # Exact keys only need their own folder; filenames fan out below the prefix.
+        kwargs = dict(self.index_kwargs)
+        if key:
+            kwargs.setdefault("shard_depth", 0)
+        index = get_discovery_index(self.s3, bucket, prefix, **kwargs)
+        pending = _Pending(index, expected_size, key, filename, expected_etag,
+                           deadline=time.monotonic() + timeout_seconds)
+        if key:
+            # A new key usually sorts behind the folder's watermark (probe
+            # keys are uuids); have sweeps probe for it until it resolves
+            index.watch_key(key)
+            pending.future.add_done_callback(lambda _: index.unwatch_key(key))
+        with self._lock:
+            self._pending.append(pending)
+            self._indexes[id(index)] = index
+            # New registrations join the next scheduled sweep; only an idle
+            # waiter sweeps immediately.
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="batch-waiter", daemon=True)
+                self._thread.start()
+        return pending.future
+
+    def wait(self, bucket: str, expected_size: int, timeout_seconds: float, **kwargs) -> Arrival:
+        return self.register(bucket, expected_size, timeout_seconds, **kwargs).result()
+
+    async def wait_async(self, bucket: str, expected_size: int, timeout_seconds: float, **kwargs) -> Arrival:
+        return await asyncio.wrap_future(self.register(bucket, expected_size, timeout_seconds, **kwargs))
+
+    def _run(self) -> None:
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch-sweep") as ex:
+            while True:
+                with self._lock:
+                    pending = [p for p in self._pending if not p.future.done()]
+                    self._pending = pending
+                    if not pending:
+                        self._thread = None
+                        return
+                indexes = list({id(p.index): p.index for p in pending}.values())
+                try:
+                    list(ex.map(lambda ix: ix.sweep(), indexes))
+                    self.sweeps += 1
+                except Exception as e:
+                    LOG.warning("Batch waiter sweep failed (will retry): %s", e)
+
+                now = time.monotonic()
+                for p in pending:
+                    info = p.resolve()
+                    if info is not None:
+                        elapsed = now - p.registered
+                        LOG.info("S3 object arrived via sweep after %.2fs: s3://%s/%s size=%d etag=%s",
+                                 elapsed, p.index.bucket, info.key, info.size, info.etag)
+                        p.future.set_result(Arrival(info.key, info.size, info.etag, "sweep", elapsed, 0, 0, elapsed))
+                    elif now >= p.deadline:
+                        p.future.set_exception(TimeoutError(
+                            f"Timed out waiting for s3://{p.index.bucket}/{p.key or p.index.prefix + '**/' + p.filename} "
+                            f"(size={p.expected_size})"))
+
+                time.sleep(self.interval_seconds)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = sum(1 for p in self._pending if not p.future.done())
+            indexes = list(self._indexes.values())
+        return {
+            "pending": pending,
+            "sweeps": self.sweeps,
+            "prefixes": len(indexes),
+            "list_requests": sum(ix.list_requests for ix in indexes),
+        }
+
+
+_WAITERS: Dict[int, BatchWaiter] = {}
+_WAITERS_LOCK = threading.Lock()
+
+
+def get_batch_waiter(s3, **kwargs) -> BatchWaiter:
+    """Process-wide BatchWaiter per S3 client."""
+    with _WAITERS_LOCK:
+        waiter = _WAITERS.get(id(s3))
+        if waiter is None:
+            waiter = BatchWaiter(s3, **kwargs)
+            _WAITERS[id(s3)] = waiter
+    return waiter
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite with a regression gate.
+
+Covers the hot paths of the E2E scripts against the local stand-ins
+(e2e_harness), so numbers are comparable between commits:
+- payload: chunk_bytes / expected_bytes MB/s, DeterministicStream.read and
+  .readinto at several read sizes, traced allocation peak and GC
+  collections of allocating versus buffer-reusing loops,
+- config: parse_size and per-route load_config time,
+- sftp: parallel upload and SFTP -> SFTP relay MB/s, spot-check latency
+  versus check count,
+- s3: upload_fileobj and server-side copy MB/s, spot-check latency versus
+  check count,
+- rss_peak_mib: the process's peak resident set over the whole run.
+
+Results are stored as JSON keyed by git commit (--results). The gate
+compares the run with a baseline (--baseline, default: the latest stored
+run of another commit with the same size, repeats, RTT and bandwidth) and
+exits 2 when any metric is worse by more than --threshold (per-metric
+overrides with --metric-threshold name=fraction) and by more than its
+noise floor. Runs with other settings are never compared.
+
+  python e2e_bench.py                       # run, store, gate against the previous commit
+  python e2e_bench.py --groups payload      # CPU-only part, no harness needed
+  python e2e_bench.py --rtt-ms 20 --bandwidth-mbps 400   # WAN-like links
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import hashlib
+import platform
+import resource
+import subprocess
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from e2e_buffers import scratch
+from e2e_payload import (
+    CHUNK,
+    DEFAULT_PATTERN_VERSION,
+    DeterministicStream,
+    choose_offsets,
+    chunk_bytes,
+    expected_bytes,
+    expected_into,
+)
+
+LOG = logging.getLogger("e2e-bench")
+
+GROUPS = ("payload", "config", "sftp", "s3")
+DEFAULT_RESULTS_PATH = os.path.join(".bench", "results.json")
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_TRANSFER_SIZE = 64 * 1024 * 1024
+DEFAULT_REPEATS = 3
+READ_SIZES = (32 * 1024, CHUNK, 8 * CHUNK)
+CONFIG_NOISE_FLOOR_MS = 1.0  # config loads take well under 1 ms; scheduler noise is that large
+SPOT_CHECK_COUNTS = (1, 16, 64)
+SPOT_CHECK_BYTES = 64 * 1024
+MB = 1024 * 1024
+
+
+def setup_logging(level: str) -> None:
+    logging.basicConfig(
+        level=getattr(logging, level.upper(), logging.INFO),
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+
+
+@dataclass
+class Metric:
+    value: float
+    unit: str
+    higher_is_better: bool
+    noise_floor: float = 0.0   # absolute change (in `unit`) below which nothing is flagged
+
+
+Results = Dict[str, Metric]
+
+
+def _best(fn: Callable[[], float], repeats: int, higher_is_better: bool) -> float:
+    """Best of `repeats` runs: the least noisy estimate of what the code can do."""
+    values = [fn() for _ in range(max(1, repeats))]
+    return max(values) if higher_is_better else min(values)
+
+
+def _rate(fn: Callable[[], int]) -> float:
+    """MB/s of fn(), which returns the bytes it processed."""
+    start = time.perf_counter()
+    n = fn()
+    return n / MB / max(1e-9, time.perf_counter() - start)
+
+
+def _alloc_profile(fn: Callable[[], object]) -> Tuple[float, float]:
+    """(traced peak KiB above the starting point, GC collections) during fn()."""
+    gc.collect()
+    before = sum(s["collections"] for s in gc.get_stats())
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (peak - base) / 1024.0, float(sum(s["collections"] for s in gc.get_stats()) - before)
+
+
+def _elapsed_ms(fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000.0
+
+
+# -----------------------------
+# Benchmarks
+# -----------------------------
+SEED = hashlib.sha256(b"e2e-bench").digest()
+
+
+def bench_payload(out: Results, size: int, repeats: int) -> None:
+    chunks = max(1, size // CHUNK)
+    chunk_bytes(SEED, 0, 1)  # warm per-seed state outside the timed loop
+
+    def gen_chunks() -> int:
+        for ci in range(chunks):
+            chunk_bytes(SEED, ci, CHUNK, DEFAULT_PATTERN_VERSION)
+        return chunks * CHUNK
+    out["chunk_bytes_mb_s"] = Metric(_best(lambda: _rate(gen_chunks), repeats, True), "MB/s", True)
+
+    total = chunks * CHUNK
+    offsets = choose_offsets(total, 256, SPOT_CHECK_BYTES, SEED)
+
+    def gen_ranges() -> int:
+        for off in offsets:
+            expected_bytes(SEED, off, SPOT_CHECK_BYTES, total)
+        return len(offsets) * SPOT_CHECK_BYTES
+    out["expected_bytes_mb_s"] = Metric(_best(lambda: _rate(gen_ranges), repeats, True), "MB/s", True)
+
+    for read_size in READ_SIZES:
+        def read_all(read_size: int = read_size) -> int:
+            stream = DeterministicStream(SEED, total)
+            while stream.read(read_size):
+                pass
+            return total
+        out[f"stream_read_{read_size // 1024}k_mb_s"] = Metric(
+            _best(lambda: _rate(read_all), repeats, True), "MB/s", True)
+
+        def readinto_all(read_size: int = read_size) -> int:
+            stream = DeterministicStream(SEED, total)
+            buf = memoryview(bytearray(read_size))
+            while stream.readinto(buf):
+                pass
+            return total
+        out[f"stream_readinto_{read_size // 1024}k_mb_s"] = Metric(
+            _best(lambda: _rate(readinto_all), repeats, True), "MB/s", True)
+
+    # Allocation and GC cost of the two loop styles: a relay-like pass over the
+    # stream plus spot-check comparisons, allocating versus reusing buffers
+    def allocating() -> None:
+        stream = DeterministicStream(SEED, total)
+        while stream.read(CHUNK):
+            pass
+        for off in offsets:
+            _ = expected_bytes(SEED, off, SPOT_CHECK_BYTES, total) == expected_bytes(SEED, off, SPOT_CHECK_BYTES, total)
+
+    def reusing() -> None:
+        stream = DeterministicStream(SEED, total)
+        buf = memoryview(bytearray(CHUNK))
+        while stream.readinto(buf):
+            pass
+        actual, expected = scratch(SPOT_CHECK_BYTES, "actual"), scratch(SPOT_CHECK_BYTES, "expected")
+        for off in offsets:
+            expected_into(actual, SEED, off, total)
+            expected_into(expected, SEED, off, total)
+            _ = actual == expected
+
+    for name, fn in (("read", allocating), ("readinto", reusing)):
+        peak_kib, collections = _alloc_profile(fn)
+        out[f"alloc_{name}_peak_kib"] = Metric(peak_kib, "KiB", False)
+        out[f"alloc_{name}_gc_collections"] = Metric(collections, "count", False)
+
+
+def bench_config(out: Results, repeats: int) -> None:
+    import e2e_runner
+    from s3_to_s3_e2e_test import parse_size
+
+    samples = ["1MB", "20GB", "512KiB", "1.5GiB", "123456"] * 200
+
+    def parse_all() -> None:
+        for s in samples:
+            parse_size(s)
+    out["parse_size_us"] = Metric(
+        _best(lambda: _elapsed_ms(parse_all), repeats, False) * 1000.0 / len(samples), "us", False)
+
+    for route in e2e_runner.ROUTES:
+        name = route.replace("-", "_")
+        e2e_runner.load_route(route, os.devnull)  # the first call imports the route module
+        out[f"config_{name}_ms"] = Metric(
+            _best(lambda route=route: _elapsed_ms(lambda: e2e_runner.load_route(route, os.devnull)), repeats, False),
+            "ms", False, CONFIG_NOISE_FLOOR_MS)
+
+
+def _sftp_conn(harness, side: str):
+    from e2e_sftp import SFTPConn
+
+    env = harness.env()
+    return SFTPConn(
+        host=env[f"{side}_SFTP_HOST"],
+        port=int(env[f"{side}_SFTP_PORT"]),
+        username=env[f"{side}_SFTP_USERNAME"],
+        private_key_path=env[f"{side}_SFTP_PRIVATE_KEY_PATH"],
+        private_key_passphrase=None,
+        remote_dir=env[f"{side}_SFTP_REMOTE_DIR"],
+    )
+
+
+def bench_sftp(out: Results, harness, size: int, repeats: int) -> None:
+    from e2e_sftp import POOL
+    from e2e_transfer import parallel_sftp_upload, relay_sftp_to_sftp
+    from e2e_verify import sftp_spot_check
+
+    src, tgt = _sftp_conn(harness, "SRC"), _sftp_conn(harness, "TGT")
+    src_path, tgt_path = f"{src.remote_dir}/bench.bin", f"{tgt.remote_dir}/bench.bin"
+
+    for streams in (1, 4):
+        out[f"sftp_upload_{streams}x_mb_s"] = Metric(_best(
+            lambda streams=streams: parallel_sftp_upload(src, src_path, SEED, size, streams)["mb_per_s"],
+            repeats, True), "MB/s", True)
+
+    def relay() -> float:
+        result = relay_sftp_to_sftp(src, src_path, tgt, tgt_path, size)
+        return result["bytes"] / MB / max(1e-9, result["seconds"])
+    out["sftp_relay_mb_s"] = Metric(_best(relay, repeats, True), "MB/s", True)
+
+    for count in SPOT_CHECK_COUNTS:
+        offsets = choose_offsets(size, count, SPOT_CHECK_BYTES, SEED)
+
+        def spot(offsets: List[int] = offsets) -> float:
+            with POOL.session(tgt) as sftp:
+                return _elapsed_ms(lambda: sftp_spot_check(
+                    sftp, tgt_path, SEED, offsets, SPOT_CHECK_BYTES, size, DEFAULT_PATTERN_VERSION))
+        out[f"sftp_spot_check_{count}_ms"] = Metric(_best(spot, repeats, False), "ms", False)
+
+    POOL.close_all()
+
+
+def bench_s3(out: Results, harness, size: int, repeats: int) -> None:
+    from boto3.s3.transfer import TransferConfig
+    from e2e_partgen import parse_generate_processes
+    from e2e_planner import COPY, UPLOAD, plan_multipart
+    from e2e_s3 import get_s3_client
+    from e2e_transfer import s3_multipart_copy, s3_multipart_upload
+    from e2e_verify import s3_spot_check
+
+    env = harness.env()
+    s3 = get_s3_client(env["AWS_REGION"], endpoint_url=env["S3_ENDPOINT_URL"])
+    src_bucket, tgt_bucket, key = env["SRC_BUCKET"], env["TGT_BUCKET"], "bench/bench.bin"
+    transfer_cfg = TransferConfig(max_concurrency=10)
+
+    def upload() -> int:
+        s3.upload_fileobj(DeterministicStream(SEED, size), src_bucket, key, Config=transfer_cfg)
+        return size
+    out["s3_upload_mb_s"] = Metric(_best(lambda: _rate(upload), repeats, True), "MB/s", True)
+
+    def copy() -> int:
+        s3.copy({"Bucket": src_bucket, "Key": key}, tgt_bucket, key, Config=transfer_cfg)
+        return size
+    out["s3_copy_mb_s"] = Metric(_best(lambda: _rate(copy), repeats, True), "MB/s", True)
+
+    # The scripts' path: planned parts through the adaptive multipart engine
+    def planned_upload() -> float:
+        plan = plan_multipart(UPLOAD, size, threshold=1)
+        return s3_multipart_upload(s3, src_bucket, key, SEED, size, plan.part_sizes, DEFAULT_PATTERN_VERSION,
+                                   concurrency=plan.max_concurrency, initial_concurrency=plan.concurrency,
+                                   generate_processes=parse_generate_processes(None))["mb_per_s"]
+    out["s3_planned_upload_mb_s"] = Metric(_best(planned_upload, repeats, True), "MB/s", True)
+
+    def planned_copy() -> float:
+        plan = plan_multipart(COPY, size, threshold=1)
+        return s3_multipart_copy(s3, src_bucket, key, tgt_bucket, key, plan.part_sizes,
+                                 concurrency=plan.max_concurrency, initial_concurrency=plan.concurrency)["mb_per_s"]
+    out["s3_planned_copy_mb_s"] = Metric(_best(planned_copy, repeats, True), "MB/s", True)
+
+    for count in SPOT_CHECK_COUNTS:
+        offsets = choose_offsets(size, count, SPOT_CHECK_BYTES, SEED)
+        out[f"s3_spot_check_{count}_ms"] = Metric(_best(
+            lambda offsets=offsets: _elapsed_ms(lambda: s3_spot_check(
+                s3, [(tgt_bucket, key)], SEED, offsets, SPOT_CHECK_BYTES, size)),
+            repeats, False), "ms", False)
+
+
+def run_benchmarks(groups: List[str], size: int, repeats: int, rtt_ms: float = 0.0,
+                   bandwidth_mbps: Optional[float] = None) -> Results:
+    out: Results = {}
+    if "payload" in groups:
+        LOG.info("Benchmarking payload generation...")
+        bench_payload(out, size, repeats)
+
+    needs_harness = [g for g in groups if g in ("config", "sftp", "s3")]
+    if not needs_harness:
+        out["rss_peak_mib"] = Metric(_rss_peak_mib(), "MiB", False)
+        return out
+
+    from e2e_harness import LocalHarness, Throttle
+
+    throttle = Throttle(rtt_ms / 1000.0, bandwidth_mbps * 1e6 / 8 if bandwidth_mbps else None)
+    with LocalHarness(throttle, pipeline_delay_seconds=None) as harness:
+        harness.apply_env()
+        for group in needs_harness:
+            LOG.info("Benchmarking %s...", group)
+            if group == "config":
+                bench_config(out, repeats)
+            elif group == "sftp":
+                bench_sftp(out, harness, size, repeats)
+            else:
+                bench_s3(out, harness, size, repeats)
+    out["rss_peak_mib"] = Metric(_rss_peak_mib(), "MiB", False)
+    return out
+
+
+def _rss_peak_mib() -> float:
+    """Peak resident set of this process so far (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+# -----------------------------
+# Storage + regression gate
+# -----------------------------
+def git_commit() -> Tuple[str, bool]:
+    """(HEAD commit, worktree dirty); ('unknown', True) outside a git checkout."""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             text=True, stderr=subprocess.DEVNULL).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", True
+
+
+def load_results(path: str) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("runs", {})
+
+
+def save_results(path: str, runs: Dict[str, dict]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"runs": runs}, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+COMPARABLE_SETTINGS = ("size", "repeats", "rtt_ms", "bandwidth_mbps")
+
+
+def comparable(settings: dict, other: dict) -> bool:
+    """Whether two runs' numbers can be compared (same workload and links)."""
+    return all(settings.get(k) == other.get(k) for k in COMPARABLE_SETTINGS)
+
+
+def pick_baseline(runs: Dict[str, dict], commit: str, requested: Optional[str], settings: dict) -> Optional[str]:
+    """
+    The requested run (which must have comparable settings), or the latest
+    run of another commit with comparable settings, or None.
+    """
+    if requested:
+        matches = [c for c in runs if c.startswith(requested)]
+        if len(matches) != 1:
+            raise ValueError(f"Baseline {requested} matches {len(matches)} stored run(s)")
+        base_settings = runs[matches[0]].get("settings", {})
+        if not comparable(settings, base_settings):
+            raise ValueError(f"Baseline {matches[0][:12]} ran with {base_settings}, not comparable with {settings}")
+        return matches[0]
+    others = [c for c in runs if c != commit and comparable(settings, runs[c].get("settings", {}))]
+    return max(others, key=lambda c: runs[c].get("timestamp", 0), default=None)
+
+
+def compare(current: Results,
+            baseline: Dict[str, dict],
+            threshold: float,
+            overrides: Dict[str, float]) -> List[str]:
+    """Regression messages for metrics worse than their threshold."""
+    regressions = []
+    for name, metric in sorted(current.items()):
+        base = baseline.get(name)
+        if not base or not base.get("value"):
+            LOG.info("%-28s %12.3f %-5s (no baseline yet)", name, metric.value, metric.unit)
+            continue
+        old, new = float(base["value"]), metric.value
+        change = (old - new) / old if metric.higher_is_better else (new - old) / old
+        limit = overrides.get(name, threshold)
+        regressed = change > limit and abs(new - old) > metric.noise_floor
+        flag = "REGRESSION" if regressed else ("noise" if change > limit else "ok")
+        LOG.info("%-28s %12.3f %-5s (baseline %12.3f, %+.1f%% worse) %s",
+                 name, new, metric.unit, old, 100.0 * change, flag)
+        if regressed:
+            regressions.append(f"{name}: {new:.3f} {metric.unit} vs {old:.3f} ({100.0 * change:.1f}% worse, limit {100.0 * limit:.0f}%)")
+    return regressions
+
+
+def _parse_overrides(values: List[str]) -> Dict[str, float]:
+    out = {}
+    for v in values:
+        name, _, fraction = v.partition("=")
+        out[name.strip()] = float(fraction)
+    return out
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description="E2E benchmark suite with regression gate")
+    ap.add_argument("--groups", default=",".join(GROUPS), help=f"Comma-separated: {', '.join(GROUPS)}")
+    ap.add_argument("--size", type=int, default=DEFAULT_TRANSFER_SIZE, help="Bytes per transfer/generation run")
+    ap.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Runs per metric (best is kept)")
+    ap.add_argument("--rtt-ms", type=float, default=0.0, help="Harness RTT per connection")
+    ap.add_argument("--bandwidth-mbps", type=float, default=None, help="Harness per-connection bandwidth cap")
+    ap.add_argument("--results", default=DEFAULT_RESULTS_PATH, help="JSON results store (keyed by git commit)")
+    ap.add_argument("--baseline", default=None,
+                    help="Commit (prefix) to compare with; default: latest comparable run of another commit")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                    help="Allowed fractional regression per metric (0.15 = 15%%)")
+    ap.add_argument("--metric-threshold", action="append", default=[], metavar="NAME=FRACTION",
+                    help="Per-metric threshold override (repeatable)")
+    ap.add_argument("--no-store", action="store_true", help="Compare only; do not record this run")
+    ap.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "INFO"))
+    return ap
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    setup_logging(args.log_level)
+    groups = [g.strip() for g in args.groups.split(",") if g.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        LOG.error("Unknown benchmark group(s): %s", ", ".join(sorted(unknown)))
+        return 2
+
+    commit, dirty = git_commit()
+    settings = {"groups": groups, "size": args.size, "repeats": args.repeats,
+                "rtt_ms": args.rtt_ms, "bandwidth_mbps": args.bandwidth_mbps}
+    runs = load_results(args.results)
+    try:
+        baseline_commit = pick_baseline(runs, commit, args.baseline, settings)
+    except ValueError as e:
+        LOG.error("❌ %s", e)
+        return 2
+    current = run_benchmarks(groups, args.size, args.repeats, args.rtt_ms, args.bandwidth_mbps)
+
+    regressions: List[str] = []
+    if baseline_commit:
+        LOG.info("Comparing %s%s with baseline %s", commit[:12], " (dirty)" if dirty else "", baseline_commit[:12])
+        regressions = compare(current, runs[baseline_commit]["metrics"], args.threshold,
+                              _parse_overrides(args.metric_threshold))
+    else:
+        for name, metric in sorted(current.items()):
+            LOG.info("%-28s %12.3f %s", name, metric.value, metric.unit)
+        LOG.info("No stored run with these settings (%s) yet; %s",
+                 ", ".join(f"{k}={settings[k]}" for k in COMPARABLE_SETTINGS),
+                 "nothing to compare with" if args.no_store else "this run becomes their baseline")
+
+    if not args.no_store:
+        runs[commit] = {
+            "timestamp": time.time(),
+            "dirty": dirty,
+            "python": platform.python_version(),
+            "settings": settings,
+            "metrics": {name: asdict(m) for name, m in current.items()},
+        }
+        save_results(args.results, runs)
+
+    if regressions:
+        for r in regressions:
+            LOG.error("❌ %s", r)
+        return 2
+    LOG.info("✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
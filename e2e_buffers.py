@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Reusable I/O buffers for the transfer and verification loops.
+
+The loops used to allocate a fresh bytes object at every step (a generated
+chunk, a joined read, a GET body, an expected range), so a 20 GB transfer
+made tens of thousands of short-lived multi-MiB allocations. Instead:
+
+- BufferPool: a fixed set of preallocated bytearrays handed out and taken
+  back (S3 -> SFTP part buffers); acquiring blocks while all are in use,
+  which also bounds memory,
+- scratch(): a per-thread buffer of an exact length, reused across calls
+  (expected ranges in spot checks, hashing windows),
+- readinto_exact(): fills a buffer from a file-like body (botocore
+  StreamingBody, DeterministicStream) with readinto.
+
+Comparisons run bytearray against bytes/memoryview, which CPython does with
+memcmp; memoryview == memoryview compares element by element and is much
+slower, so expected data is kept in bytearrays.
+
+paramiko allocates its own reply buffers for SFTP reads (readv), and copies
+writes into its packet buffer; those are passed through, not copied again.
+"""
+
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+_SCRATCH_LENGTHS = 4  # distinct lengths kept per thread (the last spot check is shorter)
+
+_local = threading.local()
+
+
+class BufferPool:
+    def __init__(self, count: int, size: int):
+        self.size = size
+        self.count = max(1, count)
+        self._free: "queue.Queue[bytearray]" = queue.Queue()
+        for _ in range(self.count):
+            self._free.put(bytearray(size))
+
+    def acquire(self) -> bytearray:
+        return self._free.get()
+
+    def release(self, buf: bytearray) -> None:
+        self._free.put(buf)
+
+    @contextmanager
+    def buffer(self) -> Iterator[bytearray]:
+        buf = self.acquire()
+        try:
+            yield buf
+        finally:
+            self.release(buf)
+
+
+def scratch(length: int, slot: str = "") -> bytearray:
+    """This thread's reusable buffer of exactly `length` bytes (one per slot name)."""
+    bufs: Dict[tuple, bytearray] = getattr(_local, "bufs", None)
+    if bufs is None:
+        bufs = _local.bufs = {}
+    key = (slot, length)
+    buf = bufs.get(key)
+    if buf is None:
+        if len(bufs) >= _SCRATCH_LENGTHS:
+            bufs.pop(next(iter(bufs)))
+        buf = bufs[key] = bytearray(length)
+    return buf
+
+
+def readinto_exact(body, buf) -> int:
+    """Reads into `buf` until it is full or `body` ends; returns the bytes read."""
+    view = memoryview(buf).cast("B")
+    got = 0
+    while got < len(view):
+        n = body.readinto(view[got:])
+        if not n:
+            break
+        got += n
+    return got
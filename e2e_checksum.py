@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Expected S3 additional checksums for the deterministic payload.
+
+Multipart uploads and copies produce composite ETags, so the scripts used
+to fall back to re-reading object bytes to prove integrity. When uploads
+set ChecksumAlgorithm (CRC32/CRC32C/CRC64NVME/SHA256), S3 stores a checksum
+that a single HeadObject returns. Because the payload is a pure function of the
+seed, the checksum S3 should report can be computed locally from the seed,
+the size and the multipart layout, without reading the object back.
+
+Checksum types (as reported in ChecksumType):
+- FULL_OBJECT: checksum of the whole byte stream. Always the case for
+  single-part objects; for multipart CRC objects the part CRCs are
+  combined mathematically, so parts can still be hashed in parallel.
+- COMPOSITE: checksum of the concatenated raw part checksums, reported
+  as "<base64>-<part count>". CRC64NVME (S3's default for new objects) is
+  always FULL_OBJECT.
+
+CRC32C and CRC64NVME need awscrt (or crc32c for CRC32C). Without them, or
+for algorithms not listed here, checksum_supported() is False and
+e2e_verify falls back to hashing the object.
+"""
+
+import zlib
+import base64
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+import botocore.exceptions
+
+from e2e_buffers import scratch
+from e2e_fixture import cached_range_digest
+from e2e_payload import CHUNK, DEFAULT_PATTERN_VERSION, expected_into
+
+try:
+    from awscrt import checksums as _crt_checksums
+except Exception:
+    _crt_checksums = None
+
+try:
+    import crc32c as _crc32c
+except Exception:
+    _crc32c = None
+
+CHECKSUM_ALGORITHMS = ("CRC32", "CRC32C", "CRC64NVME", "SHA256")
+FULL_OBJECT = "FULL_OBJECT"
+COMPOSITE = "COMPOSITE"
+
+# S3 multipart limits (mirrored by s3transfer's ChunksizeAdjuster)
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+MAX_PARTS = 10000
+
+DEFAULT_CHECKSUM_CONCURRENCY = 8
+
+# Reflected CRC polynomials and widths (bits), used to combine part CRCs
+_CRC_POLYS = {
+    "CRC32": 0xEDB88320,
+    "CRC32C": 0x82F63B78,
+    "CRC64NVME": 0x9A6C9329AC4BC9B5,
+}
+_CRC_WIDTHS = {
+    "CRC32": 32,
+    "CRC32C": 32,
+    "CRC64NVME": 64,
+}
+FULL_OBJECT_ONLY = ("CRC64NVME",)
+
+
+class UnsupportedChecksumError(RuntimeError):
+    """The algorithm is unknown here or needs a library that is not installed."""
+
+
+def parse_checksum_algorithm(v: Optional[str]) -> Optional[str]:
+    """Normalizes S3_CHECKSUM_ALGORITHM; empty/'none' disables checksums."""
+    if v is None or str(v).strip().lower() in ("", "none", "off"):
+        return None
+    algorithm = str(v).strip().upper()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise ValueError(f"Unsupported S3 checksum algorithm {v} (known: {CHECKSUM_ALGORITHMS})")
+    return algorithm
+
+
+def checksum_supported(algorithm: str) -> bool:
+    """Whether expected values for `algorithm` can be computed in this environment."""
+    try:
+        RunningChecksum(algorithm)
+        return True
+    except UnsupportedChecksumError:
+        return False
+
+
+# -----------------------------
+# Multipart layout
+# -----------------------------
+def transfer_part_sizes(total_size: int, multipart_threshold: int, multipart_chunksize: int) -> List[int]:
+    """
+    Part sizes boto3's TransferManager will use for an upload/copy of
+    `total_size` bytes. An empty list means a single-part PutObject/CopyObject.
+    """
+    if total_size < multipart_threshold:
+        return []
+    chunksize = min(max(multipart_chunksize, MIN_PART_SIZE), MAX_PART_SIZE)
+    while -(-total_size // chunksize) > MAX_PARTS:
+        chunksize *= 2
+    return [min(chunksize, total_size - start) for start in range(0, total_size, chunksize)]
+
+
+# -----------------------------
+# CRC helpers
+# -----------------------------
+def _crc_function(algorithm: str) -> Callable[[bytes, int], int]:
+    if algorithm == "CRC32":
+        return lambda data, crc: zlib.crc32(data, crc)
+    if algorithm == "CRC32C":
+        if _crt_checksums is not None:
+            return lambda data, crc: _crt_checksums.crc32c(data, crc)
+        if _crc32c is not None:
+            return lambda data, crc: _crc32c.crc32c(data, crc)
+        raise UnsupportedChecksumError("CRC32C checksums need awscrt (pip install 'boto3[crt]') or crc32c installed")
+    if algorithm == "CRC64NVME":
+        if _crt_checksums is not None:
+            return lambda data, crc: _crt_checksums.crc64nvme(data, crc)
+        raise UnsupportedChecksumError("CRC64NVME checksums need awscrt (pip install 'boto3[crt]')")
+    raise UnsupportedChecksumError(f"Unsupported S3 checksum algorithm {algorithm} (known: {CHECKSUM_ALGORITHMS})")
+
+
+def _gf2_times(mat: List[int], vec: int) -> int:
+    total = 0
+    i = 0
+    while vec:
+        if vec & 1:
+            total ^= mat[i]
+        vec >>= 1
+        i += 1
+    return total
+
+
+def _gf2_square(mat: List[int]) -> List[int]:
+    return [_gf2_times(mat, row) for row in mat]
+
+
+def crc_combine(crc1: int, crc2: int, len2: int, poly: int, width: int = 32) -> int:
+    """
+    CRC of A||B from crc(A), crc(B) and len(B) (zlib's crc32_combine,
+    generalized to any reflected polynomial of `width` bits). O(log len2).
+    """
+    if len2 <= 0:
+        return crc1
+    odd = [poly] + [1 << n for n in range(width - 1)]  # operator for one zero bit
+    even = _gf2_square(odd)                     # two zero bits
+    odd = _gf2_square(even)                     # four zero bits
+    while True:
+        even = _gf2_square(odd)
+        if len2 & 1:
+            crc1 = _gf2_times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+        odd = _gf2_square(even)
+        if len2 & 1:
+            crc1 = _gf2_times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+    return crc1 ^ crc2
+
+
+# -----------------------------
+# Expected checksums
+# -----------------------------
+@dataclass
+class ExpectedChecksum:
+    algorithm: str
+    checksum_type: str
+    value: str                                   # base64, without the "-N" suffix
+    part_checksums: List[str] = field(default_factory=list)  # base64 per part; [] when single-part
+
+    @property
+    def part_count(self) -> int:
+        return len(self.part_checksums)
+
+    @property
+    def header_value(self) -> str:
+        """The value as HeadObject reports it."""
+        if self.checksum_type == COMPOSITE and self.part_count:
+            return f"{self.value}-{self.part_count}"
+        return self.value
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii")
+
+
+class RunningChecksum:
+    """Incremental S3 additional checksum (raw digest; base64 via b64())."""
+
+    def __init__(self, algorithm: str):
+        self.algorithm = algorithm
+        if algorithm == "SHA256":
+            self._sha = hashlib.sha256()
+        else:
+            self._sha = None
+            self._crc_fn = _crc_function(algorithm)
+            self._crc = 0
+            self._width = _CRC_WIDTHS[algorithm] // 8
+
+    def update(self, data) -> None:
+        if self._sha is not None:
+            self._sha.update(data)
+        else:
+            self._crc = self._crc_fn(data, self._crc)
+
+    def digest(self) -> bytes:
+        return self._sha.digest() if self._sha is not None else self._crc.to_bytes(self._width, "big")
+
+    def b64(self) -> str:
+        return _b64(self.digest())
+
+
+def _range_checksum(seed: bytes, total_size: int, version: int, algorithm: str,
+                    start: int, end: int) -> bytes:
+    def compute() -> bytes:
+        buf = memoryview(scratch(CHUNK, "checksum"))
+        running = RunningChecksum(algorithm)
+        for pos in range(start, end, CHUNK):
+            n = expected_into(buf[:min(CHUNK, end - pos)], seed, pos, total_size, version)
+            running.update(buf[:n])
+        return running.digest()
+
+    return cached_range_digest(version, algorithm, start, end, compute)
+
+
+def expected_s3_checksum(seed: bytes,
+                         total_size: int,
+                         algorithm: str,
+                         part_sizes: Optional[List[int]] = None,
+                         version: int = DEFAULT_PATTERN_VERSION,
+                         checksum_type: Optional[str] = None,
+                         concurrency: int = DEFAULT_CHECKSUM_CONCURRENCY) -> ExpectedChecksum:
+    """
+    Checksum S3 should report for the payload uploaded with `part_sizes`
+    (see transfer_part_sizes). Multipart objects default to COMPOSITE, as
+    produced by an explicit ChecksumAlgorithm on boto3 uploads and copies
+    (FULL_OBJECT for CRC64NVME, which has no composite form).
+    """
+    part_sizes = list(part_sizes or [])
+    if not part_sizes:
+        raw = _range_checksum(seed, total_size, version, algorithm, 0, total_size)
+        return ExpectedChecksum(algorithm, FULL_OBJECT, _b64(raw))
+
+    if sum(part_sizes) != total_size:
+        raise ValueError(f"Part sizes add up to {sum(part_sizes)}, expected {total_size}")
+    checksum_type = checksum_type or (FULL_OBJECT if algorithm in FULL_OBJECT_ONLY else COMPOSITE)
+    if checksum_type == FULL_OBJECT and algorithm not in _CRC_POLYS:
+        raise ValueError(f"{algorithm} has no full-object checksum for multipart objects")
+    if checksum_type == COMPOSITE and algorithm in FULL_OBJECT_ONLY:
+        raise ValueError(f"{algorithm} has no composite checksum for multipart objects")
+
+    ranges: List[Tuple[int, int]] = []
+    pos = 0
+    for size in part_sizes:
+        ranges.append((pos, pos + size))
+        pos += size
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(ranges))), thread_name_prefix="checksum") as ex:
+        parts = list(ex.map(lambda r: _range_checksum(seed, total_size, version, algorithm, *r), ranges))
+
+    if checksum_type == FULL_OBJECT:
+        width = _CRC_WIDTHS[algorithm]
+        crc = int.from_bytes(parts[0], "big")
+        for raw, size in zip(parts[1:], part_sizes[1:]):
+            crc = crc_combine(crc, int.from_bytes(raw, "big"), size, _CRC_POLYS[algorithm], width)
+        value = crc.to_bytes(width // 8, "big")
+    elif algorithm == "SHA256":
+        value = hashlib.sha256(b"".join(parts)).digest()
+    else:
+        value = _crc_function(algorithm)(b"".join(parts), 0).to_bytes(4, "big")
+
+    return ExpectedChecksum(algorithm, checksum_type, _b64(value), [_b64(p) for p in parts])
+
+
+# -----------------------------
+# What S3 reports
+# -----------------------------
+def s3_object_checksum(s3, bucket: str, key: str) -> Optional[Tuple[str, str, str]]:
+    """
+    (algorithm, value, checksum_type) stored on the object, from a single
+    HeadObject with ChecksumMode; None if the object has no additional checksum.
+    The algorithm may be one this module cannot compute (see checksum_supported).
+    """
+    head = s3.head_object(Bucket=bucket, Key=key, ChecksumMode="ENABLED")
+    stored = [k[len("Checksum"):] for k, v in head.items()
+              if k.startswith("Checksum") and k != "ChecksumType" and isinstance(v, str) and v]
+    for algorithm in sorted(stored, key=lambda a: a not in CHECKSUM_ALGORITHMS):
+        value = head[f"Checksum{algorithm}"]
+        checksum_type = head.get("ChecksumType") or _checksum_type(s3, bucket, key, algorithm, value, head)
+        return algorithm, value, checksum_type
+    return None
+
+
+def _checksum_type(s3, bucket: str, key: str, algorithm: str, value: str, head: dict) -> str:
+    """
+    ChecksumType when HeadObject leaves it out (older endpoints, moto), which
+    then may also drop the "-N" suffix: GetObjectAttributes reports it; failing
+    that, multipart objects (ETag "-N") are composite unless the algorithm
+    only has a full-object form, as full-object multipart checksums arrived
+    together with ChecksumType.
+    """
+    try:
+        attrs = s3.get_object_attributes(Bucket=bucket, Key=key, ObjectAttributes=["Checksum"])
+        checksum_type = (attrs.get("Checksum") or {}).get("ChecksumType")
+        if checksum_type:
+            return checksum_type
+    except botocore.exceptions.ClientError:
+        pass
+    multipart = "-" in value or "-" in str(head.get("ETag", ""))
+    return COMPOSITE if multipart and algorithm not in FULL_OBJECT_ONLY else FULL_OBJECT
+
+
+def s3_object_parts(s3, bucket: str, key: str) -> List[dict]:
+    """
+    Per-part Size/Checksum* of a multipart object (GetObjectAttributes,
+    paginated). Endpoints that leave ObjectParts out (moto, some gateways) are
+    asked part by part with HeadObject(PartNumber=n).
+    """
+    parts: List[dict] = []
+    marker = 0
+    while True:
+        resp = s3.get_object_attributes(
+            Bucket=bucket, Key=key, ObjectAttributes=["ObjectParts"],
+            MaxParts=1000, PartNumberMarker=marker,
+        )
+        if "ObjectParts" not in resp and not parts:
+            return _head_object_parts(s3, bucket, key)
+        info = resp.get("ObjectParts") or {}
+        parts.extend(info.get("Parts") or [])
+        if not info.get("IsTruncated"):
+            return parts
+        marker = info["NextPartNumberMarker"]
+
+
+def _head_object_parts(s3, bucket: str, key: str) -> List[dict]:
+    parts: List[dict] = []
+    count = 1
+    while len(parts) < count:
+        number = len(parts) + 1
+        head = s3.head_object(Bucket=bucket, Key=key, PartNumber=number, ChecksumMode="ENABLED")
+        count = int(head.get("PartsCount") or 1)
+        part = {"PartNumber": number, "Size": int(head["ContentLength"])}
+        part.update((k, v) for k, v in head.items()
+                    if k.startswith("Checksum") and k != "ChecksumType" and isinstance(v, str) and v)
+        parts.append(part)
+    return parts if count > 1 else []
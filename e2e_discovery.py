@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Incremental, sharded S3 key discovery (S3_KEY_MODE=discover).
+
+Discovery used to re-paginate the whole S3_PREFIX on every poll and
+suffix-match every key; under landing prefixes with millions of objects a
+single pass took minutes.
+
+DiscoveryIndex keeps a filename -> key map in memory and refreshes it in
+sweeps over a tree of nodes:
+- The prefix and the sub-prefixes above SHARD_DEPTH delimiter levels are
+  listed with Delimiter; the folders they report (e.g. date or customer
+  folders) become nodes of the next level, and the sub-prefixes at
+  SHARD_DEPTH are shards listed without it. A flat prefix is simply a
+  root with no folders.
+- Every node is listed in full once, then only continued with StartAfter
+  from the last key seen (the last folder, for nodes that have folders),
+  which is usually a single page. This picks up new objects and new
+  folders that sort last (dates, sequence numbers) without re-listing
+  what is already indexed.
+- Keys that land behind a node's watermark are picked up when it is
+  relisted in full: every full_resweep_every sweeps while the node is hot
+  (its newest object is within hot_window_seconds), COLD_RESWEEP_FACTOR
+  times less often once it is cold. Large nodes are relisted as key ranges
+  (about range_keys entries each, split at keys seen in the previous full
+  listing) in parallel, so a flat prefix with millions of keys is not one
+  sequential pagination.
+- Exact keys someone is waiting for (watch_key) do not wait for that: while
+  one sorts behind its node's watermark, each incremental sweep also lists
+  the node from just before it, usually one request that ends at the key.
+- The index remembers at most max_keys keys and filenames, dropping those
+  discovered first.
+- Sweeps are single-flight: concurrent callers waiting on the same index
+  share one sweep instead of each listing the prefix.
+
+Listings carry Size/ETag/LastModified, so the index also answers "has this
+key arrived with this size" without any HeadObject (see e2e_arrival.BatchWaiter).
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+LOG = logging.getLogger("e2e-discovery")
+
+DEFAULT_SHARD_DEPTH = 1
+DEFAULT_DISCOVERY_WORKERS = 16
+DEFAULT_HOT_WINDOW_SECONDS = 3600
+DEFAULT_FULL_RESWEEP_EVERY = 10
+DEFAULT_RANGE_KEYS = 10000
+DEFAULT_MAX_INDEXED_KEYS = 200_000
+COLD_RESWEEP_FACTOR = 4
+
+
+class ObjectInfo(NamedTuple):
+    key: str
+    size: int
+    etag: str
+    last_modified: Optional[datetime]
+
+
+@dataclass
+class _Node:
+    prefix: str
+    delimited: bool                           # lists folders (above shard depth) or is a shard
+    last_key: Optional[str] = None            # StartAfter watermark
+    last_folder: Optional[str] = None         # ... for delimited nodes that have folders
+    newest: Optional[datetime] = None         # LastModified watermark
+    listed: bool = False
+    since_full: int = 0                       # incremental sweeps since the last full listing
+    bounds: List[str] = field(default_factory=list)  # key-range split points for full listings
+
+
+class _Listing(NamedTuple):
+    objects: int
+    folders: List[str]
+    last: Optional[str]
+    last_folder: Optional[str]
+    newest: Optional[datetime]
+    samples: List[str]
+
+
+class DiscoveryIndex:
+    def __init__(self, s3, bucket: str, prefix: str = "",
+                 delimiter: str = "/",
+                 shard_depth: int = DEFAULT_SHARD_DEPTH,
+                 max_workers: int = DEFAULT_DISCOVERY_WORKERS,
+                 hot_window_seconds: int = DEFAULT_HOT_WINDOW_SECONDS,
+                 full_resweep_every: int = DEFAULT_FULL_RESWEEP_EVERY,
+                 range_keys: int = DEFAULT_RANGE_KEYS,
+                 max_keys: int = DEFAULT_MAX_INDEXED_KEYS):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix or ""
+        self.delimiter = delimiter
+        self.shard_depth = max(0, shard_depth) if delimiter else 0
+        self.max_workers = max(1, max_workers)
+        self.hot_window = timedelta(seconds=hot_window_seconds)
+        self.full_resweep_every = max(1, full_resweep_every)
+        self.range_keys = max(1000, range_keys)
+        self.max_keys = max(1, max_keys)
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._names: "OrderedDict[str, ObjectInfo]" = OrderedDict()   # filename -> newest object
+        self._keys: "OrderedDict[str, ObjectInfo]" = OrderedDict()    # key -> object
+        # Nodes by depth below the prefix; the deepest level holds the shards
+        self._levels: List[Dict[str, _Node]] = [{} for _ in range(self.shard_depth + 1)]
+        self._levels[0][self.prefix] = _Node(self.prefix, delimited=self.shard_depth > 0)
+        self._watched: Dict[str, int] = {}  # exact keys waited for -> number of waiters
+        # Counters for logs/metrics
+        self.sweeps = 0
+        self.list_requests = 0
+        self.evicted = 0
+
+    # --- internals ---
+    def _pages(self, **kwargs):
+        for page in self.s3.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, **kwargs):
+            with self._lock:
+                self.list_requests += 1
+            yield page
+
+    @staticmethod
+    def _remember(index: "OrderedDict[str, ObjectInfo]", key: str, info: ObjectInfo) -> None:
+        # Only new or changed entries move to the back: eviction drops what was discovered first
+        if index.get(key) != info:
+            index[key] = info
+            index.move_to_end(key)
+
+    def _record(self, objects: List[dict]) -> None:
+        with self._lock:
+            for obj in objects:
+                key = obj["Key"]
+                info = ObjectInfo(key, int(obj.get("Size", 0)), (obj.get("ETag") or "").strip('"'),
+                                  obj.get("LastModified"))
+                self._remember(self._keys, key, info)
+                name = key.rsplit(self.delimiter, 1)[-1] if self.delimiter else key
+                seen = self._names.get(name)
+                lm = info.last_modified
+                if seen is None or (lm and (seen.last_modified is None or lm > seen.last_modified)):
+                    self._remember(self._names, name, info)
+            for index in (self._keys, self._names):
+                while len(index) > self.max_keys:
+                    index.popitem(last=False)
+                    self.evicted += 1
+
+    def _list(self, node: _Node, start_after: Optional[str], upper: Optional[str]) -> _Listing:
+        """Lists the node's entries in (start_after, upper]; records the objects."""
+        kwargs = {"Prefix": node.prefix}
+        if node.delimited:
+            kwargs["Delimiter"] = self.delimiter
+        if start_after:
+            kwargs["StartAfter"] = start_after
+        objects = 0
+        folders: List[str] = []
+        samples: List[str] = []
+        seen = 0
+        last: Optional[str] = None
+        newest: Optional[datetime] = None
+        for page in self._pages(**kwargs):
+            contents = page.get("Contents", [])
+            prefixes = [p["Prefix"] for p in page.get("CommonPrefixes", [])]
+            beyond = False
+            if upper is not None:
+                beyond = any(o["Key"] >= upper for o in contents) or any(p >= upper for p in prefixes)
+                contents = [o for o in contents if o["Key"] <= upper]
+                prefixes = [p for p in prefixes if p <= upper]
+            self._record(contents)
+            objects += len(contents)
+            folders.extend(prefixes)
+            for entry in sorted([o["Key"] for o in contents] + prefixes):
+                seen += 1
+                if seen % self.range_keys == 0:
+                    samples.append(entry)
+                last = entry
+            for o in contents:
+                lm = o.get("LastModified")
+                if lm and (newest is None or lm > newest):
+                    newest = lm
+            if beyond:
+                break
+        return _Listing(objects, folders, last, max(folders, default=None), newest, samples)
+
+    def _probe(self, node: _Node, depth: int, key: str) -> Optional[_Node]:
+        """What to list to see `key`: the node, its own folder if no node covers it yet, or None."""
+        if not key.startswith(node.prefix):
+            return None
+        rest = key[len(node.prefix):]
+        if not node.delimited or self.delimiter not in rest:
+            return node
+        folder = node.prefix + rest.split(self.delimiter, 1)[0] + self.delimiter
+        if folder in self._levels[depth + 1]:
+            return None  # the folder's node probes for it
+        # StartAfter also skips folders, so the parent would not report this one
+        return _Node(key.rsplit(self.delimiter, 1)[0] + self.delimiter, delimited=False)
+
+    def _probes(self, node: _Node, depth: int,
+                start: Optional[str]) -> List[Tuple[_Node, Optional[str], Optional[str]]]:
+        """Listings of the watched keys a continuation from `start` would skip, each ending at its key."""
+        if not start:
+            return []
+        with self._lock:
+            keys = sorted(k for k in self._watched if k <= start)
+        # key[:-1] sorts right before the key, so each probe is normally one request
+        return [(probe, key[:-1], key) for key in keys
+                for probe in [self._probe(node, depth, key)] if probe is not None]
+
+    def _plan(self, node: _Node, depth: int) -> Tuple[bool, List[Tuple[_Node, Optional[str], Optional[str]]]]:
+        """
+        (full, [(node, start_after, upper), ...]) for this sweep: one
+        continuation from the watermark plus probes for watched keys behind
+        it, or the key ranges of a full listing.
+        """
+        hot = node.newest is not None and node.newest >= datetime.now(timezone.utc) - self.hot_window
+        every = self.full_resweep_every * (1 if hot else COLD_RESWEEP_FACTOR)
+        if node.listed and node.since_full + 1 < every:
+            # Folders are what a delimited node is for: continue after the
+            # last one, even if loose keys sorting after it are listed again
+            start = node.last_folder or node.last_key
+            return False, [(node, start, None)] + self._probes(node, depth, start)
+        edges: List[Optional[str]] = [None] + list(node.bounds) + [None]
+        return True, [(node, lo, hi) for lo, hi in zip(edges, edges[1:])]
+
+    def _apply(self, node: _Node, full: bool, listings: List[_Listing]) -> List[str]:
+        """Updates the node's watermarks; returns the folders it reported."""
+        folders: List[str] = []
+        with self._lock:
+            for listing in listings:
+                folders.extend(listing.folders)
+                if listing.last and (node.last_key is None or listing.last > node.last_key):
+                    node.last_key = listing.last
+                if listing.last_folder and (node.last_folder is None or listing.last_folder > node.last_folder):
+                    node.last_folder = listing.last_folder
+                if listing.newest and (node.newest is None or listing.newest > node.newest):
+                    node.newest = listing.newest
+            if full:
+                node.bounds = sorted({s for listing in listings for s in listing.samples})
+                node.since_full = 0
+            else:
+                node.since_full += 1
+            node.listed = True
+        return folders
+
+    # --- public API ---
+    def sweep(self) -> None:
+        """Refreshes the index. Callers arriving during a sweep reuse its result."""
+        generation = self.sweeps
+        with self._sweep_lock:
+            if self.sweeps != generation:
+                return
+            start = time.time()
+            requests_before = self.list_requests
+            found = 0
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="discover") as ex:
+                # Level by level, so folders found above are listed in the same sweep
+                for depth, nodes in enumerate(self._levels):
+                    plans = {prefix: self._plan(node, depth) for prefix, node in nodes.items()}
+                    tasks = [task for _, plan in plans.values() for task in plan]
+                    listings = list(ex.map(lambda task: self._list(*task), tasks))
+                    pos = 0
+                    for prefix, (full, plan) in plans.items():
+                        node = nodes[prefix]
+                        mine = listings[pos:pos + len(plan)]
+                        pos += len(plan)
+                        found += sum(listing.objects for listing in mine)
+                        folders = self._apply(node, full, mine)
+                        if depth < self.shard_depth:
+                            below = self._levels[depth + 1]
+                            for folder in folders:
+                                if folder not in below:
+                                    below[folder] = _Node(folder, delimited=depth + 1 < self.shard_depth)
+            self.sweeps += 1
+            LOG.info("Discovery sweep %d: %d node(s), %d object(s) listed, %d request(s), %d indexed, %.2fs",
+                     self.sweeps, sum(len(nodes) for nodes in self._levels), found, self.list_requests - requests_before,
+                     len(self._names), time.time() - start)
+
+    def watch_key(self, key: str) -> None:
+        """Makes sweeps look for `key` even behind the watermarks, until unwatch_key."""
+        with self._lock:
+            self._watched[key] = self._watched.get(key, 0) + 1
+
+    def unwatch_key(self, key: str) -> None:
+        with self._lock:
+            n = self._watched.get(key, 0) - 1
+            if n > 0:
+                self._watched[key] = n
+            else:
+                self._watched.pop(key, None)
+
+    def lookup(self, filename: str) -> Optional[str]:
+        info = self.lookup_object(filename)
+        return info.key if info else None
+
+    def lookup_object(self, filename: str) -> Optional[ObjectInfo]:
+        with self._lock:
+            return self._names.get(filename)
+
+    def object_for_key(self, key: str) -> Optional[ObjectInfo]:
+        with self._lock:
+            return self._keys.get(key)
+
+    def find(self, filename: str, refresh: bool = True) -> Optional[str]:
+        """Key for `filename`, sweeping once if it is not indexed yet."""
+        key = self.lookup(filename)
+        if key is None and refresh:
+            self.sweep()
+            key = self.lookup(filename)
+        return key
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sweeps": self.sweeps,
+                "nodes": sum(len(nodes) for nodes in self._levels),
+                "shards": len(self._levels[-1]),
+                "keys": len(self._keys),
+                "filenames": len(self._names),
+                "evicted": self.evicted,
+                "watched": len(self._watched),
+                "list_requests": self.list_requests,
+            }
+
+
+_INDEXES: Dict[Tuple[int, str, str], DiscoveryIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_discovery_index(s3, bucket: str, prefix: str = "", **kwargs) -> DiscoveryIndex:
+    """Process-wide index per (client, bucket, prefix), so concurrent tests share sweeps."""
+    key = (id(s3), bucket, prefix or "")
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = DiscoveryIndex(s3, bucket, prefix, **kwargs)
+            _INDEXES[key] = index
+    return index
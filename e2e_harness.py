@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the E2E scripts: an in-process SFTP server, a moto S3
+server and a throttling proxy in front of each.
+
+Nothing in the repo could run without partner SFTP hosts and real buckets,
+so changes to the relay, the upload fan-out or the verifiers could not be
+measured reproducibly. LocalHarness starts:
+- a paramiko SFTP server backed by a temp dir (public-key auth with a
+  generated client key),
+- moto's S3 server on localhost (buckets created up front),
+- a ThrottledProxy per endpoint that adds per-connection RTT and a
+  per-direction bandwidth cap, so pipelining and parallelism changes show
+  the gains they would have over a real WAN link,
+- optionally, the managed pipeline of the sftp->s3 route: files that land
+  in the inbound SFTP dir are copied to S3_BUCKET/S3_PREFIX after a delay.
+
+env() returns the variables the four scripts read, so they run unchanged:
+  python e2e_harness.py --rtt-ms 40 --bandwidth-mbps 200 -- python sftp_to_s3_e2e_test.py
+Without a command the variables are printed as exports and the servers run
+until interrupted.
+
+Needs paramiko and moto[server] (pip install 'moto[server]').
+"""
+
+import os
+import sys
+import time
+import queue
+import shutil
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import paramiko
+
+from e2e_transfer import DEFAULT_PART_SUFFIX
+
+LOG = logging.getLogger("e2e-harness")
+
+DEFAULT_SFTP_USERNAME = "e2e"
+DEFAULT_SRC_BUCKET = "e2e-src"
+DEFAULT_TGT_BUCKET = "e2e-tgt"
+DEFAULT_REGION = "us-east-1"
+PROXY_CHUNK = 64 * 1024
+
+
+def setup_logging(level: str) -> None:
+    logging.basicConfig(
+        level=getattr(logging, level.upper(), logging.INFO),
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+
+
+# -----------------------------
+# Throttling proxy
+# -----------------------------
+@dataclass(frozen=True)
+class Throttle:
+    rtt_seconds: float = 0.0                  # added per round trip (half each way)
+    bandwidth_bytes_per_s: Optional[float] = None  # per connection and direction; None = unlimited
+
+    @property
+    def active(self) -> bool:
+        return self.rtt_seconds > 0 or bool(self.bandwidth_bytes_per_s)
+
+
+class _Pipe:
+    """
+    One direction of a proxied connection. Data is released after the one-way
+    delay and paced to the bandwidth cap, but reading continues meanwhile, so
+    in-flight data is pipelined like on a real link instead of serialized.
+    """
+
+    def __init__(self, src: socket.socket, dst: socket.socket, throttle: Throttle):
+        self.src = src
+        self.dst = dst
+        self.delay = throttle.rtt_seconds / 2.0
+        self.bandwidth = throttle.bandwidth_bytes_per_s
+        self._queue: "queue.Queue[Tuple[float, bytes]]" = queue.Queue()
+
+    def _reader(self) -> None:
+        try:
+            while True:
+                data = self.src.recv(PROXY_CHUNK)
+                if not data:
+                    break
+                self._queue.put((time.monotonic() + self.delay, data))
+        except OSError:
+            pass
+        self._queue.put((0.0, b""))
+
+    def _writer(self) -> None:
+        next_free = 0.0
+        try:
+            while True:
+                release, data = self._queue.get()
+                if not data:
+                    break
+                now = time.monotonic()
+                send_at = max(release, next_free)
+                if send_at > now:
+                    time.sleep(send_at - now)
+                self.dst.sendall(data)
+                if self.bandwidth:
+                    next_free = max(send_at, time.monotonic()) + len(data) / self.bandwidth
+        except OSError:
+            pass
+        finally:
+            try:
+                self.dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    def start(self) -> List[threading.Thread]:
+        threads = [threading.Thread(target=self._reader, daemon=True),
+                   threading.Thread(target=self._writer, daemon=True)]
+        for t in threads:
+            t.start()
+        return threads
+
+
+class ThrottledProxy:
+    """TCP proxy on 127.0.0.1 adding RTT/bandwidth limits to every connection."""
+
+    def __init__(self, upstream_host: str, upstream_port: int, throttle: Throttle):
+        self.upstream = (upstream_host, upstream_port)
+        self.throttle = throttle
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(128)
+        self.port = self._sock.getsockname()[1]
+        self._closed = False
+        self.connections = 0
+
+    def _serve(self, client: socket.socket) -> None:
+        try:
+            upstream = socket.create_connection(self.upstream)
+        except OSError as e:
+            LOG.warning("Proxy %d: upstream %s:%d unavailable: %s", self.port, *self.upstream, e)
+            client.close()
+            return
+        for s in (client, upstream):
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threads = _Pipe(client, upstream, self.throttle).start() + _Pipe(upstream, client, self.throttle).start()
+        for t in threads:
+            t.join()
+        client.close()
+        upstream.close()
+
+    def _accept_loop(self) -> None:
+        while not self._closed:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                break
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def start(self) -> "ThrottledProxy":
+        threading.Thread(target=self._accept_loop, daemon=True, name=f"proxy-{self.port}").start()
+        return self
+
+    def close(self) -> None:
+        self._closed = True
+        self._sock.close()
+
+
+# -----------------------------
+# SFTP server
+# -----------------------------
+class _SFTPHandle(paramiko.SFTPHandle):
+    def __init__(self, flags: int, path: str, on_close: Optional[Callable[[str], None]]):
+        super().__init__(flags)
+        self.path = path
+        self.wrote = False
+        self._on_close = on_close
+
+    def write(self, offset, data):
+        self.wrote = True
+        return super().write(offset, data)
+
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OK
+
+    def close(self):
+        super().close()
+        if self.wrote and self._on_close:
+            self._on_close(self.path)
+
+
+class _SFTPServerInterface(paramiko.SFTPServerInterface):
+    """Maps SFTP paths onto `root`; path traversal outside it is clamped."""
+
+    def __init__(self, server, *args, root: str, on_written: Optional[Callable[[str], None]] = None, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = root
+        self.on_written = on_written
+
+    def _local(self, path: str) -> str:
+        return os.path.join(self.root, self.canonicalize(path).lstrip("/"))
+
+    def _remote(self, local: str) -> str:
+        return "/" + os.path.relpath(local, self.root).replace(os.sep, "/")
+
+    def _notify(self, local: str) -> None:
+        if self.on_written:
+            self.on_written(self._remote(local))
+
+    def list_folder(self, path):
+        local = self._local(path)
+        try:
+            out = []
+            for name in os.listdir(local):
+                attr = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(local, name)))
+                attr.filename = name
+                out.append(attr)
+            return out
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        local = self._local(path)
+        try:
+            fd = os.open(local, flags | getattr(os, "O_BINARY", 0), getattr(attr, "st_mode", None) or 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        f = os.fdopen(fd, mode)
+        handle = _SFTPHandle(flags, local, self._notify if self.on_written else None)
+        handle.filename = local
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        new_local = self._local(newpath)
+        try:
+            os.replace(self._local(oldpath), new_local)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        self._notify(new_local)
+        return paramiko.SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        return self.rename(oldpath, newpath)
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._local(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def chattr(self, path, attr):
+        return paramiko.SFTP_OK
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, username: str, authorized_key: paramiko.PKey):
+        self.username = username
+        self.authorized_key = authorized_key
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_auth_publickey(self, username, key):
+        if username == self.username and key == self.authorized_key:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class LocalSFTPServer:
+    """In-process SFTP server on 127.0.0.1 serving `root`."""
+
+    def __init__(self, root: str, username: str, authorized_key: paramiko.PKey,
+                 on_written: Optional[Callable[[str], None]] = None):
+        self.root = root
+        self.username = username
+        self.authorized_key = authorized_key
+        self.on_written = on_written
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(128)
+        self.port = self._sock.getsockname()[1]
+        self._closed = False
+        self._transports: List[paramiko.Transport] = []
+
+    def _serve(self, client: socket.socket) -> None:
+        t = paramiko.Transport(client)
+        t.add_server_key(self.host_key)
+        t.set_subsystem_handler("sftp", paramiko.SFTPServer, _SFTPServerInterface,
+                                root=self.root, on_written=self.on_written)
+        self._transports.append(t)
+        try:
+            t.start_server(server=_ServerInterface(self.username, self.authorized_key))
+        except Exception as e:
+            LOG.debug("SFTP server handshake failed: %s", e)
+            t.close()
+
+    def _accept_loop(self) -> None:
+        while not self._closed:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def start(self) -> "LocalSFTPServer":
+        threading.Thread(target=self._accept_loop, daemon=True, name=f"sftpd-{self.port}").start()
+        return self
+
+    def close(self) -> None:
+        self._closed = True
+        self._sock.close()
+        for t in self._transports:
+            t.close()
+
+
+# -----------------------------
+# Harness
+# -----------------------------
+class LocalHarness:
+    """
+    Starts the stand-ins; use as a context manager. Endpoints (SRC SFTP, TGT
+    SFTP, S3) each get their own proxy, so per-endpoint limits and throttles
+    apply separately.
+    """
+
+    def __init__(self,
+                 throttle: Throttle = Throttle(),
+                 pipeline_delay_seconds: Optional[float] = 0.0,
+                 src_bucket: str = DEFAULT_SRC_BUCKET,
+                 tgt_bucket: str = DEFAULT_TGT_BUCKET,
+                 s3_prefix: str = "inbound/",
+                 username: str = DEFAULT_SFTP_USERNAME):
+        self.throttle = throttle
+        self.pipeline_delay_seconds = pipeline_delay_seconds
+        self.src_bucket = src_bucket
+        self.tgt_bucket = tgt_bucket
+        self.s3_prefix = s3_prefix
+        self.username = username
+        self.workdir: Optional[str] = None
+        self.key_path: Optional[str] = None
+        self.s3_endpoint_url: Optional[str] = None
+        self._moto = None
+        self._sftp: Optional[LocalSFTPServer] = None
+        self._proxies: Dict[str, ThrottledProxy] = {}
+        self._delivered: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    # --- stand-ins ---
+    def _start_s3(self) -> None:
+        from moto.server import ThreadedMotoServer
+
+        self._moto = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+        self._moto.start()
+        host, port = self._moto.get_host_and_port()
+        self._proxies["s3"] = ThrottledProxy(host, port, self.throttle).start()
+        self.s3_endpoint_url = f"http://127.0.0.1:{self._proxies['s3'].port}"
+        s3 = self._admin_s3()
+        for bucket in {self.src_bucket, self.tgt_bucket}:
+            s3.create_bucket(Bucket=bucket)
+
+    def _admin_s3(self):
+        """Unthrottled client for setup and pipeline delivery."""
+        import boto3
+
+        host, port = self._moto.get_host_and_port()
+        return boto3.client("s3", region_name=DEFAULT_REGION, endpoint_url=f"http://{host}:{port}",
+                            aws_access_key_id="testing", aws_secret_access_key="testing")
+
+    def _deliver(self, remote_path: str) -> None:
+        """The sftp->s3 pipeline: inbound files are copied to S3 after the configured delay."""
+        if not remote_path.startswith("/inbound/") or remote_path.endswith(DEFAULT_PART_SUFFIX):
+            return
+        local = os.path.join(self.workdir, "sftp", remote_path.lstrip("/"))
+
+        def run() -> None:
+            time.sleep(self.pipeline_delay_seconds or 0)
+            try:
+                st = os.stat(local)
+            except OSError:
+                return
+            with self._lock:
+                if self._delivered.get(remote_path) == st.st_mtime:
+                    return
+                self._delivered[remote_path] = st.st_mtime
+            key = f"{self.s3_prefix}{os.path.basename(remote_path)}"
+            self._admin_s3().upload_file(local, self.src_bucket, key)
+            LOG.debug("Pipeline delivered %s -> s3://%s/%s", remote_path, self.src_bucket, key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def start(self) -> "LocalHarness":
+        self.workdir = tempfile.mkdtemp(prefix="e2e-harness-")
+        root = os.path.join(self.workdir, "sftp")
+        for d in ("inbound", "src", "tgt"):
+            os.makedirs(os.path.join(root, d))
+
+        client_key = paramiko.RSAKey.generate(2048)
+        self.key_path = os.path.join(self.workdir, "id_rsa")
+        client_key.write_private_key_file(self.key_path)
+
+        on_written = self._deliver if self.pipeline_delay_seconds is not None else None
+        self._sftp = LocalSFTPServer(root, self.username, client_key, on_written).start()
+        for name in ("sftp-src", "sftp-tgt"):
+            self._proxies[name] = ThrottledProxy("127.0.0.1", self._sftp.port, self.throttle).start()
+        self._start_s3()
+        LOG.info("Harness up: sftp src=:%d tgt=:%d s3=%s rtt=%.0fms bandwidth=%s workdir=%s",
+                 self._proxies["sftp-src"].port, self._proxies["sftp-tgt"].port, self.s3_endpoint_url,
+                 self.throttle.rtt_seconds * 1000,
+                 f"{self.throttle.bandwidth_bytes_per_s / 1e6:.1f} MB/s" if self.throttle.bandwidth_bytes_per_s else "unlimited",
+                 self.workdir)
+        return self
+
+    def close(self) -> None:
+        for proxy in self._proxies.values():
+            proxy.close()
+        if self._sftp:
+            self._sftp.close()
+        if self._moto:
+            self._moto.stop()
+        if self.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def __enter__(self) -> "LocalHarness":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # --- script configuration ---
+    def env(self) -> Dict[str, str]:
+        src_port = str(self._proxies["sftp-src"].port)
+        tgt_port = str(self._proxies["sftp-tgt"].port)
+        env = {
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "AWS_REGION": DEFAULT_REGION,
+            "AWS_DEFAULT_REGION": DEFAULT_REGION,
+            "S3_ENDPOINT_URL": self.s3_endpoint_url,
+            # sftp->s3 (upload to SFTP, the pipeline lands it in S3)
+            "SFTP_HOST": "127.0.0.1",
+            "SFTP_PORT": src_port,
+            "SFTP_USERNAME": self.username,
+            "SFTP_PRIVATE_KEY_PATH": self.key_path,
+            "SFTP_REMOTE_DIR": "/inbound",
+            "S3_BUCKET": self.src_bucket,
+            "S3_PREFIX": self.s3_prefix,
+            # s3->s3
+            "SRC_BUCKET": self.src_bucket,
+            "TGT_BUCKET": self.tgt_bucket,
+            # sftp->sftp and s3->sftp
+            "SRC_SFTP_REMOTE_DIR": "/src",
+            "TGT_SFTP_REMOTE_DIR": "/tgt",
+        }
+        for side, port in (("SRC", src_port), ("TGT", tgt_port)):
+            env.update({
+                f"{side}_SFTP_HOST": "127.0.0.1",
+                f"{side}_SFTP_PORT": port,
+                f"{side}_SFTP_USERNAME": self.username,
+                f"{side}_SFTP_PRIVATE_KEY_PATH": self.key_path,
+            })
+        return env
+
+    def apply_env(self) -> None:
+        """Exports env() into this process, for in-process runs (e2e_runner, e2e_bench)."""
+        os.environ.update(self.env())
+
+    def proxy_connections(self) -> Dict[str, int]:
+        return {name: p.connections for name, p in self._proxies.items()}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description="Local SFTP + S3 stand-ins with latency/bandwidth throttling")
+    ap.add_argument("--rtt-ms", type=float, default=0.0, help="Added round-trip time per connection")
+    ap.add_argument("--bandwidth-mbps", type=float, default=None,
+                    help="Per-connection, per-direction cap in megabits/s (default: unlimited)")
+    ap.add_argument("--pipeline-delay", type=float, default=0.0,
+                    help="Seconds before inbound SFTP files are delivered to S3 (sftp->s3 route)")
+    ap.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "INFO"))
+    ap.add_argument("command", nargs=argparse.REMAINDER, help="Command to run against the harness (after --)")
+    return ap
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    setup_logging(args.log_level)
+    throttle = Throttle(
+        rtt_seconds=args.rtt_ms / 1000.0,
+        bandwidth_bytes_per_s=args.bandwidth_mbps * 1e6 / 8 if args.bandwidth_mbps else None,
+    )
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+
+    with LocalHarness(throttle, pipeline_delay_seconds=args.pipeline_delay) as harness:
+        env = harness.env()
+        if command:
+            # ENV_FILE points nowhere so a developer's .env cannot redirect the run
+            return subprocess.call(command, env={**os.environ, **env, "ENV_FILE": os.devnull})
+        for k, v in sorted(env.items()):
+            print(f"export {k}={v}")
+        sys.stdout.flush()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
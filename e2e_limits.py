@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Per-endpoint concurrency limits shared by the E2E scripts.
+
+Run standalone, a script is the only client of its endpoints and no limit
+applies. When many scenarios run in one process (e2e_runner), each I/O
+phase takes a slot on the endpoints it touches (an SFTP host, an S3 bucket)
+so that a few slow partner servers cannot be swamped. Waiting phases hold
+no slot.
+
+Scenario coroutines (e2e_runner) hand each blocking call to endpoint_io,
+which runs it on that endpoint's bounded executor: a slow endpoint can
+only tie up its own threads, and the event loop is free for everything
+else. Polls made while waiting (HeadObject, SQS receives, stats) go to a
+small per-endpoint poll executor and take no slot.
+"""
+
+import re
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+
+DEFAULT_ENDPOINT_WORKERS = 32   # I/O threads per endpoint when it has no limit
+DEFAULT_POLL_WORKERS = 16       # poll threads per endpoint
+
+_LOCK = threading.Lock()
+_LIMITS: Dict[str, int] = {}
+_SEMAPHORES: Dict[str, threading.BoundedSemaphore] = {}
+_EXECUTORS: Dict[Tuple[str, bool], ThreadPoolExecutor] = {}
+_DEFAULT_LIMIT: Optional[int] = None  # None = unlimited
+
+
+def sftp_endpoint(host: str, port: int) -> str:
+    return f"sftp://{host}:{port}"
+
+
+def s3_endpoint(bucket: str) -> str:
+    return f"s3://{bucket}"
+
+
+def set_endpoint_limit(endpoint: str, limit: Optional[int]) -> None:
+    """Limit for one endpoint; takes effect for slots created afterwards."""
+    with _LOCK:
+        if limit is None:
+            _LIMITS.pop(endpoint, None)
+        else:
+            _LIMITS[endpoint] = max(1, limit)
+        _SEMAPHORES.pop(endpoint, None)
+        _drop_executor(endpoint, True)
+
+
+def set_default_endpoint_limit(limit: Optional[int]) -> None:
+    global _DEFAULT_LIMIT
+    with _LOCK:
+        _DEFAULT_LIMIT = None if limit is None else max(1, limit)
+        _SEMAPHORES.clear()
+        for endpoint, io in list(_EXECUTORS):
+            if io:
+                _drop_executor(endpoint, io)
+
+
+def _semaphore(endpoint: str) -> Optional[threading.BoundedSemaphore]:
+    with _LOCK:
+        limit = _LIMITS.get(endpoint, _DEFAULT_LIMIT)
+        if limit is None:
+            return None
+        sem = _SEMAPHORES.get(endpoint)
+        if sem is None:
+            sem = threading.BoundedSemaphore(limit)
+            _SEMAPHORES[endpoint] = sem
+        return sem
+
+
+@contextmanager
+def endpoint_slot(*endpoints: str) -> Iterator[None]:
+    """
+    Holds one slot on each endpoint. Slots are taken in sorted order so
+    phases touching two endpoints (copies, relays) cannot deadlock.
+    """
+    held = []
+    try:
+        for endpoint in sorted(set(endpoints)):
+            sem = _semaphore(endpoint)
+            if sem is not None:
+                sem.acquire()
+                held.append(sem)
+        yield
+    finally:
+        for sem in reversed(held):
+            sem.release()
+
+
+# -----------------------------
+# Executors (asyncio callers)
+# -----------------------------
+def _drop_executor(endpoint: str, io: bool) -> None:
+    # Called with _LOCK held; running calls finish on the old executor
+    ex = _EXECUTORS.pop((endpoint, io), None)
+    if ex is not None:
+        ex.shutdown(wait=False)
+
+
+def _executor(endpoint: str, io: bool) -> ThreadPoolExecutor:
+    with _LOCK:
+        ex = _EXECUTORS.get((endpoint, io))
+        if ex is None:
+            if io:
+                workers = _LIMITS.get(endpoint, _DEFAULT_LIMIT) or DEFAULT_ENDPOINT_WORKERS
+            else:
+                workers = DEFAULT_POLL_WORKERS
+            name = re.sub(r"[^A-Za-z0-9.-]+", "_", endpoint).strip("_")
+            ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-{'io' if io else 'poll'}")
+            _EXECUTORS[(endpoint, io)] = ex
+        return ex
+
+
+def _in_slot(endpoints: Tuple[str, ...], fn: Callable[[], T]) -> T:
+    with endpoint_slot(*endpoints):
+        return fn()
+
+
+async def endpoint_io(endpoints: Union[str, Tuple[str, ...]], fn: Callable[..., T], *args,
+                      slot: bool = True, **kwargs) -> T:
+    """
+    Awaits blocking fn(*args, **kwargs) run on the executor of the first
+    endpoint, holding a slot on every endpoint while it runs. slot=False
+    runs it on the endpoint's poll executor without a slot, for waits.
+    """
+    if isinstance(endpoints, str):
+        endpoints = (endpoints,)
+    call = functools.partial(fn, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    if not slot:
+        return await loop.run_in_executor(_executor(endpoints[0], False), call)
+    return await loop.run_in_executor(_executor(endpoints[0], True), _in_slot, endpoints, call)
+
+
+def shutdown_executors() -> None:
+    """Stops every endpoint executor (end of a runner process); new calls start fresh ones."""
+    with _LOCK:
+        executors = list(_EXECUTORS.values())
+        _EXECUTORS.clear()
+    for ex in executors:
+        ex.shutdown(wait=True)
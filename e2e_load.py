@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Load/soak mode: mixed file sizes at a target arrival rate or concurrency.
+
+TEST_SIZE gives every run a single size, but real traffic is thousands of
+small files plus a few very large ones. This samples sizes from a weighted
+distribution, launches scenarios through the e2e_runner machinery for a
+fixed duration and reports, per route:
+- end-to-end latency p50/p95/p99 (open-loop latency counts from the
+  scheduled arrival, so queueing behind a saturated pipeline is included),
+- files/s and bytes/s of passed scenarios,
+- a latency histogram (power-of-two buckets).
+
+Size distributions ("--sizes" or a histogram file via "--sizes @file"):
+  1KB:70,1MB:25,100MB:4.9,20GB:0.1   weighted sizes
+  1MB-100MB:10                       log-uniform within the range
+Histogram files hold one "<size>[,| ]<weight>" pair per line; '#' comments.
+
+Load shapes:
+  --rate 5        open loop, Poisson arrivals (files/s), in-flight capped by --max-concurrency
+  --concurrency 20  closed loop, each worker starts the next file when its last one ends
+
+Example:
+  python e2e_load.py --routes sftp-s3:3,s3-s3:1 --sizes @sizes.txt --rate 10 --duration 600
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+from bisect import bisect_left
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple
+
+from e2e_limits import set_default_endpoint_limit
+from e2e_metrics import METRICS
+from e2e_payload import DEFAULT_PAD_CACHE_SEEDS, set_pad_cache_size
+from e2e_runner import (
+    DEFAULT_MAX_CONCURRENCY,
+    Scenario,
+    ScenarioResult,
+    close_shared_pools,
+    load_route,
+    run_scenario,
+    setup_logging,
+    with_overrides,
+)
+from e2e_transfer import percentiles
+from s3_to_s3_e2e_test import parse_size  # knows every unit (B/KB/KiB...), unlike some routes' parsers
+
+LOG = logging.getLogger("e2e-load")
+
+DEFAULT_DURATION_SECONDS = 300
+PERCENTILES = (50, 95, 99)
+
+
+# -----------------------------
+# Weighted sampling
+# -----------------------------
+class Weighted:
+    """Picks items with probability proportional to their weights."""
+
+    def __init__(self, items: List[Tuple[Any, float]]):
+        items = [(item, float(w)) for item, w in items if float(w) > 0]
+        if not items:
+            raise ValueError("Distribution has no entries with a positive weight")
+        self.items = [item for item, _ in items]
+        self.weights = [w for _, w in items]
+        self._cumulative = list(accumulate(self.weights))
+
+    def sample(self, rng: random.Random) -> Any:
+        i = bisect_left(self._cumulative, rng.random() * self._cumulative[-1])
+        return self.items[min(i, len(self.items) - 1)]
+
+
+@dataclass(frozen=True)
+class SizeBucket:
+    low: int
+    high: int   # == low for a fixed size
+
+    def sample(self, rng: random.Random) -> int:
+        if self.high <= self.low:
+            return self.low
+        # log-uniform: a 1MB-1GB bucket should not be dominated by ~500MB files
+        lo, hi = math.log(max(1, self.low)), math.log(self.high)
+        return int(round(math.exp(rng.uniform(lo, hi))))
+
+
+def _split_weight(entry: str) -> Tuple[str, float]:
+    for sep in (":", ",", " ", "\t"):
+        if sep in entry:
+            value, weight = entry.rsplit(sep, 1)
+            return value.strip(), float(weight)
+    return entry.strip(), 1.0
+
+
+def parse_size_distribution(spec: str) -> Weighted:
+    """'1KB:70,1MB:25,1MB-100MB:5', or '@path' to a histogram file."""
+    if spec.startswith("@"):
+        with open(spec[1:], "r", encoding="utf-8") as f:
+            entries = [line.split("#", 1)[0].strip() for line in f]
+    else:
+        entries = [e.strip() for e in spec.split(",")]
+
+    buckets: List[Tuple[SizeBucket, float]] = []
+    for entry in filter(None, entries):
+        value, weight = _split_weight(entry)
+        low, _, high = value.partition("-")
+        low_b = parse_size(low)
+        high_b = parse_size(high) if high else low_b
+        if high_b < low_b:
+            raise ValueError(f"Size range {value} is reversed")
+        buckets.append((SizeBucket(low_b, high_b), weight))
+    return Weighted(buckets)
+
+
+def parse_route_mix(spec: str) -> Weighted:
+    """'sftp-s3:3,s3-s3:1' (weights default to 1)."""
+    return Weighted([_split_weight(e) if ":" in e else (e.strip(), 1.0)
+                     for e in spec.split(",") if e.strip()])
+
+
+# -----------------------------
+# Stats
+# -----------------------------
+def latency_histogram(latencies: List[float]) -> Dict[str, int]:
+    """Counts per power-of-two bucket, labelled by upper bound: {'<=0.5s': 3, '<=1s': 10, ...}."""
+    counts: Dict[float, int] = {}
+    for v in latencies:
+        bound = 2.0 ** math.ceil(math.log2(v)) if v > 0 else 0.0
+        counts[bound] = counts.get(bound, 0) + 1
+    return {f"<={b:g}s": counts[b] for b in sorted(counts)}
+
+
+@dataclass
+class LoadSample:
+    result: ScenarioResult
+    latency: float   # from scheduled arrival to completion
+
+
+def route_report(samples: List[LoadSample], elapsed: float) -> Dict[str, Any]:
+    passed = [s for s in samples if s.result.ok]
+    latencies = sorted(s.latency for s in passed)
+    total_bytes = sum(s.result.scenario.size_bytes for s in passed)
+    report: Dict[str, Any] = {
+        "started": len(samples),
+        "passed": len(passed),
+        "failed": len(samples) - len(passed),
+        "files_per_second": len(passed) / elapsed if elapsed else 0.0,
+        "bytes_per_second": total_bytes / elapsed if elapsed else 0.0,
+        "bytes": total_bytes,
+    }
+    for name, value in percentiles(latencies, PERCENTILES).items():
+        report[f"{name}_seconds"] = value
+    report["max_seconds"] = latencies[-1] if latencies else 0.0
+    report["latency_histogram"] = latency_histogram(latencies)
+    return report
+
+
+def load_report(samples: List[LoadSample], elapsed: float) -> Dict[str, Any]:
+    by_route: Dict[str, List[LoadSample]] = {}
+    for s in samples:
+        by_route.setdefault(s.result.scenario.route, []).append(s)
+    return {
+        "elapsed_seconds": elapsed,
+        "routes": {route: route_report(rs, elapsed) for route, rs in sorted(by_route.items())},
+        "total": route_report(samples, elapsed),
+    }
+
+
+def log_report(report: Dict[str, Any]) -> None:
+    rows = list(report["routes"].items()) + [("TOTAL", report["total"])]
+    for route, r in rows:
+        LOG.info("%-10s files=%d fail=%d p50=%.2fs p95=%.2fs p99=%.2fs max=%.2fs %.2f files/s %.2f MB/s",
+                 route, r["passed"], r["failed"], r["p50_seconds"], r["p95_seconds"], r["p99_seconds"],
+                 r["max_seconds"], r["files_per_second"], r["bytes_per_second"] / 1e6)
+    for route, r in report["routes"].items():
+        LOG.info("%-10s latency histogram: %s", route, r["latency_histogram"])
+
+
+# -----------------------------
+# Load generation
+# -----------------------------
+async def run_load(routes: Dict[str, Tuple[Any, Any]],
+                   route_mix: Weighted,
+                   sizes: Weighted,
+                   duration_seconds: float,
+                   rate: Optional[float] = None,
+                   concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                   max_in_flight: int = DEFAULT_MAX_CONCURRENCY,
+                   seed: Optional[int] = None) -> List[LoadSample]:
+    """
+    Open loop when `rate` is set (Poisson arrivals, at most max_in_flight
+    running), otherwise closed loop with `concurrency` workers. New scenarios
+    start until the duration ends; in-flight ones are then drained.
+    """
+    rng = random.Random(seed)
+    deadline = time.time() + duration_seconds
+    samples: List[LoadSample] = []
+    counter = iter(range(sys.maxsize))
+    workers = max(1, max_in_flight if rate else concurrency)
+    set_pad_cache_size(max(DEFAULT_PAD_CACHE_SEEDS, workers))
+    gate = asyncio.Semaphore(workers)
+
+    def next_scenario() -> Scenario:
+        return Scenario(route_mix.sample(rng), sizes.sample(rng).sample(rng), next(counter))
+
+    async def timed(scenario: Scenario, arrival: float) -> None:
+        result = await run_scenario(gate, scenario, *routes[scenario.route])
+        samples.append(LoadSample(result, time.time() - arrival))
+
+    if rate:
+        tasks = []
+        next_arrival = time.time()
+        while next_arrival < deadline:
+            await asyncio.sleep(max(0.0, next_arrival - time.time()))
+            tasks.append(asyncio.ensure_future(timed(next_scenario(), next_arrival)))
+            next_arrival += rng.expovariate(rate)
+        await asyncio.gather(*tasks)
+    else:
+        async def worker() -> None:
+            while time.time() < deadline:
+                await timed(next_scenario(), time.time())
+        await asyncio.gather(*(worker() for _ in range(workers)))
+    return samples
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description="Load/soak test with mixed file sizes")
+    ap.add_argument("--env-file", default=os.getenv("ENV_FILE", ".env"))
+    ap.add_argument("--routes", default="sftp-s3", help="Route mix, e.g. sftp-s3:3,s3-s3:1")
+    ap.add_argument("--sizes", default=os.getenv("LOAD_SIZES", "1KB:70,1MB:25,100MB:5"),
+                    help="Size distribution, e.g. 1KB:70,1MB-100MB:30, or @histogram-file")
+    ap.add_argument("--duration", type=float, default=DEFAULT_DURATION_SECONDS, help="Seconds to keep launching files")
+    shape = ap.add_mutually_exclusive_group()
+    shape.add_argument("--rate", type=float, default=None, help="Open loop: mean arrivals per second")
+    shape.add_argument("--concurrency", type=int, default=None, help="Closed loop: files in flight")
+    ap.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                    help="Open loop: cap on files in flight")
+    ap.add_argument("--endpoint-limit", type=int, default=None,
+                    help="Concurrent I/O phases per SFTP host / S3 bucket (default: unlimited)")
+    ap.add_argument("--s3-max-pool-connections", type=int, default=None,
+                    help="Shared S3 connection pool size (default S3_MAX_POOL_CONNECTIONS)")
+    ap.add_argument("--seed", type=int, default=None, help="RNG seed for reproducible size/route sequences")
+    ap.add_argument("--json-out", default=None, help="Also write the report as JSON to this path")
+    ap.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "INFO"))
+    return ap
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    setup_logging(args.log_level)
+    set_default_endpoint_limit(args.endpoint_limit)
+
+    routes: Dict[str, Tuple[Any, Any]] = {}
+    try:
+        route_mix = parse_route_mix(args.routes)
+        for route in route_mix.items:
+            module, cfg = load_route(route, args.env_file)
+            routes[route] = (module, with_overrides(cfg, s3_max_pool_connections=args.s3_max_pool_connections))
+        sizes = parse_size_distribution(args.sizes)
+
+        if args.rate:
+            LOG.info("=== LOAD START: %.2f files/s for %.0fs (max in flight %d) ===",
+                     args.rate, args.duration, args.max_concurrency)
+        else:
+            LOG.info("=== LOAD START: %d concurrent for %.0fs ===",
+                     args.concurrency or DEFAULT_MAX_CONCURRENCY, args.duration)
+        start = time.time()
+        samples = asyncio.run(run_load(
+            routes, route_mix, sizes, args.duration,
+            rate=args.rate,
+            concurrency=args.concurrency or DEFAULT_MAX_CONCURRENCY,
+            max_in_flight=args.max_concurrency,
+            seed=args.seed,
+        ))
+        report = load_report(samples, time.time() - start)
+        log_report(report)
+        if args.json_out:
+            with open(args.json_out, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+        return 0 if report["total"]["failed"] == 0 else 2
+
+    except Exception as e:
+        LOG.error("❌ FAIL: %s", str(e))
+        return 2
+
+    finally:
+        close_shared_pools(routes)
+        METRICS.export()
+        LOG.info("=== LOAD END ===")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Per-phase timing metrics with OpenMetrics textfile and JSON export.
+
+The scripts used to report progress only as log lines. Each phase of a run
+(key load, SSH handshake, upload, pipeline latency to first appearance,
+stabilization wait, discovery, verification, cleanup) is now recorded with
+its duration, bytes and request count:
+
+    with METRICS.phase("sftp-s3", "upload", bytes=cfg.size_bytes):
+        ...
+
+Phases are aggregated process-wide per (route, phase), so a single probe
+and a runner driving hundreds of them export the same series. Phases of
+shared pools (key load, SSH handshake) are recorded under route "shared".
+
+Export:
+- METRICS_TEXTFILE: OpenMetrics text, written atomically so node_exporter's
+  textfile collector never reads a partial file,
+- METRICS_JSON: a run report with the same aggregates plus one entry per
+  finished run (phase timeline, result, error).
+
+Other modules can add their own series with add_collector (e.g. the API
+call histograms in e2e_s3_calls).
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+SHARED = "shared"
+METRIC_PREFIX = "e2e"
+MAX_RUN_RECORDS = 10000  # per-run timelines kept for the JSON report (load runs make many)
+
+
+@dataclass
+class PhaseStats:
+    count: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    bytes: int = 0
+    requests: int = 0
+
+
+@dataclass
+class PhaseRecord:
+    """Handed out by Metrics.phase; set bytes/requests once they are known."""
+    route: str
+    phase: str
+    bytes: int = 0
+    requests: int = 0
+    started: float = field(default_factory=time.time)
+    seconds: float = 0.0
+    ok: bool = True
+
+
+@dataclass
+class RunRecord:
+    route: str
+    test_id: str
+    started: float = field(default_factory=time.time)
+    seconds: float = 0.0
+    ok: bool = False
+    error: Optional[str] = None
+    bytes: int = 0
+    phases: List[PhaseRecord] = field(default_factory=list)
+
+    @contextmanager
+    def phase(self, phase: str, bytes: int = 0, requests: int = 0) -> Iterator[PhaseRecord]:
+        """Metrics.phase that also lands in this run's timeline."""
+        with METRICS.phase(self.route, phase, bytes, requests) as rec:
+            self.phases.append(rec)
+            yield rec
+
+    def record(self, phase: str, seconds: float, bytes: int = 0, requests: int = 0) -> None:
+        """A phase timed elsewhere (e.g. arrival waits measured by the waiter)."""
+        rec = PhaseRecord(self.route, phase, bytes, requests, time.time() - seconds, seconds)
+        self.phases.append(rec)
+        METRICS.record(self.route, phase, seconds, bytes, requests)
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases: Dict[Tuple[str, str], PhaseStats] = {}
+        self._runs: Dict[Tuple[str, bool], int] = {}
+        self._run_records: Deque[RunRecord] = deque(maxlen=MAX_RUN_RECORDS)
+        self._collectors: Dict[str, Tuple[Callable[[], object], Callable[[], List[str]]]] = {}
+        self.started = time.time()
+
+    def add_collector(self, name: str, snapshot: Callable[[], object],
+                      openmetrics_lines: Callable[[], List[str]]) -> None:
+        """Extra series: `snapshot` lands under `name` in the JSON report, the lines before # EOF."""
+        with self._lock:
+            self._collectors[name] = (snapshot, openmetrics_lines)
+
+    def record(self, route: str, phase: str, seconds: float, bytes: int = 0, requests: int = 0,
+               ok: bool = True) -> None:
+        with self._lock:
+            stats = self._phases.setdefault((route, phase), PhaseStats())
+            stats.count += 1
+            stats.errors += 0 if ok else 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.bytes += bytes
+            stats.requests += requests
+
+    @contextmanager
+    def phase(self, route: str, phase: str, bytes: int = 0, requests: int = 0) -> Iterator[PhaseRecord]:
+        rec = PhaseRecord(route, phase, bytes, requests)
+        start = time.perf_counter()
+        try:
+            yield rec
+        except BaseException:
+            rec.ok = False
+            raise
+        finally:
+            rec.seconds = time.perf_counter() - start
+            self.record(route, phase, rec.seconds, rec.bytes, rec.requests, rec.ok)
+
+    @contextmanager
+    def run(self, route: str, test_id: str, bytes: int = 0) -> Iterator[RunRecord]:
+        """Wraps one probe; the record is kept for the JSON report."""
+        rec = RunRecord(route, test_id, bytes=bytes)
+        start = time.perf_counter()
+        try:
+            yield rec
+            rec.ok = True
+        except BaseException as e:
+            rec.error = str(e)
+            raise
+        finally:
+            rec.seconds = time.perf_counter() - start
+            with self._lock:
+                key = (route, rec.ok)
+                self._runs[key] = self._runs.get(key, 0) + 1
+                self._run_records.append(rec)
+
+    # --- export ---
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            out = {
+                "started": self.started,
+                "written": time.time(),
+                "phases": [{"route": r, "phase": p, **asdict(s)} for (r, p), s in sorted(self._phases.items())],
+                "runs": [{"route": r, "ok": ok, "count": n} for (r, ok), n in sorted(self._runs.items())],
+                "run_records": [asdict(r) for r in self._run_records],
+            }
+            collectors = list(self._collectors.items())
+        # Collectors take their own locks; call them outside ours
+        for name, (snapshot, _) in collectors:
+            out[name] = snapshot()
+        return out
+
+    def openmetrics(self) -> str:
+        def labels(route: str, phase: Optional[str] = None) -> str:
+            pairs = [("route", route)] + ([("phase", phase)] if phase else [])
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            phases = sorted(self._phases.items())
+            runs = sorted(self._runs.items())
+            collectors = list(self._collectors.values())
+        p = METRIC_PREFIX
+        lines = [
+            f"# TYPE {p}_phase_seconds summary",
+            f"# UNIT {p}_phase_seconds seconds",
+            f"# HELP {p}_phase_seconds Time spent per phase.",
+        ]
+        for (route, phase), s in phases:
+            lines.append(f"{p}_phase_seconds_count{labels(route, phase)} {s.count}")
+            lines.append(f"{p}_phase_seconds_sum{labels(route, phase)} {s.seconds:.6f}")
+        lines += [f"# TYPE {p}_phase_max_seconds gauge", f"# HELP {p}_phase_max_seconds Slowest occurrence of the phase."]
+        lines += [f"{p}_phase_max_seconds{labels(r, ph)} {s.max_seconds:.6f}" for (r, ph), s in phases]
+        for name, attr, help_text in (
+            ("phase_bytes", "bytes", "Bytes moved or checked per phase."),
+            ("phase_requests", "requests", "Remote requests issued per phase."),
+            ("phase_errors", "errors", "Phases that ended with an exception."),
+        ):
+            lines += [f"# TYPE {p}_{name} counter", f"# HELP {p}_{name} {help_text}"]
+            lines += [f"{p}_{name}_total{labels(r, ph)} {getattr(s, attr)}" for (r, ph), s in phases]
+        lines += [f"# TYPE {p}_runs counter", f"# HELP {p}_runs Finished runs by result."]
+        lines += [f'{p}_runs_total{{route="{_escape(r)}",result="{"pass" if ok else "fail"}"}} {n}'
+                  for (r, ok), n in runs]
+        for _, openmetrics_lines in collectors:
+            lines += openmetrics_lines()
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_openmetrics(self, path: str) -> None:
+        _write_atomic(path, self.openmetrics())
+
+    def write_json(self, path: str) -> None:
+        _write_atomic(path, json.dumps(self.snapshot(), indent=2, sort_keys=True, default=str))
+
+    def export(self, textfile: Optional[str] = None, json_path: Optional[str] = None) -> None:
+        """Writes the configured outputs (defaults: METRICS_TEXTFILE / METRICS_JSON)."""
+        textfile = textfile or os.getenv("METRICS_TEXTFILE")
+        json_path = json_path or os.getenv("METRICS_JSON")
+        if textfile:
+            self.write_openmetrics(textfile)
+        if json_path:
+            self.write_json(json_path)
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+METRICS = Metrics()
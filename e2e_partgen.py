@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Multipart source parts generated in worker processes, handed over in shared memory.
+
+Creating a large source object generated the whole payload on one core:
+upload_fileobj reads one sequential DeterministicStream, and part threads
+generating with expected_bytes share the GIL. Every byte range of the
+payload is a pure function of (seed, offset), so parts can be built
+independently:
+
+- SharedPartGenerator owns one shared-memory slot per part in flight (the
+  planner already bounds that by S3_MEMORY_BUDGET),
+- an upload thread takes a free slot, a worker process fills it with the
+  part's bytes (and its additional checksum when ChecksumAlgorithm is set,
+  sent as ChecksumCRC32/... so botocore does not hash the part again),
+- the thread uploads straight from the slot (reads are views of it, not
+  copies) and hands it back once the part's request has returned.
+
+Workers are spawned, not forked: the parent holds SSH transports and
+connection pools with threads. Generation falls back to the upload threads
+when there is a single core or /dev/shm cannot hold the slots.
+"""
+
+import os
+import queue
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterator, List, Optional, Tuple
+
+from e2e_checksum import RunningChecksum
+from e2e_payload import CHUNK, DEFAULT_PATTERN_VERSION, expected_into
+
+LOG = logging.getLogger("e2e-partgen")
+
+SHM_DIR = "/dev/shm"
+MP_CONTEXT = "spawn"
+
+
+def parse_generate_processes(v: Optional[str]) -> int:
+    """SOURCE_GENERATE_PROCESSES: 'auto' (default) = one per core, 0 = generate in the upload threads."""
+    if v is None or str(v).strip().lower() in ("", "auto"):
+        cores = os.cpu_count() or 1
+        return cores if cores > 1 else 0
+    n = int(str(v).strip())
+    if n < 0:
+        raise ValueError(f"SOURCE_GENERATE_PROCESSES must be >= 0 or 'auto', got {v!r}")
+    return n
+
+
+def _fill_part(shm_name: str, seed: bytes, start: int, length: int, total_size: int, version: int,
+               algorithm: Optional[str]) -> Optional[str]:
+    """Worker: writes payload bytes [start, start + length) into the slot; returns the part checksum."""
+    # Spawned workers share the parent's resource tracker, so attaching does
+    # not make them owners; the parent unlinks the segment in close()
+    shm = SharedMemory(shm_name)
+    running = RunningChecksum(algorithm) if algorithm else None
+    try:
+        buf = shm.buf
+        pos = 0
+        while pos < length:
+            take = min(CHUNK - (start + pos) % CHUNK, length - pos)
+            expected_into(buf[pos:pos + take], seed, start + pos, total_size, version)
+            if running is not None:
+                running.update(buf[pos:pos + take])
+            pos += take
+        del buf
+    finally:
+        shm.close()
+    return running.b64() if running is not None else None
+
+
+class SharedPartReader:
+    """
+    Read-only, seekable file object over a filled slot (botocore re-reads it
+    on retries). read() returns memoryview slices of the slot rather than
+    copies; release() revokes them before the slot is reused.
+    """
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+        self._slices: List[memoryview] = []
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def read(self, n: int = -1) -> memoryview:
+        end = len(self._view) if n is None or n < 0 else min(len(self._view), self._pos + n)
+        data = self._view[self._pos:end]
+        self._slices.append(data)
+        self._pos = end
+        return data
+
+    def readinto(self, b) -> int:
+        n = min(len(b), len(self._view) - self._pos)
+        with memoryview(b) as out:
+            out[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def release(self) -> None:
+        """Invalidates every slice handed out; raises BufferError if one is still exported."""
+        for data in self._slices:
+            data.release()
+        self._slices = []
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, min(len(self._view), base + offset))
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+
+class SharedPartGenerator:
+    def __init__(self, seed: bytes, total_size: int, slot_size: int, slots: int, processes: int,
+                 version: int = DEFAULT_PATTERN_VERSION, algorithm: Optional[str] = None):
+        self.seed = seed
+        self.total_size = total_size
+        self.slot_size = slot_size
+        self.version = version
+        self.algorithm = algorithm
+        self._slots: List[SharedMemory] = []
+        self._free: "queue.Queue[SharedMemory]" = queue.Queue()
+        try:
+            for _ in range(slots):
+                shm = SharedMemory(create=True, size=slot_size)
+                self._slots.append(shm)
+                self._free.put(shm)
+        except BaseException:
+            self.close()
+            raise
+        self._pool = ProcessPoolExecutor(max_workers=processes, mp_context=get_context(MP_CONTEXT))
+        LOG.info("Part generation: %d process(es), %d shared slot(s) of %d bytes", processes, slots, slot_size)
+
+    @contextmanager
+    def part(self, start: int, end: int) -> Iterator[Tuple[SharedPartReader, Optional[str]]]:
+        """
+        Part [start, end) filled by a worker: (body, base64 checksum or None).
+        Upload within the block: on exit the body's slices are revoked and the
+        slot is reused. close() must wait until every part is out of its block.
+        """
+        shm = self._free.get()
+        try:
+            checksum = self._pool.submit(_fill_part, shm.name, self.seed, start, end - start, self.total_size,
+                                         self.version, self.algorithm).result()
+            view = shm.buf[:end - start]
+            reader = SharedPartReader(view)
+            try:
+                yield reader, checksum
+            finally:
+                reader.release()
+                view.release()
+        finally:
+            self._free.put(shm)
+
+    def close(self) -> None:
+        pool = getattr(self, "_pool", None)
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        for shm in self._slots:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._slots = []
+
+    def __enter__(self) -> "SharedPartGenerator":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def shared_part_generator(seed: bytes, total_size: int, part_sizes: List[int], slots: int, processes: int,
+                          version: int = DEFAULT_PATTERN_VERSION,
+                          algorithm: Optional[str] = None) -> Optional[SharedPartGenerator]:
+    """
+    A generator sized for `part_sizes`, or None when generation should stay
+    in the upload threads (no processes, a single part, or too little /dev/shm).
+    """
+    if processes <= 0 or len(part_sizes) < 2:
+        return None
+    slot_size = max(part_sizes)
+    slots = max(1, min(slots, len(part_sizes)))
+    try:
+        st = os.statvfs(SHM_DIR)
+        fit = (st.f_bavail * st.f_frsize) // slot_size
+    except OSError:
+        fit = slots
+    if fit < slots:
+        # Writing past the tmpfs limit is a SIGBUS in the worker, not an exception
+        LOG.warning("%s holds %d of %d part slot(s) of %d bytes", SHM_DIR, fit, slots, slot_size)
+        slots = fit
+    if slots < 1:
+        LOG.warning("Generating parts in the upload threads (no room in %s)", SHM_DIR)
+        return None
+    return SharedPartGenerator(seed, total_size, slot_size, slots, min(processes, slots), version, algorithm)
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Deterministic payload engine shared by the E2E scripts.
+
+Every test derives a seed and then needs the SAME bytes at three points:
+while uploading the source, while relaying, and while verifying ranges of
+the target. Any byte range must be reproducible on its own (no local files).
+
+Pattern formats (versioned so that old seeds still verify):
+- v1: legacy layout. Each 1 MiB chunk is the concatenation of
+      blake2b(seed || chunk_index || ctr) 64-byte digests. One hash object
+      per 64 output bytes, so it tops out at a few tens of MB/s.
+- v2: default. A per-seed pad (~5 MiB, SHAKE-128 output, generated once and
+      cached) is addressed in counter mode: chunk i is the window of the pad
+      starting at (base + i * stride) mod PAD_LEN. PAD_LEN is prime, so no two
+      chunks of a file under ~4 TiB share a window. Producing a chunk is a
+      single slice, i.e. memcpy speed.
+- v3: salted fixture. The first FIXTURE_SALT_BYTES are v2 bytes of the run's
+      seed; everything after is v2 bytes of FIXTURE_SEED, identical across
+      runs. Each run still writes a unique object, while the digests of
+      the bulk of the payload can be cached on disk (e2e_fixture).
+"""
+
+import os
+import sys
+import time
+import hashlib
+import argparse
+import threading
+import weakref
+from collections import OrderedDict
+from typing import List
+
+CHUNK = 1024 * 1024  # 1 MiB
+
+PATTERN_V1 = 1
+PATTERN_V2 = 2
+PATTERN_V3 = 3
+PATTERN_VERSIONS = (PATTERN_V1, PATTERN_V2, PATTERN_V3)
+DEFAULT_PATTERN_VERSION = PATTERN_V2
+
+_V1_BLOCK = 64
+_V2_PAD_LEN = 4194301  # prime just under 4 MiB
+DEFAULT_PAD_CACHE_SEEDS = 4
+
+FIXTURE_SALT_BYTES = 4096
+FIXTURE_SEED = hashlib.sha256(b"e2e-pattern-v3-fixture").digest()
+SALTED_VERSIONS = (PATTERN_V3,)
+
+
+def parse_pattern_version(v: str) -> int:
+    try:
+        version = int(str(v).strip().lstrip("vV"))
+    except ValueError:
+        raise ValueError(f"Invalid PATTERN_VERSION: {v}")
+    if version not in PATTERN_VERSIONS:
+        raise ValueError(f"Unsupported PATTERN_VERSION {version} (known: {PATTERN_VERSIONS})")
+    return version
+
+
+# -----------------------------
+# v1: legacy blake2b-per-64-bytes
+# -----------------------------
+def _v1_slice(seed: bytes, chunk_index: int, start: int, end: int) -> bytes:
+    """
+    Bytes [start, end) of a v1 chunk. Only the 64-byte blocks overlapping the
+    range are hashed, which is byte-identical to slicing the full chunk.
+    """
+    first = start // _V1_BLOCK
+    last = (end - 1) // _V1_BLOCK
+    ci = chunk_index.to_bytes(8, "big")
+    out = bytearray()
+    for ctr in range(first, last + 1):
+        h = hashlib.blake2b(digest_size=64)
+        h.update(seed)
+        h.update(ci)
+        h.update(ctr.to_bytes(8, "big"))
+        out.extend(h.digest())
+    s = start - first * _V1_BLOCK
+    return bytes(out[s:s + (end - start)])
+
+
+# -----------------------------
+# v2: counter-addressed windows over a cached pad
+# -----------------------------
+class _Pad:
+    __slots__ = ("pad", "base", "stride", "__weakref__")
+
+    def __init__(self, seed: bytes):
+        pad = hashlib.shake_128(b"e2e-pattern-v2:" + seed).digest(_V2_PAD_LEN)
+        # Wrap CHUNK bytes so that any window [r, r + CHUNK) is one contiguous slice.
+        self.pad = pad + pad[:CHUNK]
+        params = hashlib.blake2b(b"e2e-pattern-v2-params", key=seed[:64], digest_size=16).digest()
+        self.base = int.from_bytes(params[:8], "big") % _V2_PAD_LEN
+        self.stride = int.from_bytes(params[8:], "big") % (_V2_PAD_LEN - 1) + 1
+
+
+# Recently used pads (LRU, sized by set_pad_cache_size), plus every pad a live
+# DeterministicStream holds: a stream's seed never needs its pad regenerated,
+# however many other seeds are interleaved with it.
+_PADS: "OrderedDict[bytes, _Pad]" = OrderedDict()
+_LIVE_PADS: "weakref.WeakValueDictionary[bytes, _Pad]" = weakref.WeakValueDictionary()
+_PADS_LOCK = threading.Lock()
+_pad_cache_seeds = DEFAULT_PAD_CACHE_SEEDS
+
+
+def set_pad_cache_size(seeds: int) -> None:
+    """Keeps the pads of the last `seeds` seeds (~5 MiB each); size it to the scenarios in flight."""
+    global _pad_cache_seeds
+    with _PADS_LOCK:
+        _pad_cache_seeds = max(1, seeds)
+        while len(_PADS) > _pad_cache_seeds:
+            _PADS.popitem(last=False)
+
+
+def _v2_state(seed: bytes) -> _Pad:
+    with _PADS_LOCK:
+        state = _PADS.get(seed)
+        if state is not None:
+            _PADS.move_to_end(seed)
+            return state
+        state = _LIVE_PADS.get(seed)
+    if state is None:
+        state = _Pad(seed)  # outside the lock: ~20 ms
+    with _PADS_LOCK:
+        state = _LIVE_PADS.setdefault(seed, state)
+        _PADS[seed] = state
+        while len(_PADS) > _pad_cache_seeds:
+            _PADS.popitem(last=False)
+    return state
+
+
+def _v2_slice(seed: bytes, chunk_index: int, start: int, end: int) -> bytes:
+    state = _v2_state(seed)
+    r = (state.base + chunk_index * state.stride) % _V2_PAD_LEN
+    return state.pad[r + start:r + end]
+
+
+def _v2_into(out: memoryview, seed: bytes, chunk_index: int, start: int, end: int) -> None:
+    state = _v2_state(seed)
+    r = (state.base + chunk_index * state.stride) % _V2_PAD_LEN
+    with memoryview(state.pad) as mv:
+        out[:] = mv[r + start:r + end]
+
+
+# -----------------------------
+# v3: per-run salt over a shared fixture body
+# -----------------------------
+def _fixture_slice(chunk_index: int, start: int, end: int) -> bytes:
+    return _v2_slice(FIXTURE_SEED, chunk_index, start, end)
+
+
+def _fixture_into(out: memoryview, chunk_index: int, start: int, end: int) -> None:
+    _v2_into(out, FIXTURE_SEED, chunk_index, start, end)
+
+
+def _v3_slice(seed: bytes, chunk_index: int, start: int, end: int) -> bytes:
+    if chunk_index or start >= FIXTURE_SALT_BYTES:
+        return _fixture_slice(chunk_index, start, end)
+    salt_end = min(end, FIXTURE_SALT_BYTES)
+    salt = _v2_slice(seed, 0, start, salt_end)
+    return salt + _fixture_slice(0, salt_end, end) if end > salt_end else salt
+
+
+def _v3_into(out: memoryview, seed: bytes, chunk_index: int, start: int, end: int) -> None:
+    if chunk_index or start >= FIXTURE_SALT_BYTES:
+        _fixture_into(out, chunk_index, start, end)
+        return
+    salt_end = min(end, FIXTURE_SALT_BYTES)
+    _v2_into(out[:salt_end - start], seed, 0, start, salt_end)
+    if end > salt_end:
+        _fixture_into(out[salt_end - start:], 0, salt_end, end)
+
+
+# Pads a stream of each version keeps alive (see _LIVE_PADS)
+_PAD_SEEDS = {
+    PATTERN_V1: lambda seed: (),
+    PATTERN_V2: lambda seed: (seed,),
+    PATTERN_V3: lambda seed: (seed, FIXTURE_SEED),
+}
+
+_SLICERS = {
+    PATTERN_V1: _v1_slice,
+    PATTERN_V2: _v2_slice,
+    PATTERN_V3: _v3_slice,
+}
+
+# Copy straight into a caller's buffer; v1 hashes into fresh digests anyway
+_INTO = {
+    PATTERN_V2: _v2_into,
+    PATTERN_V3: _v3_into,
+}
+
+
+# -----------------------------
+# Public API
+# -----------------------------
+def chunk_slice(seed: bytes, chunk_index: int, start: int, end: int,
+                version: int = DEFAULT_PATTERN_VERSION) -> bytes:
+    """Bytes [start, end) of chunk `chunk_index` (0 <= start <= end <= CHUNK)."""
+    if start >= end:
+        return b""
+    return _SLICERS[version](seed, chunk_index, start, end)
+
+
+def chunk_bytes(seed: bytes, chunk_index: int, chunk_len: int,
+                version: int = DEFAULT_PATTERN_VERSION) -> bytes:
+    return chunk_slice(seed, chunk_index, 0, chunk_len, version)
+
+
+def expected_bytes(seed: bytes, offset: int, length: int, total_size: int,
+                   version: int = DEFAULT_PATTERN_VERSION) -> bytes:
+    if offset < 0 or length < 0 or offset + length > total_size:
+        raise ValueError("Requested range out of bounds")
+
+    end_offset = offset + length
+    pieces = []
+    pos = offset
+    while pos < end_offset:
+        ci = pos // CHUNK
+        chunk_start = ci * CHUNK
+        e = min(chunk_start + CHUNK, end_offset)
+        pieces.append(chunk_slice(seed, ci, pos - chunk_start, e - chunk_start, version))
+        pos = e
+
+    if len(pieces) == 1:
+        return pieces[0]
+    return b"".join(pieces)
+
+
+def expected_into(buf, seed: bytes, offset: int, total_size: int,
+                  version: int = DEFAULT_PATTERN_VERSION) -> int:
+    """
+    Fills `buf` (any writable buffer) with the bytes at [offset, offset +
+    len(buf)) without allocating them first. Returns len(buf).
+    """
+    out = memoryview(buf).cast("B")
+    length = len(out)
+    if offset < 0 or offset + length > total_size:
+        raise ValueError("Requested range out of bounds")
+    into = _INTO.get(version)
+    pos = 0
+    while pos < length:
+        ci, s = divmod(offset + pos, CHUNK)
+        take = min(CHUNK - s, length - pos)
+        if into is not None:
+            into(out[pos:pos + take], seed, ci, s, s + take)
+        else:
+            out[pos:pos + take] = _SLICERS[version](seed, ci, s, s + take)
+        pos += take
+    return length
+
+
+class DeterministicStream:
+    """
+    File-like, seekable read stream over the deterministic payload.
+    Used for SFTP putfo/write loops and boto3 upload_fileobj.
+
+    Generated chunks are kept in a small LRU so that transports reading less
+    than a chunk at a time (paramiko putfo reads 32 KiB) generate each chunk
+    once. The stream holds its seed's pad, so interleaving many streams does
+    not evict it. Reads that fall inside one chunk return a zero-copy memoryview;
+    readinto fills a caller's buffer without any intermediate objects.
+    """
+    def __init__(self, seed: bytes, total_size: int, version: int = DEFAULT_PATTERN_VERSION,
+                 cache_chunks: int = 4):
+        self.seed = seed
+        self.total_size = total_size
+        self.version = version
+        self.pos = 0
+        self.cache_chunks = max(1, cache_chunks)
+        self._cache: "OrderedDict[int, memoryview]" = OrderedDict()
+        self._pads = [_v2_state(s) for s in _PAD_SEEDS[version](seed)]
+        # Amplification counters: generated / delivered ~= 1.0 for sequential reads.
+        self.generated_bytes = 0
+        self.delivered_bytes = 0
+
+    @property
+    def amplification(self) -> float:
+        return self.generated_bytes / self.delivered_bytes if self.delivered_bytes else 0.0
+
+    def _chunk(self, chunk_index: int) -> memoryview:
+        mv = self._cache.get(chunk_index)
+        if mv is not None:
+            self._cache.move_to_end(chunk_index)
+            return mv
+        chunk_len = min(CHUNK, self.total_size - chunk_index * CHUNK)
+        mv = memoryview(chunk_bytes(self.seed, chunk_index, chunk_len, self.version))
+        self.generated_bytes += chunk_len
+        self._cache[chunk_index] = mv
+        while len(self._cache) > self.cache_chunks:
+            self._cache.popitem(last=False)
+        return mv
+
+    def read(self, n: int = -1):
+        if self.pos >= self.total_size:
+            return b""
+        if n is None or n < 0:
+            n = self.total_size - self.pos
+        n = min(n, self.total_size - self.pos)
+
+        ci, s = divmod(self.pos, CHUNK)
+        if s + n <= CHUNK:
+            data = self._chunk(ci)[s:s + n]
+        else:
+            pieces = []
+            pos, end = self.pos, self.pos + n
+            while pos < end:
+                ci, s = divmod(pos, CHUNK)
+                take = min(CHUNK - s, end - pos)
+                pieces.append(self._chunk(ci)[s:s + take])
+                pos += take
+            data = b"".join(pieces)
+
+        self.pos += n
+        self.delivered_bytes += n
+        return data
+
+    def readinto(self, b) -> int:
+        """
+        read() into a caller-owned buffer: bytes are copied from the pattern
+        straight into `b`, without chunk objects or joins. Loops that reuse
+        one buffer allocate nothing per read.
+        """
+        n = min(len(memoryview(b).cast("B")), max(0, self.total_size - self.pos))
+        if n <= 0:
+            return 0
+        expected_into(memoryview(b).cast("B")[:n], self.seed, self.pos, self.total_size, self.version)
+        self.pos += n
+        self.generated_bytes += n
+        self.delivered_bytes += n
+        return n
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self.pos
+        elif whence == os.SEEK_END:
+            offset += self.total_size
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self.pos = offset
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def close(self) -> None:
+        # s3transfer closes single-part upload bodies
+        self._cache.clear()
+
+
+def choose_offsets(total_size: int, checks: int, bytes_per_check: int, seed: bytes) -> List[int]:
+    if total_size <= bytes_per_check:
+        return [0]
+    offsets = {0, max(0, total_size - bytes_per_check)}
+    i = 0
+    while len(offsets) < max(2, checks):
+        h = hashlib.blake2b(digest_size=8)
+        h.update(seed)
+        h.update(i.to_bytes(8, "big"))
+        off = int.from_bytes(h.digest(), "big") % (total_size - bytes_per_check + 1)
+        offsets.add(off)
+        i += 1
+    return sorted(list(offsets))[:checks]
+
+
+# -----------------------------
+# Microbenchmark (single thread == one core)
+# -----------------------------
+def bench_pattern(version: int, total_bytes: int, read_size: int = CHUNK) -> float:
+    """Returns MB/s for reading `total_bytes` through a DeterministicStream."""
+    seed = hashlib.sha256(b"e2e-payload-bench").digest()
+    DeterministicStream(seed, 1, version).read(1)  # warm per-seed state outside the timed loop
+    stream = DeterministicStream(seed, total_bytes, version)
+    start = time.perf_counter()
+    while stream.read(read_size):
+        pass
+    elapsed = time.perf_counter() - start
+    return (total_bytes / max(1e-9, elapsed)) / (1024 * 1024)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Deterministic payload microbenchmark (MB/s per core)")
+    ap.add_argument("--size", type=int, default=256 * 1024 * 1024, help="Bytes to generate per pattern")
+    ap.add_argument("--read-size", type=int, default=CHUNK)
+    ap.add_argument("--pattern-version", action="append", type=parse_pattern_version,
+                    help="Pattern version(s) to bench. Default: all")
+    args = ap.parse_args()
+
+    for version in args.pattern_version or PATTERN_VERSIONS:
+        # v1 is orders of magnitude slower; keep its run short.
+        size = args.size if version != PATTERN_V1 else min(args.size, 32 * 1024 * 1024)
+        rate = bench_pattern(version, size, args.read_size)
+        print(f"pattern v{version}: {rate:10.1f} MB/s per core  (size={size} read_size={args.read_size} pid={os.getpid()})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Multipart part size and concurrency planner for S3 uploads and copies.
+
+The scripts used fixed TransferManager settings: 8 MiB parts for uploads
+(so anything past ~78 GiB exceeded S3's 10,000-part limit), 256 MiB copy
+parts over 10 threads (a 20 GB copy ran as 80 parts, the last few threads
+idle while stragglers finished). plan_multipart picks the layout from:
+
+- object size and S3's limits (5 MiB..5 GiB per part, at most 10,000 parts),
+- a memory budget: every in-flight upload part is held in memory, so
+  upload concurrency * part size stays within S3_MEMORY_BUDGET (copies are
+  server-side and need none),
+- core count (uploads generate and checksum parts locally) and the client's
+  connection pool size,
+- measured per-part latency: parts that finished in under MIN_PART_SECONDS
+  in this process are mostly per-request overhead, so the next plan doubles
+  them; parts over MAX_PART_SECONDS make retries expensive, so it halves them.
+
+The plan aims for PARTS_PER_WORKER parts per worker, so a slow part does not
+leave the rest of the pool idle at the end. During the transfer
+AdaptiveConcurrency moves the number of parts in flight between 1 and the
+plan's ceiling from per-part latency: while latency per byte stays near the
+best seen, more parts go out; once it inflates (the link or the endpoint is
+saturated), fewer do.
+
+Explicit MULTIPART_CHUNK_SIZE / S3_MULTIPART_CONCURRENCY still win, clamped
+to the limits.
+"""
+
+import os
+import math
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from e2e_checksum import MAX_PART_SIZE, MAX_PARTS, MIN_PART_SIZE, transfer_part_sizes
+
+LOG = logging.getLogger("e2e-planner")
+
+MiB = 1024 * 1024
+UPLOAD = "upload"
+COPY = "copy"
+KINDS = (UPLOAD, COPY)
+
+DEFAULT_MEMORY_BUDGET = 1024 * MiB
+DEFAULT_UPLOAD_THRESHOLD = 8 * MiB       # TransferManager's default
+MIN_PLANNED_PART_SIZE = 8 * MiB          # smaller parts are all request overhead
+PART_ALIGN = MiB
+PARTS_PER_WORKER = 8
+MAX_CONCURRENCY = 64
+MIN_PART_SECONDS = 0.5
+MAX_PART_SECONDS = 30.0
+
+
+def parse_auto(v: Optional[str], parse: Callable[[str], int] = int) -> Optional[int]:
+    """MULTIPART_CHUNK_SIZE / S3_MULTIPART_CONCURRENCY: unset, empty, 'auto' or 0 = planned."""
+    if v is None or str(v).strip().lower() in ("", "auto", "0"):
+        return None
+    n = parse(str(v).strip())
+    if n < 0:
+        raise ValueError(f"Expected a positive value or 'auto', got {v!r}")
+    return n or None
+
+
+@dataclass
+class MultipartPlan:
+    kind: str
+    total_size: int
+    threshold: int
+    part_size: int
+    concurrency: int          # parts in flight at the start
+    max_concurrency: int      # ceiling for AdaptiveConcurrency
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def part_sizes(self) -> List[int]:
+        """The layout, in the form e2e_checksum.expected_s3_checksum takes ([] = single part)."""
+        return transfer_part_sizes(self.total_size, self.threshold, self.part_size)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.max_concurrency * self.part_size if self.kind == UPLOAD else 0
+
+    def transfer_config(self):
+        """Equivalent TransferConfig (fixed concurrency) for the TransferManager paths."""
+        from boto3.s3.transfer import TransferConfig
+        return TransferConfig(multipart_threshold=self.threshold, multipart_chunksize=self.part_size,
+                              max_concurrency=self.max_concurrency, use_threads=True)
+
+    def describe(self) -> str:
+        parts = len(self.part_sizes)
+        return (f"{self.kind}: size={self.total_size} parts={parts or 1} part_size={self.part_size} "
+                f"concurrency={self.concurrency}..{self.max_concurrency} memory={self.memory_bytes // MiB}MiB"
+                + (f" ({'; '.join(self.reasons)})" if self.reasons else ""))
+
+
+# -----------------------------
+# Per-part latency observed in this process
+# -----------------------------
+@dataclass
+class _PartLatency:
+    part_size: int = 0
+    seconds: float = 0.0   # EWMA
+    samples: int = 0
+
+
+_OBSERVED: Dict[str, _PartLatency] = {}
+_OBSERVED_LOCK = threading.Lock()
+
+
+def record_part_latency(kind: str, part_size: int, seconds: float, alpha: float = 0.2) -> None:
+    with _OBSERVED_LOCK:
+        obs = _OBSERVED.get(kind)
+        if obs is None or obs.part_size != part_size:
+            obs = _OBSERVED[kind] = _PartLatency(part_size, seconds, 0)
+        obs.seconds += alpha * (seconds - obs.seconds)
+        obs.samples += 1
+
+
+def observed_part_latency(kind: str) -> Optional[_PartLatency]:
+    with _OBSERVED_LOCK:
+        obs = _OBSERVED.get(kind)
+        return _PartLatency(obs.part_size, obs.seconds, obs.samples) if obs and obs.samples else None
+
+
+# -----------------------------
+# Planning
+# -----------------------------
+def _align_up(n: int, align: int = PART_ALIGN) -> int:
+    return -(-n // align) * align
+
+
+def plan_multipart(kind: str,
+                   total_size: int,
+                   threshold: int = DEFAULT_UPLOAD_THRESHOLD,
+                   memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                   max_pool_connections: int = MAX_CONCURRENCY,
+                   cores: Optional[int] = None,
+                   part_size: Optional[int] = None,
+                   concurrency: Optional[int] = None) -> MultipartPlan:
+    """
+    Part size and concurrency for an upload or copy of `total_size` bytes.
+    `part_size` / `concurrency` override the computed values (still clamped
+    to S3's limits and, for uploads, the memory budget).
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown transfer kind {kind!r} (known: {KINDS})")
+    cores = cores or os.cpu_count() or 1
+    reasons: List[str] = []
+
+    # Concurrency ceiling: the connection pool, and for uploads the cores that generate parts
+    ceiling = min(MAX_CONCURRENCY, max(1, max_pool_connections))
+    if kind == UPLOAD:
+        ceiling = min(ceiling, max(4, 4 * cores))
+    if concurrency:
+        ceiling = max(1, min(concurrency, MAX_CONCURRENCY))
+        reasons.append("concurrency set")
+
+    # Smallest part that keeps the object within MAX_PARTS
+    floor = max(MIN_PART_SIZE, _align_up(-(-total_size // MAX_PARTS)))
+    if part_size:
+        size = min(max(part_size, floor), MAX_PART_SIZE)
+        reasons.append("part size set" if size == part_size else f"part size raised to {size} for the part limits")
+    else:
+        size = _align_up(max(1, -(-total_size // (ceiling * PARTS_PER_WORKER))))
+        obs = observed_part_latency(kind)
+        if obs is not None and obs.part_size:
+            if obs.seconds < MIN_PART_SECONDS:
+                # ...but not so large that workers run out of parts
+                size = max(size, min(2 * obs.part_size, _align_up(-(-total_size // ceiling))))
+                reasons.append(f"last parts took {obs.seconds:.2f}s: larger parts")
+            elif obs.seconds > MAX_PART_SECONDS:
+                size = min(size, max(MIN_PLANNED_PART_SIZE, obs.part_size // 2))
+                reasons.append(f"last parts took {obs.seconds:.1f}s: smaller parts")
+        size = min(max(size, floor, MIN_PLANNED_PART_SIZE), MAX_PART_SIZE)
+
+    if kind == UPLOAD:
+        if not part_size and size * ceiling > memory_budget:
+            # Keep the concurrency, shrink the parts (down to what the part limit allows)
+            size = max(floor, MIN_PLANNED_PART_SIZE, (memory_budget // ceiling) // PART_ALIGN * PART_ALIGN)
+            reasons.append("parts sized to the memory budget")
+        if size * ceiling > memory_budget:
+            ceiling = max(1, memory_budget // size)
+            reasons.append("concurrency capped by the memory budget")
+
+    parts = max(1, math.ceil(total_size / size)) if total_size >= threshold else 1
+    ceiling = max(1, min(ceiling, parts))
+    start = ceiling if concurrency else max(1, min(ceiling, max(4, cores)))
+    return MultipartPlan(kind, total_size, threshold, size, start, ceiling, reasons)
+
+
+def log_plan(plan: MultipartPlan, log: logging.Logger = LOG) -> None:
+    log.info("Multipart plan %s", plan.describe())
+
+
+# -----------------------------
+# Adaptive concurrency
+# -----------------------------
+class AdaptiveConcurrency:
+    """
+    Gradient limiter over per-part latency (seconds per byte, so the short
+    last part does not skew it). Each completion moves the limit towards
+    limit * best / recent + sqrt(limit): it grows while latency holds at
+    the best seen, and backs off once extra parts only queue. A failed part
+    halves the limit.
+    """
+
+    def __init__(self, initial: int, maximum: int, smoothing: float = 0.2):
+        self.maximum = max(1, maximum)
+        self.limit = float(min(max(1, initial), self.maximum))
+        self.smoothing = smoothing
+        self.best: Optional[float] = None
+        self.recent: Optional[float] = None
+        self.peak = int(self.limit)
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> int:
+        return max(1, int(self.limit))
+
+    def on_success(self, nbytes: int, seconds: float) -> None:
+        per_byte = seconds / max(1, nbytes)
+        with self._lock:
+            self.best = per_byte if self.best is None else min(self.best, per_byte)
+            self.recent = per_byte if self.recent is None else self.recent + 0.3 * (per_byte - self.recent)
+            gradient = max(0.5, min(1.0, self.best / max(self.recent, 1e-12)))
+            target = self.limit * gradient + math.sqrt(self.limit)
+            self.limit += self.smoothing * (target - self.limit)
+            self.limit = max(1.0, min(float(self.maximum), self.limit))
+            self.peak = max(self.peak, self.current)
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self.limit = max(1.0, self.limit / 2)
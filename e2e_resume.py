@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+On-disk checkpoints for resumable large transfers.
+
+A 20 GB run used to restart from byte 0 after one dropped SSH connection or
+S3 error. With CHECKPOINT_FILE set, transfers record their progress in a
+small local JSON state file:
+
+- S3 multipart uploads/copies: the UploadId, part layout and the ETag (and
+  additional checksum) of every completed part,
+- SFTP uploads and relays: the confirmed byte offset of each stream, i.e.
+  bytes the server has acknowledged (the handle is closed at segment
+  boundaries, which waits for every pipelined write).
+
+A failed run keeps its entry. The next run of the same route with the same
+fingerprint (size, pattern version, destinations) re-uses its test id, so
+it derives the same seed and keys and continues each transfer from the last
+good part or offset. Because the payload is a pure function of the seed,
+nothing has to be re-read to continue. Successful runs, and failed runs with
+no unfinished transfer (e.g. a verification failure), drop their entry.
+
+Checkpointing is opt-in: resumable SFTP uploads write a ".part" file and
+rename it, which is not what the pipeline under test normally sees, so by
+default runs keep the plain streaming upload. Only runs of at least
+CHECKPOINT_MIN_SIZE are checkpointed; small probes are cheaper to redo than
+to resume.
+
+Several processes (parallel CI jobs, runner processes) may share the file.
+Every write happens under an exclusive lock on "<file>.lock", re-reads the
+file and merges: each process only replaces the runs it has open. Open runs
+carry a claim (host and pid) in the file, so another process does not
+resume a run that is still in flight; claims of dead local processes are
+ignored.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: saves are then only safe within one process
+    fcntl = None
+
+LOG = logging.getLogger("e2e-resume")
+
+DEFAULT_CHECKPOINT_FILE: Optional[str] = None  # opt-in, e.g. CHECKPOINT_FILE=.e2e-checkpoints.json
+DEFAULT_CHECKPOINT_MIN_SIZE = 1024 * 1024 * 1024
+CHECKPOINT_FORMAT = 1
+SAVE_INTERVAL_SECONDS = 1.0  # part completions are coalesced; failures always save
+
+
+def parse_checkpoint_file(v: Optional[str]) -> Optional[str]:
+    """CHECKPOINT_FILE enables checkpoints; unset, empty, 'none' or 'off' leaves them off."""
+    if v is None or str(v).strip().lower() in ("", "none", "off"):
+        return None
+    return str(v).strip()
+
+
+class Checkpoint:
+    """Progress of one named transfer within a run. `state` is owned by the store."""
+
+    def __init__(self, store: "CheckpointStore", test_id: str, name: str):
+        self.store = store
+        self.test_id = test_id
+        self.name = name
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        return self.store._transfer_state(self.test_id, self.name)
+
+    @property
+    def done(self) -> bool:
+        return bool(self.state.get("done"))
+
+    def reset(self, **state) -> None:
+        """Starts the transfer over with fresh state."""
+        with self.store._lock:
+            self.store._runs[self.test_id]["transfers"][self.name] = dict(state)
+        self.store.save(force=True)
+
+    def update(self, force: bool = False, **changes) -> None:
+        with self.store._lock:
+            self.state.update(changes)
+        self.store.save(force=force)
+
+    def record(self, field: str, key: str, value: Any) -> None:
+        """Sets state[field][key] (e.g. one completed part or one stream's offset)."""
+        with self.store._lock:
+            self.state.setdefault(field, {})[key] = value
+        self.store.save()
+
+    def complete(self) -> None:
+        with self.store._lock:
+            self.store._runs[self.test_id]["transfers"][self.name] = {"done": True}
+        self.store.save(force=True)
+
+
+class RunCheckpoints:
+    """
+    Checkpoints of one run. With checkpointing disabled `transfer` returns
+    None and the transfers behave as before.
+    """
+
+    def __init__(self, store: Optional["CheckpointStore"], test_id: str, resumed: bool = False):
+        self.store = store
+        self.test_id = test_id
+        self.resumed = resumed
+
+    def transfer(self, name: str) -> Optional[Checkpoint]:
+        if self.store is None:
+            return None
+        self.store._transfer_state(self.test_id, name)
+        return Checkpoint(self.store, self.test_id, name)
+
+    @property
+    def resumable(self) -> bool:
+        """True while a transfer has started but not finished; cleanup must keep its files."""
+        return self.store is not None and bool(self.store._unfinished(self.test_id))
+
+
+def _claim_alive(claim: Optional[Dict[str, Any]]) -> bool:
+    """Whether the process holding a run claim may still be running it."""
+    if not claim:
+        return False
+    if claim.get("host") != socket.gethostname():
+        return True  # cannot tell; a remote run keeps its claim
+    try:
+        os.kill(int(claim.get("pid", 0)), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+
+class CheckpointStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        self._owned: set = set()     # runs this process has open; only these are written from memory
+        self._dropped: set = set()   # runs this process closed, to remove from the file
+        self._last_save = 0.0
+        self._runs = self._read()
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a+") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            LOG.warning("Ignoring unreadable checkpoint file %s: %s", self.path, e)
+            return {}
+        if data.get("format") != CHECKPOINT_FORMAT:
+            LOG.warning("Ignoring checkpoint file %s with format %s", self.path, data.get("format"))
+            return {}
+        return data.get("runs") or {}
+
+    def _merge(self) -> None:
+        """With both locks held: the file's runs, with ours replaced by memory and closed ones removed."""
+        runs = self._read()
+        for test_id in self._dropped:
+            runs.pop(test_id, None)
+        for test_id in self._owned:
+            runs[test_id] = self._runs[test_id]
+        self._runs = runs
+
+    def _write(self) -> None:
+        text = json.dumps({"format": CHECKPOINT_FORMAT, "runs": self._runs}, sort_keys=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, self.path)
+        self._dropped.clear()
+        self._last_save = time.monotonic()
+
+    def save(self, force: bool = False) -> None:
+        with self._lock:
+            if not force and time.monotonic() - self._last_save < SAVE_INTERVAL_SECONDS:
+                return
+            with self._file_lock():
+                self._merge()
+                self._write()
+
+    def _transfer_state(self, test_id: str, name: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._runs[test_id]["transfers"].setdefault(name, {})
+
+    def _unfinished(self, test_id: str) -> List[str]:
+        with self._lock:
+            run = self._runs.get(test_id) or {}
+            return [n for n, t in run.get("transfers", {}).items() if t and not t.get("done")]
+
+    def open_run(self, route: str, fingerprint: Dict[str, Any]) -> RunCheckpoints:
+        """
+        Re-uses the newest unfinished run with the same route and fingerprint
+        that no live process has claimed, if any, and claims it.
+        """
+        with self._lock, self._file_lock():
+            self._merge()
+            candidates = [
+                (r.get("updated", 0), test_id) for test_id, r in self._runs.items()
+                if r.get("route") == route and r.get("fingerprint") == fingerprint
+                and test_id not in self._owned and not _claim_alive(r.get("claim"))
+            ]
+            if candidates:
+                _, test_id = max(candidates)
+                resumed = True
+            else:
+                test_id, resumed = uuid.uuid4().hex, False
+                self._runs[test_id] = {"route": route, "fingerprint": fingerprint, "transfers": {},
+                                       "created": time.time()}
+            run = self._runs[test_id]
+            run["updated"] = time.time()
+            run["claim"] = {"host": socket.gethostname(), "pid": os.getpid()}
+            self._owned.add(test_id)
+            self._write()
+        if resumed:
+            LOG.info("Resuming %s run %s from checkpoint %s", route, test_id, self.path)
+        return RunCheckpoints(self, test_id, resumed)
+
+    def close_run(self, test_id: str, ok: bool) -> None:
+        with self._lock, self._file_lock():
+            self._merge()
+            self._owned.discard(test_id)
+            unfinished = self._unfinished(test_id)
+            if ok or not unfinished:
+                self._runs.pop(test_id, None)
+                self._dropped.add(test_id)
+            else:
+                run = self._runs[test_id]
+                run.pop("claim", None)
+                run["updated"] = time.time()
+                LOG.warning("Checkpoint kept for run %s (unfinished: %s); rerun to resume", test_id, ", ".join(unfinished))
+            self._write()
+
+
+_STORES: Dict[str, CheckpointStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def checkpoint_store(path: str) -> CheckpointStore:
+    """Process-wide store per state file (concurrent runs share it)."""
+    path = os.path.abspath(path)
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            store = _STORES[path] = CheckpointStore(path)
+        return store
+
+
+@contextmanager
+def checkpointed_run(path: Optional[str], min_size: int, route: str, size_bytes: int,
+                     fingerprint: Dict[str, Any]) -> Iterator[RunCheckpoints]:
+    """
+    Opens (or resumes) the run's checkpoints and closes them with the run's
+    result. Disabled when `path` is None or the run is smaller than `min_size`.
+    """
+    if not path or size_bytes < min_size:
+        yield RunCheckpoints(None, uuid.uuid4().hex)
+        return
+
+    store = checkpoint_store(path)
+    run = store.open_run(route, {"size_bytes": size_bytes, **fingerprint})
+    ok = False
+    try:
+        yield run
+        ok = True
+    finally:
+        store.close_run(run.test_id, ok)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Runs many E2E scenarios concurrently in one process.
+
+Each route script (sftp->s3, s3->s3, sftp->sftp, s3->sftp) exposes
+run_test(cfg) for one file. Launching a process per scenario meant separate
+imports, S3 clients, SFTP handshakes and pollers for every probe. Here each
+scenario is the route's run_test_async coroutine on one event loop, so one
+process drives hundreds of probes that share:
+- S3 clients and their urllib3 pool (e2e_s3),
+- pooled SFTP transports/channels (e2e_sftp.POOL),
+- discovery indexes and the batch waiter (sftp->s3 with S3_WAIT_MODE=sweep).
+
+Blocking calls (an upload, a copy, a verification, one HeadObject) run on
+bounded per-endpoint executors (e2e_limits.endpoint_io), and waits for
+arrival are asyncio sleeps between polls, so a waiting scenario holds no
+thread. A slow SFTP host or bucket only ties up its own executor, and
+per-endpoint limits give a scenario a slot only while it does I/O there.
+
+Example:
+  python e2e_runner.py --routes sftp-s3,s3-s3 --sizes 1MB,100MB --repeat 50 \\
+      --max-concurrency 100 --endpoint-limit 16
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import importlib
+import dataclasses
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from e2e_limits import set_default_endpoint_limit, shutdown_executors
+from e2e_metrics import METRICS
+from e2e_payload import DEFAULT_PAD_CACHE_SEEDS, set_pad_cache_size
+
+try:
+    from dotenv import load_dotenv
+except Exception:
+    load_dotenv = None
+
+LOG = logging.getLogger("e2e-runner")
+
+ROUTES = {
+    "sftp-s3": "sftp_to_s3_e2e_test",
+    "s3-s3": "s3_to_s3_e2e_test",
+    "sftp-sftp": "sftp_to_sftp_e2e_test",
+    "s3-sftp": "s3_to_sftp_e2e_test",
+}
+
+DEFAULT_MAX_CONCURRENCY = 32
+
+
+def setup_logging(level: str) -> None:
+    logging.basicConfig(
+        level=getattr(logging, level.upper(), logging.INFO),
+        format="%(asctime)s %(levelname)s %(threadName)s %(message)s",
+    )
+
+
+# -----------------------------
+# Scenarios
+# -----------------------------
+@dataclass(frozen=True)
+class Scenario:
+    route: str
+    size_bytes: int
+    index: int = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.route}#{self.index}({self.size_bytes}B)"
+
+
+@dataclass
+class ScenarioResult:
+    scenario: Scenario
+    ok: bool
+    seconds: float
+    error: Optional[str] = None
+    detail: Optional[Dict[str, Any]] = None
+
+
+def load_route(route: str, env_file: Optional[str]) -> Tuple[Any, Any]:
+    """(module, base Config) for a route, read from the environment/.env like the script itself."""
+    if route not in ROUTES:
+        raise ValueError(f"Unknown route {route} (known: {', '.join(ROUTES)})")
+    module = importlib.import_module(ROUTES[route])
+    if env_file and load_dotenv:
+        load_dotenv(env_file)
+    if route in ("sftp-s3", "sftp-sftp"):
+        # These read CLI overrides too; take the parser defaults
+        argv = ["--env-file", env_file] if env_file else []
+        return module, module.load_config(module.build_parser().parse_args(argv))
+    return module, module.load_config(env_file)
+
+
+def with_overrides(cfg: Any, **overrides: Any) -> Any:
+    """dataclasses.replace, ignoring fields a route's Config does not have."""
+    names = {f.name for f in dataclasses.fields(cfg)}
+    return dataclasses.replace(cfg, **{k: v for k, v in overrides.items() if k in names and v is not None})
+
+
+# -----------------------------
+# Execution
+# -----------------------------
+async def run_scenario(gate: asyncio.Semaphore,
+                       scenario: Scenario,
+                       module: Any,
+                       cfg: Any) -> ScenarioResult:
+    async with gate:
+        start = time.time()
+        try:
+            detail = await module.run_test_async(with_overrides(cfg, size_bytes=scenario.size_bytes))
+            return ScenarioResult(scenario, True, time.time() - start, detail=detail)
+        except Exception as e:
+            LOG.error("❌ %s failed: %s", scenario.name, e)
+            return ScenarioResult(scenario, False, time.time() - start, error=str(e))
+
+
+async def run_scenarios(scenarios: List[Scenario],
+                        routes: Dict[str, Tuple[Any, Any]],
+                        max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[ScenarioResult]:
+    """Runs all scenarios, at most max_concurrency at a time; results in input order."""
+    max_concurrency = max(1, max_concurrency)
+    set_pad_cache_size(max(DEFAULT_PAD_CACHE_SEEDS, max_concurrency))
+    gate = asyncio.Semaphore(max_concurrency)
+    return await asyncio.gather(*(run_scenario(gate, s, *routes[s.route]) for s in scenarios))
+
+
+def summarize(results: List[ScenarioResult], elapsed: float) -> None:
+    by_route: Dict[str, List[ScenarioResult]] = {}
+    for r in results:
+        by_route.setdefault(r.scenario.route, []).append(r)
+    for route, rs in sorted(by_route.items()):
+        passed = [r for r in rs if r.ok]
+        mean = sum(r.seconds for r in passed) / len(passed) if passed else 0.0
+        slowest = max((r.seconds for r in passed), default=0.0)
+        LOG.info("%-10s pass=%d fail=%d mean=%.2fs max=%.2fs",
+                 route, len(passed), len(rs) - len(passed), mean, slowest)
+    failed = [r for r in results if not r.ok]
+    LOG.info("Scenarios: %d run, %d failed, %.2fs wall", len(results), len(failed), elapsed)
+
+
+def close_shared_pools(routes: Dict[str, Tuple[Any, Any]]) -> None:
+    # Imported lazily: an s3-only or sftp-only run should not need the other client library
+    if any(r != "sftp-sftp" for r in routes):
+        from e2e_s3 import connection_stats
+        from e2e_s3_calls import S3_CALLS, log_summary
+        stats = connection_stats()
+        LOG.info("S3 clients=%d connections_opened=%d", stats["clients"], stats["connections_opened"])
+        log_summary(LOG, S3_CALLS.snapshot(), "S3 calls (all scenarios)")
+    if any(r != "s3-s3" for r in routes):
+        from e2e_sftp import POOL
+        LOG.info("SFTP pool: %s", POOL.stats())
+        POOL.close_all()
+    shutdown_executors()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description="Run many E2E scenarios concurrently in one process")
+    ap.add_argument("--env-file", default=os.getenv("ENV_FILE", ".env"))
+    ap.add_argument("--routes", default="sftp-s3", help=f"Comma-separated routes: {', '.join(ROUTES)}")
+    ap.add_argument("--sizes", default=os.getenv("TEST_SIZE", "1MB"), help="Comma-separated sizes, e.g. 1MB,100MB,5GB")
+    ap.add_argument("--repeat", type=int, default=1, help="Scenarios per (route, size)")
+    ap.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                    help="Scenarios in flight at once")
+    ap.add_argument("--endpoint-limit", type=int, default=None,
+                    help="Concurrent I/O phases per SFTP host / S3 bucket (default: unlimited)")
+    ap.add_argument("--s3-max-pool-connections", type=int, default=None,
+                    help="Shared S3 connection pool size (default S3_MAX_POOL_CONNECTIONS)")
+    ap.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "INFO"))
+    return ap
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    setup_logging(args.log_level)
+    set_default_endpoint_limit(args.endpoint_limit)
+
+    route_names = [r.strip() for r in args.routes.split(",") if r.strip()]
+    routes: Dict[str, Tuple[Any, Any]] = {}
+    scenarios: List[Scenario] = []
+    try:
+        for route in route_names:
+            module, cfg = load_route(route, args.env_file)
+            routes[route] = (module, with_overrides(cfg, s3_max_pool_connections=args.s3_max_pool_connections))
+            for size in (module.parse_size(s) for s in args.sizes.split(",") if s.strip()):
+                scenarios.extend(Scenario(route, size, i) for i in range(max(1, args.repeat)))
+
+        LOG.info("=== E2E RUNNER START: %d scenario(s), concurrency=%d, endpoint limit=%s ===",
+                 len(scenarios), args.max_concurrency, args.endpoint_limit or "none")
+        start = time.time()
+        results = asyncio.run(run_scenarios(scenarios, routes, args.max_concurrency))
+        summarize(results, time.time() - start)
+        return 0 if all(r.ok for r in results) else 2
+
+    except Exception as e:
+        LOG.error("❌ FAIL: %s", str(e))
+        return 2
+
+    finally:
+        close_shared_pools(routes)
+        METRICS.export()
+        LOG.info("=== E2E RUNNER END ===")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Process-wide S3 client factory shared by the E2E scripts.
+
+boto3 clients are thread-safe once built, but building one costs credential
+resolution, endpoint construction and (on first use) a TLS handshake. The
+scripts used to build a client per call (every HEAD poll, every ranged GET),
+so clients are now cached per (region, endpoint, profile) and share one
+tuned urllib3 pool. Other services the scripts talk to (SQS for arrival
+events) go through the same cache via get_client. Every client built here is
+instrumented with per-operation latency histograms (e2e_s3_calls).
+"""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config as BotoConfig
+
+from e2e_s3_calls import S3_CALLS
+
+DEFAULT_MAX_POOL_CONNECTIONS = 32
+DEFAULT_MAX_ATTEMPTS = 10
+
+_ClientKey = Tuple[str, str, Optional[str], Optional[str]]
+
+_CLIENTS: Dict[_ClientKey, Any] = {}
+_LOCK = threading.Lock()
+
+
+def client_config(max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+                  max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> BotoConfig:
+    """
+    Pool sized to our concurrency, TCP keepalive for long polls and adaptive
+    retries (client-side rate limiting on throttling).
+    """
+    return BotoConfig(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        retries={"mode": "adaptive", "max_attempts": max_attempts},
+    )
+
+
+def get_client(service: str,
+               region: str,
+               endpoint_url: Optional[str] = None,
+               profile: Optional[str] = None,
+               config: Optional[BotoConfig] = None):
+    """
+    Returns the cached `service` client for (region, endpoint_url, profile),
+    building it on first use. `config` only applies when the client is first built.
+    """
+    key = (service, region, endpoint_url or None, profile or None)
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+
+    with _LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            # boto3.Session is not thread-safe; build under the lock.
+            session = boto3.session.Session(profile_name=profile) if profile else boto3.session.Session()
+            client = session.client(
+                service,
+                region_name=region,
+                endpoint_url=endpoint_url or None,
+                config=config or client_config(),
+            )
+            S3_CALLS.instrument(client)
+            _CLIENTS[key] = client
+    return client
+
+
+def get_s3_client(region: str,
+                  endpoint_url: Optional[str] = None,
+                  profile: Optional[str] = None,
+                  config: Optional[BotoConfig] = None):
+    return get_client("s3", region, endpoint_url, profile, config)
+
+
+def _client_connections(client) -> int:
+    """Connections opened by the client's urllib3 pools (best effort)."""
+    try:
+        manager = client._endpoint.http_session._manager
+        return sum(manager.pools[k].num_connections for k in list(manager.pools.keys()))
+    except Exception:
+        return 0
+
+
+def connection_stats() -> Dict[str, int]:
+    """Clients built and HTTP connections actually opened in this process."""
+    with _LOCK:
+        clients = list(_CLIENTS.values())
+    return {
+        "clients": len(clients),
+        "connections_opened": sum(_client_connections(c) for c in clients),
+    }
+
+
+def reset_clients() -> None:
+    """Drops cached clients (e.g. between runs in one process)."""
+    with _LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for c in clients:
+        try:
+            c.close()
+        except Exception:
+            pass
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Per-operation latency histograms for the AWS API calls the scripts make.
+
+Phase timings (e2e_metrics) say that "verify" or "first_appearance" was
+slow, not whether the time went to HEAD polling, ranged GETs or multipart
+parts. Every client built by e2e_s3.get_client gets botocore event handlers:
+
+- before-send:      stamps the start of the call (first attempt only, so
+                    retry backoff counts towards the call's latency) and
+                    tags GetObject with a Range header as "GetObject(ranged)",
+- response-received: counts throttled attempts (503 / SlowDown), including
+                    the ones the retry handler swallows,
+- after-call / after-call-error: records latency, retries and final status.
+
+For streaming responses (GetObject) latency is time to response headers;
+the body is read by the caller. Handlers do a perf_counter, a bisect and a
+few dict updates under one lock.
+
+Counters are process-wide. `since(snapshot())` gives the calls made by one
+run; concurrent runs in one process (runner, load mode) overlap.
+"""
+
+import time
+import logging
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from e2e_metrics import METRIC_PREFIX, METRICS
+
+# Upper bounds in seconds (Prometheus defaults, plus the long tail of polls and parts)
+BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+THROTTLE_CODES = frozenset({"SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded",
+                            "TooManyRequestsException", "ServiceUnavailable"})
+
+_START = "e2e_call_start"
+_OPERATION = "e2e_operation"
+
+_OpKey = Tuple[str, str]  # (service, operation)
+
+
+@dataclass
+class OpStats:
+    count: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    retries: int = 0
+    throttled: int = 0
+    errors: int = 0  # calls that ended without an HTTP response (connection errors, timeouts)
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+    statuses: Dict[int, int] = field(default_factory=dict)
+
+    def copy(self) -> "OpStats":
+        return OpStats(self.count, self.seconds, self.max_seconds, self.retries, self.throttled,
+                       self.errors, list(self.buckets), dict(self.statuses))
+
+    def minus(self, other: "OpStats") -> "OpStats":
+        return OpStats(
+            self.count - other.count,
+            self.seconds - other.seconds,
+            self.max_seconds,  # max is not subtractable; the process-wide max bounds the window's
+            self.retries - other.retries,
+            self.throttled - other.throttled,
+            self.errors - other.errors,
+            [a - b for a, b in zip(self.buckets, other.buckets)],
+            {k: n - other.statuses.get(k, 0) for k, n in self.statuses.items() if n - other.statuses.get(k, 0)},
+        )
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding quantile q (inf when it falls past the last bound)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.buckets):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class S3Calls:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops: Dict[_OpKey, OpStats] = {}
+
+    # --- botocore handlers ---
+    def _before_send(self, request, **kwargs) -> None:
+        ctx = request.context
+        if _START not in ctx:
+            ctx[_START] = time.perf_counter()
+            if "Range" in request.headers and kwargs.get("event_name", "").endswith(".GetObject"):
+                ctx[_OPERATION] = "GetObject(ranged)"
+
+    def _response_received(self, response_dict=None, parsed_response=None, context=None, event_name="", **kwargs) -> None:
+        if response_dict is None:
+            return
+        code = (parsed_response or {}).get("Error", {}).get("Code")
+        if response_dict.get("status_code") == 503 or code in THROTTLE_CODES:
+            with self._lock:
+                self._stats(event_name, context).throttled += 1
+
+    def _after_call(self, http_response=None, parsed=None, context=None, event_name="", **kwargs) -> None:
+        retries = (parsed or {}).get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        self._finish(event_name, context, retries, getattr(http_response, "status_code", None))
+
+    def _after_call_error(self, exception=None, context=None, event_name="", **kwargs) -> None:
+        retries = max(0, (context or {}).get("retries", {}).get("attempt", 1) - 1)
+        self._finish(event_name, context, retries, None)
+
+    def _finish(self, event_name: str, context: Optional[dict], retries: int, status: Optional[int]) -> None:
+        started = (context or {}).get(_START)
+        if started is None:  # short-circuited before send (e.g. stubbed / param validation)
+            return
+        seconds = time.perf_counter() - started
+        with self._lock:
+            s = self._stats(event_name, context)
+            s.count += 1
+            s.seconds += seconds
+            s.max_seconds = max(s.max_seconds, seconds)
+            s.buckets[bisect_left(BUCKETS, seconds)] += 1
+            s.retries += retries
+            if status is None:
+                s.errors += 1
+            else:
+                s.statuses[status] = s.statuses.get(status, 0) + 1
+
+    def _stats(self, event_name: str, context: Optional[dict]) -> OpStats:
+        # event_name: "<event>.<service-id>.<Operation>"; caller holds the lock
+        _, service, operation = event_name.split(".", 2)
+        key = (service, (context or {}).get(_OPERATION) or operation)
+        s = self._ops.get(key)
+        if s is None:
+            s = self._ops[key] = OpStats()
+        return s
+
+    def instrument(self, client) -> None:
+        """Registers the handlers on one client (once per client; get_client caches them)."""
+        service = client.meta.service_model.service_id.hyphenize()
+        events = client.meta.events
+        events.register(f"before-send.{service}", self._before_send, unique_id="e2e-calls-before-send")
+        events.register(f"response-received.{service}", self._response_received, unique_id="e2e-calls-response")
+        events.register(f"after-call.{service}", self._after_call, unique_id="e2e-calls-after-call")
+        events.register(f"after-call-error.{service}", self._after_call_error, unique_id="e2e-calls-after-call-error")
+
+    # --- reporting ---
+    def snapshot(self) -> Dict[_OpKey, OpStats]:
+        with self._lock:
+            return {k: s.copy() for k, s in self._ops.items()}
+
+    def since(self, before: Dict[_OpKey, OpStats]) -> Dict[_OpKey, OpStats]:
+        """Calls made after `before` was taken (operations with no new calls are dropped)."""
+        out = {}
+        for k, s in self.snapshot().items():
+            delta = s.minus(before[k]) if k in before else s
+            if delta.count or delta.throttled:
+                out[k] = delta
+        return out
+
+    def json(self) -> List[Dict[str, object]]:
+        return [{"service": svc, "operation": op, **_describe(s), "buckets": dict(zip(_le_labels(), s.buckets))}
+                for (svc, op), s in sorted(self.snapshot().items())]
+
+    def openmetrics_lines(self) -> List[str]:
+        p = f"{METRIC_PREFIX}_api_call_seconds"
+        ops = sorted(self.snapshot().items())
+        lines = [f"# TYPE {p} histogram", f"# UNIT {p} seconds", f"# HELP {p} AWS API call latency (first attempt to final response)."]
+        for (svc, op), s in ops:
+            labels = f'service="{svc}",operation="{op}"'
+            cumulative = 0
+            for le, n in zip(_le_labels(), s.buckets):
+                cumulative += n
+                lines.append(f'{p}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{p}_count{{{labels}}} {s.count}")
+            lines.append(f"{p}_sum{{{labels}}} {s.seconds:.6f}")
+        for name, attr, help_text in (
+            ("api_retries", "retries", "Retried attempts per operation."),
+            ("api_throttled", "throttled", "Attempts answered with 503 / SlowDown."),
+            ("api_errors", "errors", "Calls that ended without an HTTP response."),
+        ):
+            lines += [f"# TYPE {METRIC_PREFIX}_{name} counter", f"# HELP {METRIC_PREFIX}_{name} {help_text}"]
+            lines += [f'{METRIC_PREFIX}_{name}_total{{service="{svc}",operation="{op}"}} {getattr(s, attr)}'
+                      for (svc, op), s in ops]
+        return lines
+
+
+def _le_labels() -> List[str]:
+    return [f"{b:g}" for b in BUCKETS] + ["+Inf"]
+
+
+def _describe(s: OpStats) -> Dict[str, object]:
+    return {
+        "count": s.count,
+        "mean_seconds": s.seconds / s.count if s.count else 0.0,
+        "p50_le_seconds": s.quantile(0.50),
+        "p99_le_seconds": s.quantile(0.99),
+        "max_seconds": s.max_seconds,
+        "retries": s.retries,
+        "throttled": s.throttled,
+        "errors": s.errors,
+        "statuses": {str(k): n for k, n in sorted(s.statuses.items())},
+    }
+
+
+def log_summary(log: logging.Logger, ops: Dict[_OpKey, OpStats], title: str = "API calls") -> None:
+    if not ops:
+        return
+    log.info("%s:", title)
+    for (svc, op), s in sorted(ops.items()):
+        d = _describe(s)
+        odd = {k: n for k, n in d["statuses"].items() if not k.startswith("2")}
+        log.info("  %-4s %-23s n=%-5d mean=%.3fs p50<=%gs p99<=%gs max=%.3fs retries=%d 503=%d errors=%d%s",
+                 svc, op, s.count, d["mean_seconds"], d["p50_le_seconds"], d["p99_le_seconds"], s.max_seconds,
+                 s.retries, s.throttled, s.errors, f" statuses={odd}" if odd else "")
+
+
+S3_CALLS = S3Calls()
+METRICS.add_collector("api_calls", S3_CALLS.json, S3_CALLS.openmetrics_lines)
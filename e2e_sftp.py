@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Persistent SFTP sessions shared by the E2E scripts.
+
+Opening an SFTP session means a TCP connect, a full SSH handshake and
+parsing the private key again. Against slow partner servers that costs
+seconds per operation, and the scripts used to pay it for every upload,
+copy, verification and delete.
+
+SFTPPool keeps one or more authenticated transports per SFTPConn (with SSH
+keepalives) and hands out SFTP channels on them. Released channels are
+health-checked before reuse and idle ones are evicted.
+"""
+
+import time
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import paramiko
+
+from e2e_metrics import METRICS, SHARED
+
+LOG = logging.getLogger("e2e-sftp")
+
+DEFAULT_KEEPALIVE_SECONDS = 30
+DEFAULT_IDLE_TIMEOUT_SECONDS = 300
+DEFAULT_HEALTH_CHECK_AFTER_SECONDS = 15
+DEFAULT_MAX_CHANNELS_PER_TRANSPORT = 8  # below OpenSSH's default MaxSessions=10
+
+# Errors after which a channel is not reused. socket.error is OSError itself,
+# so only its connection-level subclasses are listed.
+_BROKEN_ERRORS = (EOFError, paramiko.SSHException, ConnectionError, socket.timeout)
+
+
+@dataclass(frozen=True)
+class SFTPConn:
+    host: str
+    port: int
+    username: str
+    private_key_path: str
+    private_key_passphrase: Optional[str]
+    remote_dir: str
+
+
+# -----------------------------
+# Key loading (cached)
+# -----------------------------
+_KEYS: Dict[Tuple[str, Optional[str]], paramiko.PKey] = {}
+_KEYS_LOCK = threading.Lock()
+
+
+def load_private_key(path: str, passphrase: Optional[str]) -> paramiko.PKey:
+    cache_key = (path, passphrase)
+    with _KEYS_LOCK:
+        pkey = _KEYS.get(cache_key)
+    if pkey is not None:
+        return pkey
+
+    loaders = [
+        getattr(paramiko, name).from_private_key_file
+        for name in ("Ed25519Key", "RSAKey", "ECDSAKey", "DSSKey")
+        if hasattr(paramiko, name)
+    ]
+    last = None
+    with METRICS.phase(SHARED, "key_load"):
+        for loader in loaders:
+            try:
+                pkey = loader(path, password=passphrase)
+                break
+            except Exception as e:
+                last = e
+        else:
+            raise RuntimeError(f"Unable to load private key from {path}. Last error: {last}")
+
+    with _KEYS_LOCK:
+        _KEYS[cache_key] = pkey
+    return pkey
+
+
+# -----------------------------
+# Pool
+# -----------------------------
+class _Transport:
+    def __init__(self, transport: paramiko.Transport):
+        self.transport = transport
+        self.in_use = 0
+
+    def alive(self) -> bool:
+        return self.transport.is_active() and self.transport.is_authenticated()
+
+
+class _Channel:
+    def __init__(self, owner: _Transport, sftp: paramiko.SFTPClient):
+        self.owner = owner
+        self.sftp = sftp
+        self.last_used = time.monotonic()
+
+
+class SFTPPool:
+    def __init__(self,
+                 keepalive_seconds: int = DEFAULT_KEEPALIVE_SECONDS,
+                 idle_timeout_seconds: int = DEFAULT_IDLE_TIMEOUT_SECONDS,
+                 health_check_after_seconds: int = DEFAULT_HEALTH_CHECK_AFTER_SECONDS,
+                 max_channels_per_transport: int = DEFAULT_MAX_CHANNELS_PER_TRANSPORT):
+        self.keepalive_seconds = keepalive_seconds
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.health_check_after_seconds = health_check_after_seconds
+        self.max_channels_per_transport = max(1, max_channels_per_transport)
+        self._lock = threading.Lock()
+        self._transports: Dict[SFTPConn, List[_Transport]] = {}
+        self._idle: Dict[SFTPConn, List[_Channel]] = {}
+        # Counters for logs/metrics
+        self.handshakes = 0
+        self.channels_opened = 0
+        self.reuses = 0
+
+    # --- internals ---
+    def _connect(self, conn: SFTPConn) -> _Transport:
+        pkey = load_private_key(conn.private_key_path, conn.private_key_passphrase)
+        with METRICS.phase(SHARED, "ssh_handshake", requests=1):
+            t = paramiko.Transport((conn.host, conn.port))
+            try:
+                t.connect(username=conn.username, pkey=pkey)
+            except Exception:
+                t.close()
+                raise
+        if self.keepalive_seconds:
+            t.set_keepalive(self.keepalive_seconds)
+        with self._lock:
+            self.handshakes += 1
+        LOG.debug("SFTP handshake complete: %s@%s:%d", conn.username, conn.host, conn.port)
+        return _Transport(t)
+
+    def _healthy(self, ch: _Channel) -> bool:
+        if not ch.owner.alive() or ch.sftp.get_channel().closed:
+            return False
+        if time.monotonic() - ch.last_used < self.health_check_after_seconds:
+            return True
+        try:
+            ch.sftp.normalize(".")
+            return True
+        except Exception:
+            return False
+
+    def _close_channel(self, ch: _Channel) -> None:
+        try:
+            ch.sftp.close()
+        except Exception:
+            pass
+
+    def _pick_transport(self, conn: SFTPConn) -> Optional[_Transport]:
+        live = [t for t in self._transports.get(conn, []) if t.alive()]
+        self._transports[conn] = live
+        for t in live:
+            if t.in_use < self.max_channels_per_transport:
+                return t
+        return None
+
+    # --- public API ---
+    def acquire(self, conn: SFTPConn) -> _Channel:
+        self.evict_idle()
+        while True:
+            with self._lock:
+                idle = self._idle.get(conn, [])
+                ch = idle.pop() if idle else None
+            if ch is None:
+                break
+            if self._healthy(ch):
+                with self._lock:
+                    ch.owner.in_use += 1
+                    self.reuses += 1
+                return ch
+            self._close_channel(ch)
+
+        with self._lock:
+            owner = self._pick_transport(conn)
+            if owner is not None:
+                owner.in_use += 1
+        if owner is None:
+            owner = self._connect(conn)
+            with self._lock:
+                owner.in_use += 1
+                self._transports.setdefault(conn, []).append(owner)
+
+        try:
+            sftp = paramiko.SFTPClient.from_transport(owner.transport)
+        except Exception:
+            with self._lock:
+                owner.in_use -= 1
+            raise
+        with self._lock:
+            self.channels_opened += 1
+        return _Channel(owner, sftp)
+
+    def release(self, conn: SFTPConn, ch: _Channel, broken: bool = False) -> None:
+        with self._lock:
+            ch.owner.in_use -= 1
+        if broken or not ch.owner.alive() or ch.sftp.get_channel().closed:
+            self._close_channel(ch)
+            return
+        ch.last_used = time.monotonic()
+        with self._lock:
+            self._idle.setdefault(conn, []).append(ch)
+        self.evict_idle()
+
+    def evict_idle(self) -> None:
+        now = time.monotonic()
+        expired: List[_Channel] = []
+        dead: List[_Transport] = []
+        with self._lock:
+            for conn, idle in self._idle.items():
+                keep = []
+                for ch in idle:
+                    if now - ch.last_used > self.idle_timeout_seconds:
+                        expired.append(ch)
+                    else:
+                        keep.append(ch)
+                self._idle[conn] = keep
+            for conn, transports in self._transports.items():
+                idle_owners = {id(ch.owner) for ch in self._idle.get(conn, [])}
+                keep_t = []
+                for t in transports:
+                    if t.in_use == 0 and id(t) not in idle_owners:
+                        dead.append(t)
+                    else:
+                        keep_t.append(t)
+                self._transports[conn] = keep_t
+        for ch in expired:
+            self._close_channel(ch)
+        for t in dead:
+            t.transport.close()
+
+    @contextmanager
+    def session(self, conn: SFTPConn) -> Iterator[paramiko.SFTPClient]:
+        ch = self.acquire(conn)
+        broken = False
+        try:
+            yield ch.sftp
+        except _BROKEN_ERRORS:
+            # Transport-level failures leave the channel in an unknown state.
+            # SFTP status errors (FileNotFoundError, PermissionError, ...) do
+            # not; a channel closed underneath them is caught on release.
+            broken = True
+            raise
+        finally:
+            self.release(conn, ch, broken=broken)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle = [ch for chs in self._idle.values() for ch in chs]
+            transports = [t for ts in self._transports.values() for t in ts]
+            self._idle.clear()
+            self._transports.clear()
+        for ch in idle:
+            self._close_channel(ch)
+        for t in transports:
+            t.transport.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "handshakes": self.handshakes,
+                "channels_opened": self.channels_opened,
+                "reuses": self.reuses,
+            }
+
+
+POOL = SFTPPool()
+
+
+def sftp_session(conn: SFTPConn):
+    """Context manager yielding a pooled paramiko.SFTPClient for `conn`."""
+    return POOL.session(conn)
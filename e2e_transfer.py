@@ -0,0 +1,788 @@
+#!/usr/bin/env python3
+"""
+Transfer engines shared by the E2E scripts.
+
+- parallel_sftp_upload: splits the deterministic payload into N byte ranges
+  and writes them concurrently over separate pooled SFTP channels (and
+  transports, once a transport's channel budget is used up) with
+  offset-addressed writes. A single channel is capped by its SSH window;
+  N channels are not.
+- relay_sftp_to_sftp: a reader thread (windowed readv, i.e. pipelined
+  reads) feeds a bounded ring of buffers drained by a pipelined writer, so
+  both endpoints stay busy instead of taking turns waiting on round trips.
+- s3_to_sftp_ranged: concurrent ranged GETs written at their offsets on the
+  SFTP target over pooled channels, or reordered into one sequential write
+  stream for servers that reject random writes.
+- s3_multipart_upload / s3_multipart_copy: explicit multipart uploads
+  (UploadPart / UploadPartCopy) with the same part layout as TransferManager,
+  parts in flight adapting to part latency (e2e_planner) and, for uploads,
+  optionally generated by worker processes into shared memory (e2e_partgen).
+
+Given a Checkpoint (e2e_resume), the SFTP uploads, the relay and the S3
+multipart transfers record their progress and continue from it: SFTP
+streams from their last confirmed offset, multipart transfers from the
+parts the open upload already holds.
+"""
+
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import botocore.exceptions
+
+from e2e_buffers import BufferPool, readinto_exact
+from e2e_checksum import COMPOSITE, FULL_OBJECT, FULL_OBJECT_ONLY
+from e2e_partgen import SharedPartReader, shared_part_generator
+from e2e_payload import CHUNK, DEFAULT_PATTERN_VERSION, DeterministicStream, expected_into
+from e2e_planner import COPY, UPLOAD, AdaptiveConcurrency, record_part_latency
+from e2e_resume import Checkpoint
+from e2e_sftp import POOL, SFTPConn, SFTPPool
+
+LOG = logging.getLogger("e2e-transfer")
+
+DEFAULT_PART_SUFFIX = ".part"
+DEFAULT_RING_BUFFERS = 8
+DEFAULT_S3_PART_SIZE = 16 * 1024 * 1024
+DEFAULT_S3_RANGE_CONCURRENCY = 8
+DEFAULT_S3_PART_CONCURRENCY = 10  # TransferManager's default max_concurrency
+PROGRESS_LOG_SECONDS = 10
+# Checkpointed SFTP streams close their handle every segment: the close reply
+# comes after every pipelined write's, so the segment is confirmed on disk.
+CHECKPOINT_SEGMENT_BYTES = 64 * 1024 * 1024
+
+
+def split_ranges(total_size: int, parts: int, align: int = CHUNK) -> List[Tuple[int, int]]:
+    """
+    Splits [0, total_size) into at most `parts` contiguous (start, end) ranges
+    whose boundaries are multiples of `align`.
+    """
+    if total_size <= 0:
+        return []
+    parts = max(1, parts)
+    per = -(-total_size // parts)  # ceil
+    per = max(align, -(-per // align) * align)
+    return [(s, min(s + per, total_size)) for s in range(0, total_size, per)]
+
+
+def percentiles(values: Iterable[float], ps: Iterable[float] = (50, 90, 99)) -> Dict[str, float]:
+    """Nearest-rank percentiles, e.g. {"p50": ..., "p90": ..., "p99": ...}."""
+    ordered = sorted(values)
+    out = {}
+    for p in ps:
+        if not ordered:
+            out[f"p{p:g}"] = 0.0
+            continue
+        rank = max(1, -(-len(ordered) * p // 100))
+        out[f"p{p:g}"] = ordered[int(min(rank, len(ordered))) - 1]
+    return out
+
+
+class _Progress:
+    def __init__(self, label: str, total: int):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.start = time.time()
+        self._last_log = self.start
+        self._lock = threading.Lock()
+
+    def add(self, n: int) -> None:
+        with self._lock:
+            self.done += n
+            now = time.time()
+            if now - self._last_log < PROGRESS_LOG_SECONDS:
+                return
+            self._last_log = now
+            done = self.done
+        rate = done / max(1e-9, now - self.start)
+        LOG.info("%s progress: %.2f%% (%d/%d)  rate=%.2f MB/s",
+                 self.label, 100.0 * done / self.total if self.total else 100.0,
+                 done, self.total, rate / (1024 * 1024))
+
+    def summary(self) -> Dict[str, float]:
+        elapsed = time.time() - self.start
+        return {
+            "bytes": self.done,
+            "seconds": elapsed,
+            "mb_per_s": (self.done / max(1e-9, elapsed)) / (1024 * 1024),
+        }
+
+
+def _upload_range(pool: SFTPPool, conn: SFTPConn, path: str, seed: bytes, total_size: int,
+                  version: int, start: int, end: int, io_chunk_bytes: int, progress: _Progress,
+                  segment_bytes: Optional[int] = None,
+                  on_confirmed: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Writes [start, end). With `segment_bytes` the handle is reopened per
+    segment and `on_confirmed(offset)` reports each acknowledged segment end.
+    """
+    stream = DeterministicStream(seed, total_size, version)
+    # One buffer for the whole range: paramiko copies each write into its packet
+    buf = memoryview(bytearray(io_chunk_bytes))
+    written = 0
+    with pool.session(conn) as sftp:
+        for seg_start in range(start, end, segment_bytes or max(1, end - start)):
+            seg_end = min(seg_start + (segment_bytes or end - start), end)
+            stream.seek(seg_start)
+            with sftp.open(path, "r+b") as f:
+                f.set_pipelined(True)
+                f.seek(seg_start)
+                while stream.tell() < seg_end:
+                    n = stream.readinto(buf[:min(io_chunk_bytes, seg_end - stream.tell())])
+                    f.write(buf[:n])
+                    written += n
+                    progress.add(n)
+            if on_confirmed is not None:
+                on_confirmed(seg_end)
+    return written
+
+
+def _resume_offsets(pool: SFTPPool, conn: SFTPConn, path: str, total_size: int,
+                    ranges: List[Tuple[int, int]], checkpoint: Optional[Checkpoint]) -> Optional[Dict[int, int]]:
+    """Confirmed offset per range start from the checkpoint, or None to start over."""
+    if checkpoint is None:
+        return None
+    state = checkpoint.state
+    saved = {int(k): v for k, v in (state.get("offsets") or {}).items()}
+    if state.get("path") != path or state.get("size") != total_size or sorted(saved) != [s for s, _ in ranges]:
+        return None
+    try:
+        with pool.session(conn) as sftp:
+            remote = int(sftp.stat(path).st_size)
+    except IOError:
+        return None
+    if any(pos > remote for pos in saved.values()):  # truncated or replaced since
+        return None
+    return saved
+
+
+def parallel_sftp_upload(conn: SFTPConn,
+                         remote_path: str,
+                         seed: bytes,
+                         total_size: int,
+                         parallelism: int,
+                         version: int = DEFAULT_PATTERN_VERSION,
+                         io_chunk_bytes: int = CHUNK,
+                         part_suffix: Optional[str] = DEFAULT_PART_SUFFIX,
+                         pool: SFTPPool = POOL,
+                         checkpoint: Optional[Checkpoint] = None) -> Dict[str, float]:
+    """
+    Uploads the deterministic payload to `remote_path` using `parallelism`
+    concurrent channels. Ranges land out of order, so by default the data is
+    written to `remote_path + part_suffix` and renamed once complete; this
+    keeps pickup-on-arrival pipelines from grabbing a file with holes.
+
+    With a checkpoint each range records its confirmed offset every
+    CHECKPOINT_SEGMENT_BYTES, and a rerun continues every range from there.
+
+    Returns {"bytes", "seconds", "mb_per_s", "resumed_bytes"}; bytes counts
+    this call's writes only.
+    """
+    write_path = remote_path + part_suffix if part_suffix else remote_path
+    if checkpoint is not None and checkpoint.done:
+        LOG.info("Parallel SFTP upload of %s:%s already complete (checkpoint)", conn.host, remote_path)
+        return {"bytes": 0, "seconds": 0.0, "mb_per_s": 0.0, "resumed_bytes": total_size}
+
+    ranges = split_ranges(total_size, parallelism)
+    offsets = _resume_offsets(pool, conn, write_path, total_size, ranges, checkpoint)
+    resumed = offsets is not None
+    if not resumed:
+        offsets = {s: s for s, _ in ranges}
+        # Create/truncate once so every worker can open it r+b.
+        with pool.session(conn) as sftp:
+            with sftp.open(write_path, "wb"):
+                pass
+        if checkpoint is not None:
+            checkpoint.reset(path=write_path, size=total_size, offsets={str(s): s for s in offsets})
+    resumed_bytes = sum(offsets[s] - s for s, _ in ranges)
+
+    LOG.info("Parallel SFTP upload: %s:%s (size=%d, streams=%d%s)",
+             conn.host, remote_path, total_size, len(ranges),
+             f", resuming at {resumed_bytes} bytes" if resumed else "")
+
+    def confirmed(range_start: int) -> Optional[Callable[[int], None]]:
+        if checkpoint is None:
+            return None
+        return lambda pos: checkpoint.record("offsets", str(range_start), pos)
+
+    progress = _Progress("Parallel upload", total_size - resumed_bytes)
+    with ThreadPoolExecutor(max_workers=max(1, len(ranges)), thread_name_prefix="sftp-up") as ex:
+        futures = [
+            ex.submit(_upload_range, pool, conn, write_path, seed, total_size, version,
+                      offsets[s], e, io_chunk_bytes, progress,
+                      CHECKPOINT_SEGMENT_BYTES if checkpoint is not None else None, confirmed(s))
+            for s, e in ranges
+        ]
+        written = sum(f.result() for f in futures)
+
+    with pool.session(conn) as sftp:
+        size = int(sftp.stat(write_path).st_size)
+        if written + resumed_bytes != total_size or size != total_size:
+            raise AssertionError(f"Parallel upload size mismatch: written={written + resumed_bytes} "
+                                 f"remote={size} expected={total_size}")
+        if write_path != remote_path:
+            sftp.rename(write_path, remote_path)
+    if checkpoint is not None:
+        checkpoint.complete()
+
+    result = progress.summary()
+    result["resumed_bytes"] = resumed_bytes
+    LOG.info("Parallel upload complete ✅  bytes=%d  streams=%d  time=%.1fs  aggregate=%.2f MB/s",
+             result["bytes"], len(ranges), result["seconds"], result["mb_per_s"])
+    return result
+
+
+# -----------------------------
+# SFTP -> SFTP relay
+# -----------------------------
+class _RelayStats:
+    def __init__(self, total: int, ring_size: int):
+        self.total = total
+        self.ring_size = ring_size
+        self.read_bytes = 0
+        self.written_bytes = 0
+        self.read_busy = 0.0
+        self.write_busy = 0.0
+        self.occupancy_sum = 0
+        self.occupancy_samples = 0
+        self.start = time.time()
+
+    def sample(self, occupancy: int) -> None:
+        self.occupancy_sum += occupancy
+        self.occupancy_samples += 1
+
+    def avg_occupancy(self) -> float:
+        return self.occupancy_sum / self.occupancy_samples if self.occupancy_samples else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        elapsed = time.time() - self.start
+        mb = 1024 * 1024
+        return {
+            "bytes": self.written_bytes,
+            "seconds": elapsed,
+            "mb_per_s": (self.written_bytes / max(1e-9, elapsed)) / mb,
+            "read_mb_per_s": (self.read_bytes / max(1e-9, self.read_busy)) / mb,
+            "write_mb_per_s": (self.written_bytes / max(1e-9, self.write_busy)) / mb,
+            "avg_queue_occupancy": self.avg_occupancy(),
+            "ring_size": self.ring_size,
+        }
+
+
+_EOF = object()
+
+
+def _ring_put(ring: "queue.Queue", item, stop: threading.Event) -> bool:
+    """Blocking put that gives up once the consumer has stopped."""
+    while not stop.is_set():
+        try:
+            ring.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _relay_reader(pool: SFTPPool, conn: SFTPConn, path: str, start: int, total_size: int, io_chunk_bytes: int,
+                  ring: "queue.Queue", stop: threading.Event, stats: _RelayStats) -> None:
+    try:
+        with pool.session(conn) as sftp:
+            with sftp.open(path, "rb") as rf:
+                # readv over a window of ring-size chunks keeps that many reads in flight
+                # without letting paramiko prefetch the whole file into memory.
+                window = ring.maxsize * io_chunk_bytes
+                for win_start in range(start, total_size, window):
+                    win_end = min(win_start + window, total_size)
+                    chunks = [(off, min(io_chunk_bytes, win_end - off))
+                              for off in range(win_start, win_end, io_chunk_bytes)]
+                    t0 = time.time()
+                    for data in rf.readv(chunks):
+                        stats.read_busy += time.time() - t0
+                        stats.read_bytes += len(data)
+                        if not _ring_put(ring, data, stop):
+                            return
+                        t0 = time.time()
+        _ring_put(ring, _EOF, stop)
+    except BaseException as e:
+        _ring_put(ring, e, stop)
+
+
+def _relay_resume_offset(pool: SFTPPool, conn: SFTPConn, path: str, total_size: int,
+                         checkpoint: Optional[Checkpoint]) -> int:
+    if checkpoint is None:
+        return 0
+    state = checkpoint.state
+    offset = int(state.get("offset") or 0)
+    if state.get("path") != path or state.get("size") != total_size or not offset:
+        checkpoint.reset(path=path, size=total_size, offset=0)
+        return 0
+    try:
+        with pool.session(conn) as sftp:
+            if int(sftp.stat(path).st_size) >= offset:
+                return offset
+    except IOError:
+        pass
+    checkpoint.reset(path=path, size=total_size, offset=0)
+    return 0
+
+
+def relay_sftp_to_sftp(src_conn: SFTPConn,
+                       src_path: str,
+                       tgt_conn: SFTPConn,
+                       tgt_path: str,
+                       total_size: int,
+                       io_chunk_bytes: int = CHUNK,
+                       ring_buffers: int = DEFAULT_RING_BUFFERS,
+                       pool: SFTPPool = POOL,
+                       checkpoint: Optional[Checkpoint] = None) -> Dict[str, float]:
+    """
+    Copies src_path to tgt_path with reads and writes overlapped. Memory is
+    capped at roughly 2 * ring_buffers * io_chunk_bytes (the ring plus one
+    readv window in flight).
+
+    The summary reports per-side rates (bytes over time each side spent
+    busy) and average ring occupancy: a ring that stays full means the
+    writer is the bottleneck; one that stays empty means the reader is.
+
+    With a checkpoint the target offset is confirmed every
+    CHECKPOINT_SEGMENT_BYTES and a rerun reads and writes from there;
+    "bytes" then counts this call's writes and "resumed_bytes" the rest.
+    """
+    if checkpoint is not None and checkpoint.done:
+        LOG.info("Relay to %s:%s already complete (checkpoint)", tgt_conn.host, tgt_path)
+        return {"bytes": 0, "seconds": 0.0, "mb_per_s": 0.0, "resumed_bytes": total_size}
+    offset = _relay_resume_offset(pool, tgt_conn, tgt_path, total_size, checkpoint)
+    if offset:
+        LOG.info("Resuming relay at %d/%d bytes", offset, total_size)
+
+    ring: "queue.Queue" = queue.Queue(maxsize=max(1, ring_buffers))
+    stop = threading.Event()
+    stats = _RelayStats(total_size - offset, ring.maxsize)
+
+    reader = threading.Thread(
+        target=_relay_reader,
+        args=(pool, src_conn, src_path, offset, total_size, io_chunk_bytes, ring, stop, stats),
+        name="sftp-relay-reader",
+        daemon=True,
+    )
+    reader.start()
+    try:
+        with pool.session(tgt_conn) as sftp:
+            wf = sftp.open(tgt_path, "r+b" if offset else "wb")
+            try:
+                wf.set_pipelined(True)
+                wf.seek(offset)
+                pos = segment_start = offset
+                last_log = time.time()
+                while True:
+                    stats.sample(ring.qsize())
+                    item = ring.get()
+                    if item is _EOF:
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+                    t0 = time.time()
+                    wf.write(item)
+                    stats.write_busy += time.time() - t0
+                    stats.written_bytes += len(item)
+                    pos += len(item)
+
+                    if checkpoint is not None and pos - segment_start >= CHECKPOINT_SEGMENT_BYTES:
+                        wf.close()
+                        checkpoint.update(offset=pos)
+                        wf = sftp.open(tgt_path, "r+b")
+                        wf.set_pipelined(True)
+                        wf.seek(pos)
+                        segment_start = pos
+
+                    now = time.time()
+                    if now - last_log >= PROGRESS_LOG_SECONDS:
+                        s = stats.summary()
+                        LOG.info(
+                            "Relay progress: %.2f%% (%d/%d)  rate=%.2f MB/s  read=%.2f MB/s  write=%.2f MB/s  ring=%d/%d (avg %.1f)",
+                            100.0 * pos / total_size if total_size else 100.0,
+                            pos, total_size, s["mb_per_s"],
+                            s["read_mb_per_s"], s["write_mb_per_s"],
+                            ring.qsize(), ring.maxsize, s["avg_queue_occupancy"],
+                        )
+                        last_log = now
+            finally:
+                wf.close()
+    finally:
+        stop.set()
+        reader.join(timeout=30)
+    if checkpoint is not None:
+        checkpoint.complete()
+
+    result = stats.summary()
+    result["resumed_bytes"] = offset
+    if result["avg_queue_occupancy"] >= 0.75 * ring.maxsize:
+        bottleneck = "writer (target)"
+    elif result["avg_queue_occupancy"] <= 0.25 * ring.maxsize:
+        bottleneck = "reader (source)"
+    else:
+        bottleneck = "balanced"
+    LOG.info(
+        "Relay complete ✅  bytes=%d  time=%.1fs  avg=%.2f MB/s  read=%.2f MB/s  write=%.2f MB/s  avg_ring=%.1f/%d  bottleneck=%s",
+        result["bytes"], result["seconds"], result["mb_per_s"], result["read_mb_per_s"],
+        result["write_mb_per_s"], result["avg_queue_occupancy"], ring.maxsize, bottleneck,
+    )
+    return result
+
+
+# -----------------------------
+# S3 -> SFTP ranged transfer
+# -----------------------------
+def _s3_get_part(s3, bucket: str, key: str, start: int, end: int, buf: bytearray) -> Tuple[memoryview, float]:
+    """GETs [start, end) into `buf` (a pooled part buffer); returns a view of the part and its latency."""
+    t0 = time.time()
+    resp = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}")
+    view = memoryview(buf)[:end - start]
+    got = readinto_exact(resp["Body"], view)
+    if got != end - start or resp["Body"].read(1):
+        raise AssertionError(f"Short ranged GET at {start}: got {got} expected {end - start}")
+    return view, time.time() - t0
+
+
+def s3_to_sftp_ranged(s3,
+                      bucket: str,
+                      key: str,
+                      conn: SFTPConn,
+                      remote_path: str,
+                      total_size: int,
+                      part_size: int = DEFAULT_S3_PART_SIZE,
+                      concurrency: int = DEFAULT_S3_RANGE_CONCURRENCY,
+                      sequential: bool = False,
+                      part_suffix: Optional[str] = DEFAULT_PART_SUFFIX,
+                      pool: SFTPPool = POOL) -> Dict[str, float]:
+    """
+    Copies s3://bucket/key to the SFTP target using `concurrency` ranged GETs
+    of `part_size` bytes.
+
+    - random writes (default): each worker GETs a part and writes it at its
+      offset on its own pooled channel.
+    - sequential=True: parts are fetched concurrently but written in order
+      through a single pipelined handle.
+
+    Either way parts are read into a pool of `concurrency` + 1 preallocated
+    buffers (at most `concurrency` GETs plus the part being written) that
+    are reused for the whole transfer. Returns aggregate stats plus per-part GET latency
+    percentiles (seconds).
+    """
+    write_path = remote_path + part_suffix if part_suffix else remote_path
+    parts = split_ranges(total_size, -(-total_size // max(1, part_size)), align=max(1, part_size))
+    concurrency = max(1, min(concurrency, len(parts) or 1))
+    get_latencies: List[float] = []
+    write_latencies: List[float] = []
+    progress = _Progress("S3 -> SFTP", total_size)
+    buffers = BufferPool(concurrency + 1, max((e - s for s, e in parts), default=0))
+
+    LOG.info("Ranged S3 -> SFTP: s3://%s/%s -> %s:%s (size=%d parts=%d part_size=%d concurrency=%d mode=%s)",
+             bucket, key, conn.host, remote_path, total_size, len(parts), part_size, concurrency,
+             "sequential" if sequential else "random")
+
+    with pool.session(conn) as sftp:
+        with sftp.open(write_path, "wb"):
+            pass
+
+    if sequential:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="s3-get") as ex, \
+                pool.session(conn) as sftp, sftp.open(write_path, "r+b") as wf:
+            wf.set_pipelined(True)
+            pending: "deque" = deque()
+            todo = iter(parts)
+
+            def get(start: int, end: int) -> Tuple[bytearray, memoryview, float]:
+                buf = buffers.acquire()
+                try:
+                    return (buf,) + _s3_get_part(s3, bucket, key, start, end, buf)
+                except BaseException:
+                    buffers.release(buf)
+                    raise
+
+            def fill() -> None:
+                while len(pending) < concurrency:
+                    part = next(todo, None)
+                    if part is None:
+                        return
+                    pending.append(ex.submit(get, part[0], part[1]))
+
+            fill()
+            while pending:
+                buf, data, latency = pending.popleft().result()
+                get_latencies.append(latency)
+                fill()
+                t0 = time.time()
+                wf.write(data)
+                write_latencies.append(time.time() - t0)
+                progress.add(len(data))
+                data.release()
+                buffers.release(buf)
+    else:
+        def worker(start: int, end: int) -> None:
+            with buffers.buffer() as buf:
+                data, latency = _s3_get_part(s3, bucket, key, start, end, buf)
+                get_latencies.append(latency)
+                t0 = time.time()
+                with pool.session(conn) as sftp:
+                    with sftp.open(write_path, "r+b") as wf:
+                        wf.set_pipelined(True)
+                        wf.seek(start)
+                        wf.write(data)
+                write_latencies.append(time.time() - t0)
+                progress.add(len(data))
+                data.release()
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="s3-sftp") as ex:
+            for f in [ex.submit(worker, s, e) for s, e in parts]:
+                f.result()
+
+    with pool.session(conn) as sftp:
+        size = int(sftp.stat(write_path).st_size)
+        if size != total_size:
+            raise AssertionError(f"Ranged transfer size mismatch: remote={size} expected={total_size}")
+        if write_path != remote_path:
+            sftp.rename(write_path, remote_path)
+
+    result = progress.summary()
+    get_p = percentiles(get_latencies)
+    write_p = percentiles(write_latencies)
+    result.update({f"get_{k}": v for k, v in get_p.items()})
+    result.update({f"write_{k}": v for k, v in write_p.items()})
+    LOG.info(
+        "Ranged transfer complete ✅  bytes=%d  time=%.1fs  avg=%.2f MB/s  "
+        "part GET p50=%.3fs p90=%.3fs p99=%.3fs  part write p50=%.3fs p90=%.3fs p99=%.3fs",
+        result["bytes"], result["seconds"], result["mb_per_s"],
+        get_p["p50"], get_p["p90"], get_p["p99"], write_p["p50"], write_p["p90"], write_p["p99"],
+    )
+    return result
+
+
+# -----------------------------
+# S3 multipart upload / copy
+# -----------------------------
+def _part_entry(part_number: int, result: Dict[str, Any]) -> Dict[str, Any]:
+    """What CompleteMultipartUpload needs for one part (ETag plus any additional checksum)."""
+    entry = {"PartNumber": part_number, "ETag": result["ETag"]}
+    entry.update({k: v for k, v in result.items() if k.startswith("Checksum") and k != "ChecksumType"})
+    return entry
+
+
+def _list_parts(s3, bucket: str, key: str, upload_id: str) -> Dict[int, Dict[str, Any]]:
+    parts: Dict[int, Dict[str, Any]] = {}
+    marker = 0
+    while True:
+        resp = s3.list_parts(Bucket=bucket, Key=key, UploadId=upload_id, PartNumberMarker=marker)
+        for p in resp.get("Parts") or []:
+            parts[p["PartNumber"]] = p
+        if not resp.get("IsTruncated"):
+            return parts
+        marker = resp["NextPartNumberMarker"]
+
+
+def _resume_multipart(s3, bucket: str, key: str, part_sizes: List[int],
+                      checkpoint: Optional[Checkpoint]) -> Tuple[Optional[str], Dict[int, Dict[str, Any]]]:
+    """
+    (UploadId, completed parts) of the checkpointed upload, or (None, {}) to
+    start over. The upload's own part list is authoritative: parts finished
+    after the last checkpoint save are kept, short or missing ones redone.
+    """
+    if checkpoint is None:
+        return None, {}
+    state = checkpoint.state
+    upload_id = state.get("upload_id")
+    if not upload_id or state.get("bucket") != bucket or state.get("key") != key or state.get("part_sizes") != part_sizes:
+        return None, {}
+    try:
+        listed = _list_parts(s3, bucket, key, upload_id)
+    except botocore.exceptions.ClientError as e:
+        LOG.warning("Checkpointed upload %s of s3://%s/%s is gone (%s); starting over",
+                    upload_id, bucket, key, e.response.get("Error", {}).get("Code"))
+        return None, {}
+    return upload_id, {n: _part_entry(n, p) for n, p in listed.items()
+                       if 0 < n <= len(part_sizes) and p.get("Size") == part_sizes[n - 1]}
+
+
+def _s3_multipart(s3, bucket: str, key: str, part_sizes: List[int], create_args: Dict[str, Any],
+                  send_part: Callable[[str, int, int, int], Dict[str, Any]], concurrency: int,
+                  checkpoint: Optional[Checkpoint], kind: str,
+                  initial_concurrency: Optional[int] = None) -> Dict[str, float]:
+    label = f"Multipart {kind}"
+    if checkpoint is not None and checkpoint.done:
+        LOG.info("%s of s3://%s/%s already complete (checkpoint)", label, bucket, key)
+        return {"bytes": 0, "seconds": 0.0, "mb_per_s": 0.0, "resumed_bytes": sum(part_sizes), "parts": 0}
+
+    algorithm = create_args.get("ChecksumAlgorithm")
+    if algorithm:
+        # What expected_s3_checksum assumes for multipart objects; stated
+        # explicitly since some S3 implementations default CRCs to FULL_OBJECT
+        checksum_type = FULL_OBJECT if algorithm in FULL_OBJECT_ONLY else COMPOSITE
+        create_args = {"ChecksumType": checksum_type, **create_args}
+    upload_id, parts = _resume_multipart(s3, bucket, key, part_sizes, checkpoint)
+    if upload_id is None:
+        upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, **create_args)["UploadId"]
+        if checkpoint is not None:
+            checkpoint.reset(bucket=bucket, key=key, upload_id=upload_id, part_sizes=part_sizes, parts={})
+    resumed_bytes = sum(part_sizes[n - 1] for n in parts)
+
+    starts = [0]
+    for size in part_sizes[:-1]:
+        starts.append(starts[-1] + size)
+    todo = deque(n for n in range(1, len(part_sizes) + 1) if n not in parts)
+    total_parts = len(todo)
+    concurrency = max(1, min(concurrency, total_parts or 1))
+    limiter = AdaptiveConcurrency(initial_concurrency or concurrency, concurrency)
+    LOG.info("%s: s3://%s/%s (size=%d parts=%d concurrency=%d..%d%s)", label, bucket, key, sum(part_sizes),
+             len(part_sizes), limiter.current, concurrency,
+             f", resuming with {len(parts)} part(s) done" if parts else "")
+
+    def timed_part(n: int) -> Tuple[Dict[str, Any], float]:
+        start = time.perf_counter()
+        entry = send_part(upload_id, n, starts[n - 1], starts[n - 1] + part_sizes[n - 1])
+        return entry, time.perf_counter() - start
+
+    progress = _Progress(label, sum(part_sizes) - resumed_bytes)
+    try:
+        error: Optional[BaseException] = None
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="s3-part") as ex:
+            running: Dict[Any, int] = {}
+            while todo or running:
+                # Parts go out only while the limiter allows; none after a failure
+                while todo and error is None and len(running) < limiter.current:
+                    n = todo.popleft()
+                    running[ex.submit(timed_part, n)] = n
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                # Parts in flight when one fails still finish; record them for the resume
+                for f in done:
+                    n = running.pop(f)
+                    try:
+                        parts[n], seconds = f.result()
+                    except Exception as e:
+                        limiter.on_failure()
+                        error = error or e
+                        continue
+                    limiter.on_success(part_sizes[n - 1], seconds)
+                    record_part_latency(kind, part_sizes[0], seconds)
+                    if checkpoint is not None:
+                        checkpoint.record("parts", str(n), parts[n])
+                    progress.add(part_sizes[n - 1])
+        if error is not None:
+            raise error
+    except BaseException:
+        if checkpoint is None:
+            # Nothing will resume it; don't leave billed parts behind
+            try:
+                s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            except Exception as e:
+                LOG.warning("Aborting multipart upload %s failed: %s", upload_id, e)
+        raise
+
+    s3.complete_multipart_upload(
+        Bucket=bucket, Key=key, UploadId=upload_id,
+        MultipartUpload={"Parts": [parts[n] for n in sorted(parts)]},
+    )
+    if checkpoint is not None:
+        checkpoint.complete()
+
+    result = progress.summary()
+    result.update({"resumed_bytes": resumed_bytes, "parts": total_parts, "peak_concurrency": limiter.peak})
+    LOG.info("%s complete ✅  bytes=%d  parts=%d  time=%.1fs  avg=%.2f MB/s  concurrency=%d (peak %d)",
+             label, result["bytes"], total_parts, result["seconds"], result["mb_per_s"],
+             limiter.current, limiter.peak)
+    return result
+
+
+def s3_multipart_upload(s3,
+                        bucket: str,
+                        key: str,
+                        seed: bytes,
+                        total_size: int,
+                        part_sizes: List[int],
+                        version: int = DEFAULT_PATTERN_VERSION,
+                        extra_args: Optional[Dict[str, Any]] = None,
+                        concurrency: int = DEFAULT_S3_PART_CONCURRENCY,
+                        checkpoint: Optional[Checkpoint] = None,
+                        initial_concurrency: Optional[int] = None,
+                        generate_processes: int = 0) -> Dict[str, float]:
+    """
+    Uploads the deterministic payload with UploadPart, one part per entry of
+    `part_sizes` (see e2e_checksum.transfer_part_sizes, so expected checksums
+    match). `extra_args` are upload_fileobj-style (Metadata, ChecksumAlgorithm,
+    ...). Each part is generated from the seed, so a resumed upload only
+    generates the parts it still needs. Parts in flight start at
+    `initial_concurrency` and adapt to part latency (e2e_planner), never past
+    `concurrency`: parts are generated into `concurrency` preallocated
+    buffers reused for the whole upload.
+
+    With `generate_processes` > 0, parts (and their checksums) are generated
+    by that many worker processes into shared memory (e2e_partgen) instead
+    of in the upload threads.
+    """
+    extra_args = dict(extra_args or {})
+    algorithm = extra_args.get("ChecksumAlgorithm")
+    generator = shared_part_generator(seed, total_size, part_sizes, concurrency, generate_processes,
+                                      version, algorithm)
+    buffers = BufferPool(concurrency, max(part_sizes)) if generator is None else None
+
+    def send_part(upload_id: str, part_number: int, start: int, end: int) -> Dict[str, Any]:
+        if generator is not None:
+            with generator.part(start, end) as (body, checksum):
+                kwargs = {f"Checksum{algorithm}": checksum} if algorithm else {}
+                resp = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
+                                      Body=body, **kwargs)
+            return _part_entry(part_number, resp)
+        kwargs = {"ChecksumAlgorithm": algorithm} if algorithm else {}
+        with buffers.buffer() as buf, memoryview(buf)[:end - start] as view:
+            expected_into(view, seed, start, total_size, version)
+            body = SharedPartReader(view)
+            try:
+                resp = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
+                                      Body=body, **kwargs)
+            finally:
+                body.release()
+        return _part_entry(part_number, resp)
+
+    try:
+        return _s3_multipart(s3, bucket, key, part_sizes, extra_args, send_part, concurrency, checkpoint,
+                             UPLOAD, initial_concurrency)
+    finally:
+        if generator is not None:
+            generator.close()
+
+
+def s3_multipart_copy(s3,
+                      src_bucket: str,
+                      src_key: str,
+                      bucket: str,
+                      key: str,
+                      part_sizes: List[int],
+                      extra_args: Optional[Dict[str, Any]] = None,
+                      concurrency: int = DEFAULT_S3_PART_CONCURRENCY,
+                      checkpoint: Optional[Checkpoint] = None,
+                      initial_concurrency: Optional[int] = None) -> Dict[str, float]:
+    """
+    Server-side copy with UploadPartCopy, one part per entry of `part_sizes`
+    (concurrency as for s3_multipart_upload).
+    MetadataDirective=COPY (the default) carries the source's metadata and
+    content type over, as TransferManager's copy does.
+    """
+    extra_args = dict(extra_args or {})
+    if extra_args.pop("MetadataDirective", "COPY") == "COPY":
+        head = s3.head_object(Bucket=src_bucket, Key=src_key)
+        extra_args.setdefault("Metadata", head.get("Metadata") or {})
+        if head.get("ContentType"):
+            extra_args.setdefault("ContentType", head["ContentType"])
+    copy_source = {"Bucket": src_bucket, "Key": src_key}
+
+    def send_part(upload_id: str, part_number: int, start: int, end: int) -> Dict[str, Any]:
+        resp = s3.upload_part_copy(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
+                                   CopySource=copy_source, CopySourceRange=f"bytes={start}-{end - 1}")
+        return _part_entry(part_number, resp["CopyPartResult"])
+
+    return _s3_multipart(s3, bucket, key, part_sizes, extra_args, send_part, concurrency, checkpoint,
+                         COPY, initial_concurrency)
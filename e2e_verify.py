@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Integrity verifiers shared by the E2E scripts.
+
+Spot checks used to run one round trip at a time (one ranged GET, or one
+seek + read, per offset), so wall time grew linearly with SPOT_CHECKS.
+These verifiers issue all ranges at once: a thread pool of ranged GETs for
+S3, a single pipelined readv for SFTP. Expected bytes are generated
+alongside, so wall time stays roughly flat up to the concurrency limit.
+
+Full verification (VERIFY_MODE=full) streams the whole object instead and
+compares a hash tree: one SHA-256 digest per part plus a root over the
+part digests, against the tree computed from the deterministic seed.
+Nothing is written to disk and at most one part buffer per worker is held.
+hashlib releases the GIL on large updates, so parts hash on several cores.
+
+Checksum verification (VERIFY_MODE=checksum, S3 targets only) reads no
+object bytes: one HeadObject returns the additional checksum S3 stored at
+upload time, compared against the one precomputed from the seed.
+"""
+
+import os
+import time
+import bisect
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+from e2e_buffers import readinto_exact, scratch
+from e2e_checksum import (
+    CHECKSUM_ALGORITHMS,
+    FULL_OBJECT,
+    ExpectedChecksum,
+    checksum_supported,
+    expected_s3_checksum,
+    s3_object_checksum,
+    s3_object_parts,
+)
+from e2e_fixture import cached_range_digest
+from e2e_payload import CHUNK, DEFAULT_PATTERN_VERSION, expected_into
+
+LOG = logging.getLogger("e2e-verify")
+
+DEFAULT_SPOT_CHECK_CONCURRENCY = 16
+DEFAULT_TREE_PART_SIZE = 16 * 1024 * 1024
+DEFAULT_FULL_VERIFY_CONCURRENCY = max(4, os.cpu_count() or 1)
+
+VERIFY_MODES = ("spot", "full", "checksum")
+SFTP_VERIFY_MODES = ("spot", "full")
+
+
+def parse_verify_mode(v: str, modes: Sequence[str] = VERIFY_MODES) -> str:
+    mode = str(v).strip().lower()
+    if mode not in modes:
+        raise ValueError(f"VERIFY_MODE must be one of {tuple(modes)}, got: {v}")
+    return mode
+
+
+def _merge_spans(offsets: Sequence[int], length: int) -> List[Tuple[int, int]]:
+    """Sorted, non-overlapping (start, end) spans covering every check."""
+    spans: List[Tuple[int, int]] = []
+    for off in sorted(offsets):
+        end = off + length
+        if spans and off <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], end))
+        else:
+            spans.append((off, end))
+    return spans
+
+
+def _fail(label: str, bad: List[int], offsets: Sequence[int]) -> None:
+    ordered = sorted(offsets)
+    first = min(bad)
+    raise AssertionError(
+        f"{label}: {len(bad)}/{len(ordered)} spot-check(s) failed; "
+        f"first at offset={first} (check {ordered.index(first) + 1}/{len(ordered)})"
+    )
+
+
+def s3_spot_check(s3,
+                  objects: Sequence[Tuple[str, str]],
+                  seed: bytes,
+                  offsets: Sequence[int],
+                  length: int,
+                  total_size: int,
+                  version: int = DEFAULT_PATTERN_VERSION,
+                  concurrency: int = DEFAULT_SPOT_CHECK_CONCURRENCY) -> Dict[str, float]:
+    """
+    Compares `length` bytes at each offset of every (bucket, key) in
+    `objects` against the deterministic pattern. All GETs run concurrently.
+    """
+    def check(bucket: str, key: str, off: int) -> bool:
+        resp = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={off}-{off + length - 1}")
+        body = resp["Body"]
+        actual = scratch(length, "actual")
+        got = readinto_exact(body, actual)
+        # A server that ignores Range answers with the whole object
+        if resp.get("ContentLength", got) != length or got != length or body.read(1):
+            LOG.error("Spot-check s3://%s/%s offset=%d: ranged GET returned %s bytes (Content-Range %s), expected %d",
+                      bucket, key, off, resp.get("ContentLength", got), resp.get("ContentRange"), length)
+            body.close()
+            return False
+        expected = scratch(length, "expected")
+        expected_into(expected, seed, off, total_size, version)
+        ok = actual == expected
+        LOG.debug("Spot-check s3://%s/%s offset=%d %s", bucket, key, off, "✅" if ok else "❌")
+        return ok
+
+    start = time.time()
+    jobs = [(b, k, off) for b, k in objects for off in offsets]
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(jobs))), thread_name_prefix="spot-s3") as ex:
+        results = list(ex.map(lambda j: check(*j), jobs))
+
+    for bucket, key in objects:
+        bad = [off for (b, k, off), ok in zip(jobs, results) if (b, k) == (bucket, key) and not ok]
+        if bad:
+            _fail(f"s3://{bucket}/{key}", bad, offsets)
+
+    elapsed = time.time() - start
+    LOG.info("Spot-checks ✅  %d range(s) x %d object(s), %d bytes each, in %.2fs",
+             len(offsets), len(objects), length, elapsed)
+    return {"checks": len(jobs), "seconds": elapsed}
+
+
+def sftp_spot_check(sftp,
+                    path: str,
+                    seed: bytes,
+                    offsets: Sequence[int],
+                    length: int,
+                    total_size: int,
+                    version: int = DEFAULT_PATTERN_VERSION) -> Dict[str, float]:
+    """
+    Compares `length` bytes at each offset of `path` against the pattern.
+    Overlapping checks are merged and fetched with one pipelined readv.
+    """
+    start = time.time()
+    spans = _merge_spans(offsets, length)
+    with sftp.open(path, "rb") as f:
+        data = dict(zip((s for s, _ in spans), f.readv([(s, e - s) for s, e in spans])))
+
+    starts = [s for s, _ in spans]
+    bad = []
+    expected = scratch(length, "expected")
+    for off in offsets:
+        span_start = starts[bisect.bisect_right(starts, off) - 1]
+        rel = off - span_start
+        expected_into(expected, seed, off, total_size, version)
+        with memoryview(data[span_start]) as span:
+            ok = expected == span[rel:rel + length]
+        LOG.debug("Spot-check %s offset=%d %s", path, off, "✅" if ok else "❌")
+        if not ok:
+            bad.append(off)
+    if bad:
+        _fail(path, bad, offsets)
+
+    elapsed = time.time() - start
+    LOG.info("Spot-checks ✅  %d range(s), %d bytes each, in %.2fs", len(offsets), length, elapsed)
+    return {"checks": len(offsets), "seconds": elapsed}
+
+
+# -----------------------------
+# Full-object hash tree
+# -----------------------------
+@dataclass
+class HashTree:
+    total_size: int
+    part_size: int
+    parts: List[bytes]
+
+    @property
+    def root(self) -> bytes:
+        h = hashlib.sha256()
+        h.update(self.total_size.to_bytes(8, "big"))
+        h.update(self.part_size.to_bytes(8, "big"))
+        for d in self.parts:
+            h.update(d)
+        return h.digest()
+
+
+def _part_ranges(total_size: int, part_size: int) -> List[Tuple[int, int]]:
+    return [(s, min(s + part_size, total_size)) for s in range(0, total_size, part_size)]
+
+
+def _build_tree(total_size: int, part_size: int, concurrency: int, part_digest) -> HashTree:
+    ranges = _part_ranges(total_size, part_size)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(ranges) or 1)), thread_name_prefix="tree") as ex:
+        parts = list(ex.map(lambda r: part_digest(*r), ranges))
+    return HashTree(total_size, part_size, parts)
+
+
+def expected_hash_tree(seed: bytes,
+                       total_size: int,
+                       version: int = DEFAULT_PATTERN_VERSION,
+                       part_size: int = DEFAULT_TREE_PART_SIZE,
+                       concurrency: int = DEFAULT_FULL_VERIFY_CONCURRENCY) -> HashTree:
+    """Hash tree of the deterministic payload, generated part by part."""
+    def digest(start: int, end: int) -> bytes:
+        def compute() -> bytes:
+            buf = memoryview(scratch(CHUNK, "tree"))
+            h = hashlib.sha256()
+            for pos in range(start, end, CHUNK):
+                n = expected_into(buf[:min(CHUNK, end - pos)], seed, pos, total_size, version)
+                h.update(buf[:n])
+            return h.digest()
+
+        # Parts past the salt of a v3 payload are the same every run (e2e_fixture)
+        return cached_range_digest(version, "SHA256", start, end, compute)
+
+    return _build_tree(total_size, part_size, concurrency, digest)
+
+
+def s3_hash_tree(s3, bucket: str, key: str, total_size: int,
+                 part_size: int = DEFAULT_TREE_PART_SIZE,
+                 concurrency: int = DEFAULT_FULL_VERIFY_CONCURRENCY) -> HashTree:
+    """Hash tree of an S3 object via parallel ranged GETs streamed into hashers."""
+    def digest(start: int, end: int) -> bytes:
+        resp = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}")
+        buf = memoryview(scratch(CHUNK, "tree"))
+        h = hashlib.sha256()
+        got = 0
+        while True:
+            n = readinto_exact(resp["Body"], buf)
+            if not n:
+                break
+            h.update(buf[:n])
+            got += n
+        if got != end - start:
+            raise AssertionError(f"Short ranged GET at {start}: got {got} expected {end - start}")
+        return h.digest()
+
+    return _build_tree(total_size, part_size, concurrency, digest)
+
+
+def sftp_hash_tree(conn, path: str, total_size: int,
+                   part_size: int = DEFAULT_TREE_PART_SIZE,
+                   concurrency: int = DEFAULT_FULL_VERIFY_CONCURRENCY,
+                   pool=None) -> HashTree:
+    """
+    Hash tree of an SFTP file. Each worker reads its part on its own pooled
+    channel with windowed readv (pipelined, bounded memory).
+    """
+    if pool is None:
+        # Imported lazily so the S3-only scripts do not need paramiko.
+        from e2e_sftp import POOL as pool
+    window = 8 * CHUNK
+
+    def digest(start: int, end: int) -> bytes:
+        h = hashlib.sha256()
+        with pool.session(conn) as sftp:
+            with sftp.open(path, "rb") as f:
+                for win_start in range(start, end, window):
+                    win_end = min(win_start + window, end)
+                    chunks = [(off, min(CHUNK, win_end - off)) for off in range(win_start, win_end, CHUNK)]
+                    for data in f.readv(chunks):
+                        h.update(data)
+        return h.digest()
+
+    return _build_tree(total_size, part_size, concurrency, digest)
+
+
+def compare_trees(label: str, expected: HashTree, actual: HashTree) -> None:
+    if expected.root == actual.root:
+        return
+    bad = [i for i, (e, a) in enumerate(zip(expected.parts, actual.parts)) if e != a]
+    if not bad:
+        raise AssertionError(f"{label}: hash tree shape mismatch "
+                             f"(parts {len(actual.parts)} vs expected {len(expected.parts)})")
+    first = bad[0] * expected.part_size
+    raise AssertionError(
+        f"{label}: {len(bad)}/{len(expected.parts)} part(s) differ; "
+        f"first at bytes {first}-{min(first + expected.part_size, expected.total_size) - 1}"
+    )
+
+
+def _verify_full(label: str, seed: bytes, total_size: int, version: int, part_size: int,
+                 concurrency: int, actual_tree) -> Dict[str, float]:
+    start = time.time()
+    # Expected and actual trees are built concurrently; the actual side is I/O bound.
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="tree-expected") as ex:
+        expected_future = ex.submit(expected_hash_tree, seed, total_size, version, part_size, concurrency)
+        actual = actual_tree()
+        expected = expected_future.result()
+    compare_trees(label, expected, actual)
+
+    elapsed = time.time() - start
+    LOG.info("Full verification ✅  %s  parts=%d  root=%s  %.2f MB/s",
+             label, len(actual.parts), actual.root.hex()[:16],
+             (total_size / max(1e-9, elapsed)) / (1024 * 1024))
+    return {"bytes": total_size, "seconds": elapsed, "parts": len(actual.parts)}
+
+
+def s3_verify_full(s3, bucket: str, key: str, seed: bytes, total_size: int,
+                   version: int = DEFAULT_PATTERN_VERSION,
+                   part_size: int = DEFAULT_TREE_PART_SIZE,
+                   concurrency: int = DEFAULT_FULL_VERIFY_CONCURRENCY) -> Dict[str, float]:
+    return _verify_full(
+        f"s3://{bucket}/{key}", seed, total_size, version, part_size, concurrency,
+        lambda: s3_hash_tree(s3, bucket, key, total_size, part_size, concurrency),
+    )
+
+
+def sftp_verify_full(conn, path: str, seed: bytes, total_size: int,
+                     version: int = DEFAULT_PATTERN_VERSION,
+                     part_size: int = DEFAULT_TREE_PART_SIZE,
+                     concurrency: int = DEFAULT_FULL_VERIFY_CONCURRENCY,
+                     pool=None) -> Dict[str, float]:
+    return _verify_full(
+        f"{conn.host}:{path}", seed, total_size, version, part_size, concurrency,
+        lambda: sftp_hash_tree(conn, path, total_size, part_size, concurrency, pool),
+    )
+
+
+# -----------------------------
+# S3 additional checksums
+# -----------------------------
+def s3_verify_checksum(s3, bucket: str, key: str, expected: ExpectedChecksum) -> Dict[str, float]:
+    """
+    Compares the checksum S3 stored for the object with `expected`. Costs one
+    HeadObject; on a composite mismatch the per-part checksums are fetched
+    to report which parts differ.
+    """
+    label = f"s3://{bucket}/{key}"
+    start = time.time()
+    stored = s3_object_checksum(s3, bucket, key)
+    if stored is None:
+        raise AssertionError(f"{label}: no additional checksum stored (uploaded without ChecksumAlgorithm?)")
+    algorithm, value, checksum_type = stored
+    if algorithm != expected.algorithm or checksum_type != expected.checksum_type:
+        raise AssertionError(
+            f"{label}: stored {algorithm}/{checksum_type} checksum, "
+            f"expected {expected.algorithm}/{expected.checksum_type}"
+        )
+
+    # Full-object values never carry a suffix; composite ones may or may not
+    # depending on the API, so compare the digest and the part count separately.
+    digest, _, count = value.partition("-")
+    if count and int(count) != expected.part_count:
+        raise AssertionError(f"{label}: {count} part(s) stored, expected {expected.part_count}")
+    if digest != expected.value:
+        detail = ""
+        if expected.part_count:
+            try:
+                member = f"Checksum{algorithm}"
+                actual_parts = [p.get(member) for p in s3_object_parts(s3, bucket, key)]
+                bad = [i + 1 for i, (e, a) in enumerate(zip(expected.part_checksums, actual_parts)) if e != a]
+                detail = f"; differing part number(s): {bad[:10]}{' ...' if len(bad) > 10 else ''}"
+            except Exception as e:
+                LOG.debug("Could not fetch per-part checksums for %s: %s", label, e)
+        raise AssertionError(
+            f"{label}: {algorithm} checksum mismatch: stored={value} expected={expected.header_value}{detail}"
+        )
+
+    elapsed = time.time() - start
+    LOG.info("Checksum ✅  %s  %s %s=%s", label, checksum_type, algorithm, value)
+    return {"seconds": elapsed, "parts": expected.part_count}
+
+
+def s3_verify_stored_checksum(s3, bucket: str, key: str, seed: bytes, total_size: int,
+                              version: int = DEFAULT_PATTERN_VERSION,
+                              part_size: int = DEFAULT_TREE_PART_SIZE,
+                              concurrency: int = DEFAULT_FULL_VERIFY_CONCURRENCY) -> Dict[str, float]:
+    """
+    For objects written by someone else (e.g. the SFTP -> S3 pipeline): uses
+    whatever algorithm and part layout S3 reports, and checks the stored
+    checksum against one computed from the seed for that layout. Algorithms
+    that cannot be computed here fall back to s3_verify_full.
+    """
+    label = f"s3://{bucket}/{key}"
+    stored = s3_object_checksum(s3, bucket, key)
+    if stored is None:
+        raise AssertionError(f"{label}: no additional checksum stored; use VERIFY_MODE=spot or full")
+    algorithm, value, checksum_type = stored
+    if not checksum_supported(algorithm):
+        LOG.warning("Stored checksum on %s is %s %s, which is unsupported here (known: %s, CRC32C/CRC64NVME "
+                    "need awscrt); falling back to full verification", label, checksum_type, algorithm,
+                    ", ".join(CHECKSUM_ALGORITHMS))
+        return s3_verify_full(s3, bucket, key, seed, total_size, version, part_size, concurrency)
+
+    # Full-object checksums do not depend on the part layout; composite ones
+    # are recomputed over the part sizes S3 reports.
+    part_sizes: List[int] = []
+    if checksum_type != FULL_OBJECT:
+        part_sizes = [int(p["Size"]) for p in s3_object_parts(s3, bucket, key)]
+    LOG.info("Stored checksum on %s: %s %s (%d part(s))", label, checksum_type, algorithm, len(part_sizes) or 1)
+
+    expected = expected_s3_checksum(seed, total_size, algorithm, part_sizes, version, checksum_type)
+    return s3_verify_checksum(s3, bucket, key, expected)
@@ -4,32 +4,70 @@ Production-ready S3 -> S3 E2E test (1MB..20GB) for EC2.
 
 What it does:
 1) Creates a deterministic source object in S3 (stream upload; no local disk).
-2) Copies it to target bucket/prefix using boto3 TransferManager (multipart copy for large).
+2) Copies it to target bucket/prefix server-side (UploadPartCopy for large objects; part
+   size and concurrency planned by e2e_planner).
 3) Validates:
    - target exists
    - ContentLength matches
    - ETag equality for single-part objects (optional, best-effort)
-   - byte-range spot checks (compare source vs target ranges)
+   - with S3_CHECKSUM_ALGORITHM + VERIFY_MODE=checksum: the S3-stored additional
+     checksums of source and target against ones precomputed from the seed
+   - byte-range spot checks (compare source vs target ranges), or with
+     VERIFY_MODE=full a streamed hash tree of the whole target
 4) Optional cleanup.
 
 Notes:
 - Spot checks are the integrity backbone because multipart uploads/copies produce ETags
   that don't match simple MD5 of the full object.
-- This script is safe for huge sizes because it never downloads the whole object.
+- This script is safe for huge sizes: spot checks only fetch ranges, and full
+  verification hashes the object as it streams (nothing is written to disk).
 """
 
 import os
 import sys
 import time
-import uuid
+import asyncio
 import logging
 import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, List, Tuple
+from typing import Dict, Optional
 
-import boto3
 import botocore
 
+from e2e_checksum import CHECKSUM_ALGORITHMS, expected_s3_checksum, parse_checksum_algorithm
+from e2e_fixture import DEFAULT_FIXTURE_QUOTA, parse_fixture_dir, use_fixture
+from e2e_limits import endpoint_io, s3_endpoint
+from e2e_metrics import METRICS, RunRecord
+from e2e_payload import (
+    DEFAULT_PATTERN_VERSION,
+    DeterministicStream,
+    choose_offsets,
+    parse_pattern_version,
+)
+from e2e_resume import (
+    DEFAULT_CHECKPOINT_FILE,
+    DEFAULT_CHECKPOINT_MIN_SIZE,
+    RunCheckpoints,
+    checkpointed_run,
+    parse_checkpoint_file,
+)
+from e2e_s3 import DEFAULT_MAX_POOL_CONNECTIONS, client_config, connection_stats, get_s3_client
+from e2e_s3_calls import S3_CALLS, log_summary
+from e2e_partgen import parse_generate_processes
+from e2e_planner import COPY, DEFAULT_MEMORY_BUDGET, UPLOAD, log_plan, parse_auto, plan_multipart
+from e2e_transfer import s3_multipart_copy, s3_multipart_upload
+from e2e_verify import (
+    DEFAULT_FULL_VERIFY_CONCURRENCY,
+    DEFAULT_SPOT_CHECK_CONCURRENCY,
+    DEFAULT_TREE_PART_SIZE,
+    parse_verify_mode,
+    s3_spot_check,
+    s3_verify_checksum,
+    s3_verify_full,
+)
+
 try:
     from dotenv import load_dotenv
 except Exception:
@@ -89,25 +127,43 @@ def parse_size(size_str: str) -> int:
 @dataclass
 class Config:
     aws_region: str
+    s3_endpoint_url: Optional[str]
+    aws_profile: Optional[str]
+    s3_max_pool_connections: int
     src_bucket: str
     src_prefix: str
     tgt_bucket: str
     tgt_prefix: str
 
     size_bytes: int
+    pattern_version: int
 
     wait_timeout_seconds: int
     poll_interval_seconds: int
 
+    verify_mode: str
     spot_checks: int
     spot_check_bytes: int
+    spot_check_concurrency: int
+    verify_part_size: int
+    verify_concurrency: int
 
     multipart_threshold: int
-    multipart_chunk_size: int
+    multipart_chunk_size: Optional[int]
+    multipart_concurrency: Optional[int]
+    s3_memory_budget: int
+    generate_processes: int
+    s3_checksum_algorithm: Optional[str]
 
     cleanup_src: bool
     cleanup_tgt: bool
 
+    checkpoint_file: Optional[str]
+    checkpoint_min_size: int
+
+    fixture_cache_dir: Optional[str]
+    fixture_cache_quota: int
+
     log_level: str
 
 
@@ -116,6 +172,9 @@ def load_config(env_file: Optional[str]) -> Config:
         load_dotenv(env_file)
 
     aws_region = os.getenv("AWS_REGION", "us-west-2")
+    s3_endpoint_url = os.getenv("S3_ENDPOINT_URL") or None
+    aws_profile = os.getenv("AWS_PROFILE") or None
+    s3_max_pool_connections = int(os.getenv("S3_MAX_POOL_CONNECTIONS", str(DEFAULT_MAX_POOL_CONNECTIONS)))
 
     src_bucket = os.environ["SRC_BUCKET"]
     tgt_bucket = os.environ["TGT_BUCKET"]
@@ -129,165 +188,106 @@ def load_config(env_file: Optional[str]) -> Config:
         tgt_prefix += "/"
 
     size_bytes = parse_size(os.getenv("TEST_SIZE", "1MB"))
+    pattern_version = parse_pattern_version(os.getenv("PATTERN_VERSION", str(DEFAULT_PATTERN_VERSION)))
 
     wait_timeout_seconds = int(os.getenv("WAIT_TIMEOUT_SECONDS", "3600"))
     poll_interval_seconds = int(os.getenv("POLL_INTERVAL_SECONDS", "5"))
 
+    verify_mode = parse_verify_mode(os.getenv("VERIFY_MODE", "spot"))
     spot_checks = int(os.getenv("SPOT_CHECKS", "8"))
     spot_check_bytes = int(os.getenv("SPOT_CHECK_BYTES", str(256 * 1024)))
+    spot_check_concurrency = int(os.getenv("SPOT_CHECK_CONCURRENCY", str(DEFAULT_SPOT_CHECK_CONCURRENCY)))
+    verify_part_size = parse_size(os.getenv("VERIFY_PART_SIZE", str(DEFAULT_TREE_PART_SIZE)))
+    verify_concurrency = int(os.getenv("VERIFY_CONCURRENCY", str(DEFAULT_FULL_VERIFY_CONCURRENCY)))
 
     multipart_threshold = int(os.getenv("MULTIPART_THRESHOLD", str(100 * 1024 * 1024)))
-    multipart_chunk_size = int(os.getenv("MULTIPART_CHUNK_SIZE", str(256 * 1024 * 1024)))
+    multipart_chunk_size = parse_auto(os.getenv("MULTIPART_CHUNK_SIZE"), parse_size)
+    multipart_concurrency = parse_auto(os.getenv("S3_MULTIPART_CONCURRENCY"))
+    s3_memory_budget = parse_size(os.getenv("S3_MEMORY_BUDGET", str(DEFAULT_MEMORY_BUDGET)))
+    generate_processes = parse_generate_processes(os.getenv("SOURCE_GENERATE_PROCESSES"))
+    s3_checksum_algorithm = parse_checksum_algorithm(os.getenv("S3_CHECKSUM_ALGORITHM"))
+    if verify_mode == "checksum" and not s3_checksum_algorithm:
+        raise ValueError("VERIFY_MODE=checksum requires S3_CHECKSUM_ALGORITHM "
+                         f"({', '.join(CHECKSUM_ALGORITHMS)})")
 
     cleanup_src = env_bool("CLEANUP_SRC", False)
     cleanup_tgt = env_bool("CLEANUP_TGT", False)
 
+    checkpoint_file = parse_checkpoint_file(os.getenv("CHECKPOINT_FILE", DEFAULT_CHECKPOINT_FILE))
+    checkpoint_min_size = parse_size(os.getenv("CHECKPOINT_MIN_SIZE", str(DEFAULT_CHECKPOINT_MIN_SIZE)))
+    fixture_cache_dir = parse_fixture_dir(os.getenv("FIXTURE_CACHE_DIR"))
+    fixture_cache_quota = parse_size(os.getenv("FIXTURE_CACHE_QUOTA", str(DEFAULT_FIXTURE_QUOTA)))
+
     log_level = os.getenv("LOG_LEVEL", "INFO")
 
     return Config(
         aws_region=aws_region,
+        s3_endpoint_url=s3_endpoint_url,
+        aws_profile=aws_profile,
+        s3_max_pool_connections=s3_max_pool_connections,
         src_bucket=src_bucket,
         src_prefix=src_prefix,
         tgt_bucket=tgt_bucket,
         tgt_prefix=tgt_prefix,
         size_bytes=size_bytes,
+        pattern_version=pattern_version,
         wait_timeout_seconds=wait_timeout_seconds,
         poll_interval_seconds=poll_interval_seconds,
+        verify_mode=verify_mode,
         spot_checks=spot_checks,
         spot_check_bytes=spot_check_bytes,
+        spot_check_concurrency=spot_check_concurrency,
+        verify_part_size=verify_part_size,
+        verify_concurrency=verify_concurrency,
         multipart_threshold=multipart_threshold,
         multipart_chunk_size=multipart_chunk_size,
+        multipart_concurrency=multipart_concurrency,
+        s3_memory_budget=s3_memory_budget,
+        generate_processes=generate_processes,
+        s3_checksum_algorithm=s3_checksum_algorithm,
         cleanup_src=cleanup_src,
         cleanup_tgt=cleanup_tgt,
+        checkpoint_file=checkpoint_file,
+        checkpoint_min_size=checkpoint_min_size,
+        fixture_cache_dir=fixture_cache_dir,
+        fixture_cache_quota=fixture_cache_quota,
         log_level=log_level,
     )
 
 
-# -----------------------------
-# Deterministic stream for source object creation
-# -----------------------------
-CHUNK = 1024 * 1024  # 1 MiB
-
-def _chunk_bytes(seed: bytes, chunk_index: int, chunk_len: int) -> bytes:
-    out = bytearray()
-    ctr = 0
-    while len(out) < chunk_len:
-        h = hashlib.blake2b(digest_size=64)
-        h.update(seed)
-        h.update(chunk_index.to_bytes(8, "big"))
-        h.update(ctr.to_bytes(8, "big"))
-        out.extend(h.digest())
-        ctr += 1
-    return bytes(out[:chunk_len])
-
-
-def expected_bytes(seed: bytes, offset: int, length: int, total_size: int) -> bytes:
-    if offset < 0 or length < 0 or offset + length > total_size:
-        raise ValueError("Range out of bounds")
-
-    start_chunk = offset // CHUNK
-    end_offset = offset + length
-    end_chunk = (end_offset - 1) // CHUNK
-
-    remaining = length
-    pos = offset
-    parts = []
-
-    for ci in range(start_chunk, end_chunk + 1):
-        chunk_start = ci * CHUNK
-        chunk_end = min(chunk_start + CHUNK, total_size)
-        this_len = chunk_end - chunk_start
-
-        data = _chunk_bytes(seed, ci, this_len)
-        s = max(0, pos - chunk_start)
-        e = min(this_len, s + remaining)
-        parts.append(data[s:e])
-
-        took = e - s
-        remaining -= took
-        pos += took
-
-    return b"".join(parts)
-
-
-class DeterministicStream:
-    """
-    File-like stream used for upload_fileobj.
-    Generates deterministic bytes sequentially with constant memory usage.
-    """
-    def __init__(self, seed: bytes, total_size: int):
-        self.seed = seed
-        self.total_size = total_size
-        self.pos = 0
-
-    def read(self, n: int = -1) -> bytes:
-        if self.pos >= self.total_size:
-            return b""
-        if n is None or n < 0:
-            n = self.total_size - self.pos
-        n = min(n, self.total_size - self.pos)
-        data = expected_bytes(self.seed, self.pos, n, self.total_size)
-        self.pos += n
-        return data
-
-
-def choose_offsets(total_size: int, checks: int, bytes_per_check: int, seed: bytes) -> List[int]:
-    if total_size <= bytes_per_check:
-        return [0]
-    offsets = {0, max(0, total_size - bytes_per_check)}
-    i = 0
-    while len(offsets) < max(2, checks):
-        h = hashlib.blake2b(digest_size=8)
-        h.update(seed)
-        h.update(i.to_bytes(8, "big"))
-        off = int.from_bytes(h.digest(), "big") % (total_size - bytes_per_check + 1)
-        offsets.add(off)
-        i += 1
-    return sorted(list(offsets))[:checks]
-
-
 # -----------------------------
 # S3 helpers
 # -----------------------------
 def s3_client(cfg: Config):
-    return boto3.client("s3", region_name=cfg.aws_region)
-
-
-def s3_resource(cfg: Config):
-    return boto3.resource("s3", region_name=cfg.aws_region)
+    return get_s3_client(
+        cfg.aws_region,
+        endpoint_url=cfg.s3_endpoint_url,
+        profile=cfg.aws_profile,
+        config=client_config(cfg.s3_max_pool_connections),
+    )
 
 
 def head_object(cfg: Config, bucket: str, key: str) -> dict:
     return s3_client(cfg).head_object(Bucket=bucket, Key=key)
 
 
-def wait_for_object(cfg: Config, bucket: str, key: str) -> dict:
+async def wait_for_object(cfg: Config, bucket: str, key: str) -> dict:
     deadline = time.time() + cfg.wait_timeout_seconds
     last_err = None
     while time.time() < deadline:
         try:
-            return head_object(cfg, bucket, key)
+            return await endpoint_io(s3_endpoint(bucket), head_object, cfg, bucket, key, slot=False)
         except botocore.exceptions.ClientError as e:
             code = e.response.get("Error", {}).get("Code")
             if code in ("404", "NoSuchKey", "NotFound"):
                 last_err = e
                 LOG.info("Waiting for s3://%s/%s ... (%ss)", bucket, key, cfg.poll_interval_seconds)
-                time.sleep(cfg.poll_interval_seconds)
+                await asyncio.sleep(cfg.poll_interval_seconds)
                 continue
             raise
     raise TimeoutError(f"Timed out waiting for s3://{bucket}/{key}. Last error: {last_err}")
 
 
-def get_range(cfg: Config, bucket: str, key: str, start: int, length: int) -> bytes:
-    end = start + length - 1
-    resp = s3_client(cfg).get_object(
-        Bucket=bucket,
-        Key=key,
-        Range=f"bytes={start}-{end}",
-    )
-    return resp["Body"].read()
-
-
 def delete_object(cfg: Config, bucket: str, key: str) -> None:
     LOG.info("Deleting s3://%s/%s", bucket, key)
     s3_client(cfg).delete_object(Bucket=bucket, Key=key)
@@ -296,17 +296,43 @@ def delete_object(cfg: Config, bucket: str, key: str) -> None:
 # -----------------------------
 # Main
 # -----------------------------
-def main() -> int:
-    import argparse
+def build_parser() -> argparse.ArgumentParser:
     ap = argparse.ArgumentParser(description="S3 -> S3 E2E test (1MB..20GB)")
     ap.add_argument("--env-file", default=os.getenv("ENV_FILE", ".env"))
-    args = ap.parse_args()
+    return ap
 
-    cfg = load_config(args.env_file)
-    setup_logging(cfg.log_level)
 
-    # Unique test IDs
-    test_id = uuid.uuid4().hex
+def run_test(cfg: Config) -> Dict[str, object]:
+    """
+    One S3 -> S3 probe. Raises on failure; cleans up its own objects. Shared
+    clients are left open so that many probes can run in one process.
+    With CHECKPOINT_FILE set, large runs are checkpointed; a rerun after a failed
+    transfer resumes it.
+    """
+    return asyncio.run(run_test_async(cfg))
+
+
+async def run_test_async(cfg: Config) -> Dict[str, object]:
+    """run_test as a coroutine, for runners that drive many probes on one event loop."""
+    await asyncio.to_thread(use_fixture, cfg.fixture_cache_dir, cfg.fixture_cache_quota,
+                            cfg.pattern_version, cfg.size_bytes)
+    calls_before = S3_CALLS.snapshot()
+    fingerprint = {
+        "pattern_version": cfg.pattern_version,
+        "src": f"s3://{cfg.src_bucket}/{cfg.src_prefix}",
+        "tgt": f"s3://{cfg.tgt_bucket}/{cfg.tgt_prefix}",
+    }
+    try:
+        with checkpointed_run(cfg.checkpoint_file, cfg.checkpoint_min_size, "s3-s3", cfg.size_bytes,
+                              fingerprint) as checkpoints, \
+                METRICS.run("s3-s3", checkpoints.test_id, cfg.size_bytes) as run:
+            return await _run_test(cfg, run, checkpoints)
+    finally:
+        log_summary(LOG, S3_CALLS.since(calls_before), "S3 calls this run")
+
+
+async def _run_test(cfg: Config, run: RunRecord, checkpoints: RunCheckpoints) -> Dict[str, object]:
+    test_id = run.test_id
     filename = f"s3-s3-test-{test_id}.bin"
 
     src_key = f"{cfg.src_prefix}{filename}" if cfg.src_prefix else filename
@@ -316,58 +342,115 @@ def main() -> int:
 
     LOG.info("=== S3 -> S3 E2E TEST START ===")
     LOG.info("Size bytes: %d", cfg.size_bytes)
+    LOG.info("Payload pattern: v%d", cfg.pattern_version)
     LOG.info("SOURCE: s3://%s/%s", cfg.src_bucket, src_key)
     LOG.info("TARGET: s3://%s/%s", cfg.tgt_bucket, tgt_key)
 
     created = False
     copied = False
+    src_ep = s3_endpoint(cfg.src_bucket)
+    tgt_ep = s3_endpoint(cfg.tgt_bucket)
+    start = time.time()
+
+    # Part size and concurrency are planned per transfer (e2e_planner); the
+    # copy keeps MULTIPART_THRESHOLD, MULTIPART_CHUNK_SIZE overrides its parts.
+    upload_plan = plan_multipart(UPLOAD, cfg.size_bytes, memory_budget=cfg.s3_memory_budget,
+                                 max_pool_connections=cfg.s3_max_pool_connections,
+                                 concurrency=cfg.multipart_concurrency)
+    copy_plan = plan_multipart(COPY, cfg.size_bytes, threshold=cfg.multipart_threshold,
+                               max_pool_connections=cfg.s3_max_pool_connections,
+                               part_size=cfg.multipart_chunk_size, concurrency=cfg.multipart_concurrency)
+    log_plan(upload_plan, LOG)
+    log_plan(copy_plan, LOG)
+
+    # Expected checksums only depend on the seed and the part layout, so
+    # they are computed while the upload and copy run.
+    src_parts = upload_plan.part_sizes
+    tgt_parts = copy_plan.part_sizes
+    precompute = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checksum-precompute")
+    expected_src = expected_tgt = None
+    if cfg.s3_checksum_algorithm and cfg.verify_mode == "checksum":
+        expected_src = precompute.submit(
+            expected_s3_checksum, seed, cfg.size_bytes, cfg.s3_checksum_algorithm, src_parts, cfg.pattern_version,
+        )
+        expected_tgt = expected_src if tgt_parts == src_parts else precompute.submit(
+            expected_s3_checksum, seed, cfg.size_bytes, cfg.s3_checksum_algorithm, tgt_parts, cfg.pattern_version,
+        )
 
     try:
         # 1) Create deterministic source object (stream upload)
-        LOG.info("Creating deterministic SOURCE object in S3...")
-        stream = DeterministicStream(seed=seed, total_size=cfg.size_bytes)
-
-        extra_args = {
-            "Metadata": {
-                "e2e-test-id": test_id,
-                "e2e-seed-sha256": hashlib.sha256(seed).hexdigest(),
-                "e2e-size-bytes": str(cfg.size_bytes),
-            }
-        }
-
-        s3_client(cfg).upload_fileobj(
-            Fileobj=stream,
-            Bucket=cfg.src_bucket,
-            Key=src_key,
-            ExtraArgs=extra_args,
-        )
+        def upload() -> None:
+            with run.phase("upload", bytes=cfg.size_bytes):
+                LOG.info("Creating deterministic SOURCE object in S3...")
+                extra_args = {
+                    "Metadata": {
+                        "e2e-test-id": test_id,
+                        "e2e-seed-sha256": hashlib.sha256(seed).hexdigest(),
+                        "e2e-size-bytes": str(cfg.size_bytes),
+                        "e2e-pattern-version": str(cfg.pattern_version),
+                    }
+                }
+                if cfg.s3_checksum_algorithm:
+                    extra_args["ChecksumAlgorithm"] = cfg.s3_checksum_algorithm
+
+                if src_parts:
+                    s3_multipart_upload(
+                        s3_client(cfg), cfg.src_bucket, src_key, seed, cfg.size_bytes, src_parts,
+                        cfg.pattern_version, extra_args, upload_plan.max_concurrency, checkpoints.transfer("upload"),
+                        upload_plan.concurrency, cfg.generate_processes,
+                    )
+                else:
+                    stream = DeterministicStream(seed=seed, total_size=cfg.size_bytes, version=cfg.pattern_version)
+                    s3_client(cfg).upload_fileobj(
+                        Fileobj=stream,
+                        Bucket=cfg.src_bucket,
+                        Key=src_key,
+                        ExtraArgs=extra_args,
+                        Config=upload_plan.transfer_config(),
+                    )
+                    LOG.info("Generator: generated=%d delivered=%d amplification=%.2fx",
+                             stream.generated_bytes, stream.delivered_bytes, stream.amplification)
+
+        await endpoint_io(src_ep, upload)
         created = True
         LOG.info("SOURCE upload complete ✅")
 
-        # 2) Copy to target (multipart copy handled by TransferManager)
-        LOG.info("Copying SOURCE -> TARGET (server-side)...")
-        transfer_cfg = boto3.s3.transfer.TransferConfig(
-            multipart_threshold=cfg.multipart_threshold,
-            multipart_chunksize=cfg.multipart_chunk_size,
-            max_concurrency=10,
-            use_threads=True,
-        )
-
-        copy_source = {"Bucket": cfg.src_bucket, "Key": src_key}
-        s3_resource(cfg).Object(cfg.tgt_bucket, tgt_key).copy(
-            copy_source,
-            Config=transfer_cfg,
-            ExtraArgs={
-                # preserve metadata but also note this is a copy test
-                "MetadataDirective": "COPY",
-            },
-        )
+        # 2) Copy to target (server-side; UploadPartCopy for multipart)
+        def copy() -> None:
+            with run.phase("copy", bytes=cfg.size_bytes):
+                LOG.info("Copying SOURCE -> TARGET (server-side)...")
+                copy_args = {
+                    # preserve metadata but also note this is a copy test
+                    "MetadataDirective": "COPY",
+                }
+                if cfg.s3_checksum_algorithm:
+                    copy_args["ChecksumAlgorithm"] = cfg.s3_checksum_algorithm
+
+                if tgt_parts:
+                    s3_multipart_copy(
+                        s3_client(cfg), cfg.src_bucket, src_key, cfg.tgt_bucket, tgt_key, tgt_parts,
+                        copy_args, copy_plan.max_concurrency, checkpoints.transfer("copy"), copy_plan.concurrency,
+                    )
+                else:
+                    copy_source = {"Bucket": cfg.src_bucket, "Key": src_key}
+                    s3_client(cfg).copy(
+                        copy_source,
+                        cfg.tgt_bucket,
+                        tgt_key,
+                        Config=copy_plan.transfer_config(),
+                        ExtraArgs=copy_args,
+                    )
+
+        await endpoint_io((src_ep, tgt_ep), copy)
         copied = True
         LOG.info("COPY complete ✅")
 
         # 3) Validate target exists + size matches
-        src_meta = wait_for_object(cfg, cfg.src_bucket, src_key)
-        tgt_meta = wait_for_object(cfg, cfg.tgt_bucket, tgt_key)
+        with run.phase("first_appearance", requests=2):
+            src_meta, tgt_meta = await asyncio.gather(
+                wait_for_object(cfg, cfg.src_bucket, src_key),
+                wait_for_object(cfg, cfg.tgt_bucket, tgt_key),
+            )
 
         src_size = int(src_meta.get("ContentLength", -1))
         tgt_size = int(tgt_meta.get("ContentLength", -1))
@@ -385,26 +468,68 @@ def main() -> int:
         else:
             LOG.info("ETag is multipart (contains '-') — skipping ETag equality check (expected).")
 
-        # 4) Integrity: byte-range spot checks between source and target
-        check_len = min(cfg.spot_check_bytes, cfg.size_bytes)
-        offsets = choose_offsets(cfg.size_bytes, cfg.spot_checks, check_len, seed)
-        LOG.info("Running %d spot checks (%d bytes each)...", len(offsets), check_len)
+        # 4) Integrity: stored checksums, full hash tree of the target, or byte-range spot checks
+        def verify() -> None:
+            with run.phase(f"verify_{cfg.verify_mode}") as phase:
+                if cfg.verify_mode == "checksum":
+                    s3_verify_checksum(s3_client(cfg), cfg.src_bucket, src_key, expected_src.result())
+                    s3_verify_checksum(s3_client(cfg), cfg.tgt_bucket, tgt_key, expected_tgt.result())
+                    phase.requests = 2
+                elif cfg.verify_mode == "full":
+                    LOG.info("Running full verification of target (%d-byte parts)...", cfg.verify_part_size)
+                    result = s3_verify_full(
+                        s3_client(cfg), cfg.tgt_bucket, tgt_key, seed, cfg.size_bytes, cfg.pattern_version,
+                        part_size=cfg.verify_part_size, concurrency=cfg.verify_concurrency,
+                    )
+                    phase.bytes, phase.requests = cfg.size_bytes, result["parts"]
+                else:
+                    check_len = min(cfg.spot_check_bytes, cfg.size_bytes)
+                    offsets = choose_offsets(cfg.size_bytes, cfg.spot_checks, check_len, seed)
+                    LOG.info("Running %d spot checks (%d bytes each)...", len(offsets), check_len)
+
+                    # Both sides are compared against the deterministic pattern, which also
+                    # proves src == tgt for every checked range.
+                    result = s3_spot_check(
+                        s3_client(cfg),
+                        [(cfg.src_bucket, src_key), (cfg.tgt_bucket, tgt_key)],
+                        seed, offsets, check_len, cfg.size_bytes, cfg.pattern_version,
+                        concurrency=cfg.spot_check_concurrency,
+                    )
+                    phase.bytes, phase.requests = result["checks"] * check_len, result["checks"]
+
+        await endpoint_io((src_ep, tgt_ep), verify)
 
-        for i, off in enumerate(offsets, 1):
-            src_bytes = get_range(cfg, cfg.src_bucket, src_key, off, check_len)
-            tgt_bytes = get_range(cfg, cfg.tgt_bucket, tgt_key, off, check_len)
+        LOG.info("✅ PASS: Verified S3 -> S3 end-to-end")
+        return {"test_id": test_id, "key": tgt_key, "bytes": cfg.size_bytes, "seconds": time.time() - start}
 
-            # Optional: compare against deterministic expected bytes too (extra safety)
-            exp = expected_bytes(seed, off, len(src_bytes), cfg.size_bytes)
+    finally:
+        precompute.shutdown(wait=False, cancel_futures=True)
 
-            if src_bytes != tgt_bytes:
-                raise AssertionError(f"Spot-check mismatch src vs tgt at offset={off} (check {i}/{len(offsets)})")
-            if src_bytes != exp:
-                raise AssertionError(f"Spot-check mismatch vs expected pattern at offset={off} (check {i}/{len(offsets)})")
+        # Optional cleanup (kept while a checkpointed transfer can still resume)
+        with run.phase("cleanup") as phase:
+            if cfg.cleanup_tgt and copied and not checkpoints.resumable:
+                try:
+                    phase.requests += 1
+                    await endpoint_io(tgt_ep, delete_object, cfg, cfg.tgt_bucket, tgt_key)
+                except Exception as ce:
+                    LOG.warning("Cleanup target failed: %s", ce)
 
-            LOG.info("Spot-check %d/%d ✅ (offset=%d)", i, len(offsets), off)
+            if cfg.cleanup_src and created and not checkpoints.resumable:
+                try:
+                    phase.requests += 1
+                    await endpoint_io(src_ep, delete_object, cfg, cfg.src_bucket, src_key)
+                except Exception as ce:
+                    LOG.warning("Cleanup source failed: %s", ce)
 
-        LOG.info("✅ PASS: Verified S3 -> S3 end-to-end")
+
+def main() -> int:
+    args = build_parser().parse_args()
+
+    cfg = load_config(args.env_file)
+    setup_logging(cfg.log_level)
+
+    try:
+        run_test(cfg)
         return 0
 
     except Exception as e:
@@ -412,19 +537,9 @@ def main() -> int:
         return 2
 
     finally:
-        # Optional cleanup
-        if cfg.cleanup_tgt and copied:
-            try:
-                delete_object(cfg, cfg.tgt_bucket, tgt_key)
-            except Exception as ce:
-                LOG.warning("Cleanup target failed: %s", ce)
-
-        if cfg.cleanup_src and created:
-            try:
-                delete_object(cfg, cfg.src_bucket, src_key)
-            except Exception as ce:
-                LOG.warning("Cleanup source failed: %s", ce)
-
+        stats = connection_stats()
+        LOG.info("S3 clients=%d connections_opened=%d", stats["clients"], stats["connections_opened"])
+        METRICS.export()
         LOG.info("=== TEST END ===")
 
 
@@ -3,23 +3,58 @@
 Production-ready S3 -> SFTP E2E test for EC2.
 
 Supports 1MB–20GB without local disk usage.
-Validates integrity via size + deterministic byte-range spot checks.
+Validates integrity via size + deterministic byte-range spot checks, or with
+VERIFY_MODE=full a streamed hash tree of the whole SFTP file. With
+S3_CHECKSUM_ALGORITHM set, the source upload also stores an S3 additional
+checksum that is checked (one HeadObject) before the transfer starts.
 """
 
 import os
 import sys
 import time
-import uuid
+import asyncio
 import logging
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, List
+from typing import Dict, Optional
 
-import boto3
 import botocore
-import paramiko
 from dotenv import load_dotenv
 
+from e2e_checksum import expected_s3_checksum, parse_checksum_algorithm
+from e2e_fixture import DEFAULT_FIXTURE_QUOTA, parse_fixture_dir, use_fixture
+from e2e_limits import endpoint_io, s3_endpoint, sftp_endpoint
+from e2e_metrics import METRICS, RunRecord
+from e2e_payload import (
+    DEFAULT_PATTERN_VERSION,
+    DeterministicStream,
+    choose_offsets,
+    parse_pattern_version,
+)
+from e2e_resume import (
+    DEFAULT_CHECKPOINT_FILE,
+    DEFAULT_CHECKPOINT_MIN_SIZE,
+    RunCheckpoints,
+    checkpointed_run,
+    parse_checkpoint_file,
+)
+from e2e_s3 import DEFAULT_MAX_POOL_CONNECTIONS, client_config, connection_stats, get_s3_client
+from e2e_s3_calls import S3_CALLS, log_summary
+from e2e_sftp import POOL, SFTPConn, sftp_session
+from e2e_partgen import parse_generate_processes
+from e2e_planner import DEFAULT_MEMORY_BUDGET, UPLOAD, log_plan, parse_auto, plan_multipart
+from e2e_transfer import DEFAULT_S3_PART_SIZE, DEFAULT_S3_RANGE_CONCURRENCY, s3_multipart_upload, s3_to_sftp_ranged
+from e2e_verify import (
+    DEFAULT_FULL_VERIFY_CONCURRENCY,
+    DEFAULT_TREE_PART_SIZE,
+    SFTP_VERIFY_MODES,
+    parse_verify_mode,
+    s3_verify_checksum,
+    sftp_spot_check,
+    sftp_verify_full,
+)
+
 
 # ---------------- Logging ----------------
 def setup_logging(level: str):
@@ -63,6 +98,9 @@ class Config:
     aws_region: str
     s3_bucket: str
     s3_prefix: str
+    s3_endpoint_url: Optional[str]
+    aws_profile: Optional[str]
+    s3_max_pool_connections: int
 
     sftp_host: str
     sftp_port: int
@@ -73,27 +111,49 @@ class Config:
 
     size_bytes: int
     io_chunk_bytes: int
+    pattern_version: int
+
+    s3_part_size: int
+    s3_range_concurrency: int
+    sftp_sequential_writes: bool
+    s3_checksum_algorithm: Optional[str]
+    multipart_chunk_size: Optional[int]
+    multipart_concurrency: Optional[int]
+    s3_memory_budget: int
+    generate_processes: int
 
     wait_timeout: int
     poll_interval: int
     stable_polls: int
 
+    verify_mode: str
     spot_checks: int
     spot_check_bytes: int
+    verify_part_size: int
+    verify_concurrency: int
 
     cleanup_s3: bool
     cleanup_sftp: bool
 
+    checkpoint_file: Optional[str]
+    checkpoint_min_size: int
+
+    fixture_cache_dir: Optional[str]
+    fixture_cache_quota: int
+
     log_level: str
 
 
-def load_config() -> Config:
-    load_dotenv()
+def load_config(env_file: Optional[str] = None) -> Config:
+    load_dotenv(env_file)
 
     return Config(
         aws_region=os.getenv("AWS_REGION", "us-west-2"),
         s3_bucket=os.environ["S3_BUCKET"],
         s3_prefix=os.getenv("S3_PREFIX", "").rstrip("/") + "/",
+        s3_endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+        aws_profile=os.getenv("AWS_PROFILE") or None,
+        s3_max_pool_connections=int(os.getenv("S3_MAX_POOL_CONNECTIONS", str(DEFAULT_MAX_POOL_CONNECTIONS))),
 
         sftp_host=os.environ["TGT_SFTP_HOST"],
         sftp_port=int(os.getenv("TGT_SFTP_PORT", "22")),
@@ -104,128 +164,205 @@ def load_config() -> Config:
 
         size_bytes=parse_size(os.getenv("TEST_SIZE", "1MB")),
         io_chunk_bytes=int(os.getenv("IO_CHUNK_BYTES", str(1024 * 1024))),
+        pattern_version=parse_pattern_version(os.getenv("PATTERN_VERSION", str(DEFAULT_PATTERN_VERSION))),
+
+        s3_part_size=int(os.getenv("S3_PART_SIZE", str(DEFAULT_S3_PART_SIZE))),
+        s3_range_concurrency=int(os.getenv("S3_RANGE_CONCURRENCY", str(DEFAULT_S3_RANGE_CONCURRENCY))),
+        sftp_sequential_writes=env_bool("SFTP_SEQUENTIAL_WRITES", False),
+        s3_checksum_algorithm=parse_checksum_algorithm(os.getenv("S3_CHECKSUM_ALGORITHM")),
+        multipart_chunk_size=parse_auto(os.getenv("MULTIPART_CHUNK_SIZE"), parse_size),
+        multipart_concurrency=parse_auto(os.getenv("S3_MULTIPART_CONCURRENCY")),
+        s3_memory_budget=parse_size(os.getenv("S3_MEMORY_BUDGET", str(DEFAULT_MEMORY_BUDGET))),
+        generate_processes=parse_generate_processes(os.getenv("SOURCE_GENERATE_PROCESSES")),
 
         wait_timeout=int(os.getenv("WAIT_TIMEOUT_SECONDS", "3600")),
         poll_interval=int(os.getenv("POLL_INTERVAL_SECONDS", "5")),
         stable_polls=int(os.getenv("STABLE_POLLS_REQUIRED", "3")),
 
+        verify_mode=parse_verify_mode(os.getenv("VERIFY_MODE", "spot"), SFTP_VERIFY_MODES),
         spot_checks=int(os.getenv("SPOT_CHECKS", "8")),
         spot_check_bytes=int(os.getenv("SPOT_CHECK_BYTES", str(256 * 1024))),
+        verify_part_size=parse_size(os.getenv("VERIFY_PART_SIZE", str(DEFAULT_TREE_PART_SIZE))),
+        verify_concurrency=int(os.getenv("VERIFY_CONCURRENCY", str(DEFAULT_FULL_VERIFY_CONCURRENCY))),
 
         cleanup_s3=env_bool("CLEANUP_S3", False),
         cleanup_sftp=env_bool("CLEANUP_SFTP", False),
+        checkpoint_file=parse_checkpoint_file(os.getenv("CHECKPOINT_FILE", DEFAULT_CHECKPOINT_FILE)),
+        checkpoint_min_size=parse_size(os.getenv("CHECKPOINT_MIN_SIZE", str(DEFAULT_CHECKPOINT_MIN_SIZE))),
+        fixture_cache_dir=parse_fixture_dir(os.getenv("FIXTURE_CACHE_DIR")),
+        fixture_cache_quota=parse_size(os.getenv("FIXTURE_CACHE_QUOTA", str(DEFAULT_FIXTURE_QUOTA))),
 
         log_level=os.getenv("LOG_LEVEL", "INFO"),
     )
 
 
-# ---------------- Deterministic bytes ----------------
-CHUNK = 1024 * 1024
-
-
-def gen_bytes(seed: bytes, offset: int, length: int) -> bytes:
-    out = bytearray()
-    idx = offset // CHUNK
-    pos = offset % CHUNK
-    while len(out) < length:
-        h = hashlib.blake2b(seed + idx.to_bytes(8, "big"), digest_size=64)
-        block = h.digest()
-        take = min(len(block) - pos, length - len(out))
-        out.extend(block[pos:pos + take])
-        idx += 1
-        pos = 0
-    return bytes(out)
-
-
-def choose_offsets(size: int, checks: int, span: int, seed: bytes) -> List[int]:
-    offs = {0, max(0, size - span)}
-    i = 0
-    while len(offs) < checks:
-        h = hashlib.blake2b(seed + i.to_bytes(8, "big"), digest_size=8)
-        offs.add(int.from_bytes(h.digest(), "big") % (size - span + 1))
-        i += 1
-    return sorted(list(offs))[:checks]
-
-
 # ---------------- SFTP ----------------
-def load_key(path: str, passphrase: Optional[str]) -> paramiko.PKey:
-    for cls in (paramiko.Ed25519Key, paramiko.RSAKey, paramiko.ECDSAKey):
-        try:
-            return cls.from_private_key_file(path, password=passphrase)
-        except Exception:
-            pass
-    raise RuntimeError("Unable to load private key")
-
-
-def connect_sftp(cfg: Config):
-    t = paramiko.Transport((cfg.sftp_host, cfg.sftp_port))
-    key = load_key(cfg.sftp_key_path, cfg.sftp_key_passphrase)
-    t.connect(username=cfg.sftp_username, pkey=key)
-    return t, paramiko.SFTPClient.from_transport(t)
+def sftp_conn(cfg: Config) -> SFTPConn:
+    return SFTPConn(
+        host=cfg.sftp_host,
+        port=cfg.sftp_port,
+        username=cfg.sftp_username,
+        private_key_path=cfg.sftp_key_path,
+        private_key_passphrase=cfg.sftp_key_passphrase,
+        remote_dir=cfg.sftp_remote_dir,
+    )
 
 
 # ---------------- Main ----------------
-def main() -> int:
-    cfg = load_config()
-    setup_logging(cfg.log_level)
+def run_test(cfg: Config) -> Dict[str, object]:
+    """
+    One S3 -> SFTP probe. Raises on failure. Shared S3 clients and pooled
+    SFTP connections are left open so that many probes can run in one process.
+    With CHECKPOINT_FILE set, large runs are checkpointed; a rerun after a failed
+    upload resumes it.
+    """
+    return asyncio.run(run_test_async(cfg))
+
+
+async def run_test_async(cfg: Config) -> Dict[str, object]:
+    """run_test as a coroutine, for runners that drive many probes on one event loop."""
+    await asyncio.to_thread(use_fixture, cfg.fixture_cache_dir, cfg.fixture_cache_quota,
+                            cfg.pattern_version, cfg.size_bytes)
+    calls_before = S3_CALLS.snapshot()
+    fingerprint = {
+        "pattern_version": cfg.pattern_version,
+        "s3": f"s3://{cfg.s3_bucket}/{cfg.s3_prefix}",
+        "sftp": f"{cfg.sftp_host}:{cfg.sftp_port}{cfg.sftp_remote_dir}",
+    }
+    try:
+        with checkpointed_run(cfg.checkpoint_file, cfg.checkpoint_min_size, "s3-sftp", cfg.size_bytes,
+                              fingerprint) as checkpoints, \
+                METRICS.run("s3-sftp", checkpoints.test_id, cfg.size_bytes) as run:
+            return await _run_test(cfg, run, checkpoints)
+    finally:
+        log_summary(LOG, S3_CALLS.since(calls_before), "S3 calls this run")
+
 
-    s3 = boto3.client("s3", region_name=cfg.aws_region)
+async def _run_test(cfg: Config, run: RunRecord, checkpoints: RunCheckpoints) -> Dict[str, object]:
+    s3 = get_s3_client(
+        cfg.aws_region,
+        endpoint_url=cfg.s3_endpoint_url,
+        profile=cfg.aws_profile,
+        config=client_config(cfg.s3_max_pool_connections),
+    )
 
-    test_id = uuid.uuid4().hex
+    test_id = run.test_id
     filename = f"s3-sftp-test-{test_id}.bin"
     s3_key = f"{cfg.s3_prefix}{filename}"
     sftp_path = f"{cfg.sftp_remote_dir}/{filename}"
 
-    seed = hashlib.sha256(test_id.encode()).digest()
-
-    LOG.info("Creating S3 object %s (%d bytes)", s3_key, cfg.size_bytes)
+    seed = hashlib.sha256(f"s3-sftp-e2e:{test_id}".encode("utf-8")).digest()
+    s3_ep = s3_endpoint(cfg.s3_bucket)
+    sftp_ep = sftp_endpoint(cfg.sftp_host, cfg.sftp_port)
+    start = time.time()
+
+    LOG.info("Creating S3 object %s (%d bytes, pattern v%d)", s3_key, cfg.size_bytes, cfg.pattern_version)
+
+    # Upload deterministic object to S3 (parts in flight bounded by S3_MEMORY_BUDGET)
+    upload_plan = plan_multipart(UPLOAD, cfg.size_bytes, memory_budget=cfg.s3_memory_budget,
+                                 max_pool_connections=cfg.s3_max_pool_connections,
+                                 part_size=cfg.multipart_chunk_size, concurrency=cfg.multipart_concurrency)
+    log_plan(upload_plan, LOG)
+    extra_args = {
+        "Metadata": {
+            "e2e-test-id": test_id,
+            "e2e-seed-sha256": hashlib.sha256(seed).hexdigest(),
+            "e2e-size-bytes": str(cfg.size_bytes),
+            "e2e-pattern-version": str(cfg.pattern_version),
+        }
+    }
+    part_sizes = upload_plan.part_sizes
+    expected_checksum = None
+    if cfg.s3_checksum_algorithm:
+        extra_args["ChecksumAlgorithm"] = cfg.s3_checksum_algorithm
+        # Computed from the seed while the upload runs
+        precompute = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checksum-precompute")
+        expected_checksum = precompute.submit(
+            expected_s3_checksum, seed, cfg.size_bytes, cfg.s3_checksum_algorithm, part_sizes, cfg.pattern_version,
+        )
+        precompute.shutdown(wait=False)
+
+    def upload() -> None:
+        with run.phase("upload", bytes=cfg.size_bytes):
+            if part_sizes:
+                s3_multipart_upload(
+                    s3, cfg.s3_bucket, s3_key, seed, cfg.size_bytes, part_sizes,
+                    cfg.pattern_version, extra_args, upload_plan.max_concurrency, checkpoints.transfer("upload"),
+                    upload_plan.concurrency, cfg.generate_processes,
+                )
+            else:
+                stream = DeterministicStream(seed=seed, total_size=cfg.size_bytes, version=cfg.pattern_version)
+                s3.upload_fileobj(
+                    Fileobj=stream,
+                    Bucket=cfg.s3_bucket,
+                    Key=s3_key,
+                    ExtraArgs=extra_args,
+                    Config=upload_plan.transfer_config(),
+                )
+                LOG.info("Generator: generated=%d delivered=%d amplification=%.2fx",
+                         stream.generated_bytes, stream.delivered_bytes, stream.amplification)
+            if expected_checksum is not None:
+                s3_verify_checksum(s3, cfg.s3_bucket, s3_key, expected_checksum.result())
+
+    await endpoint_io(s3_ep, upload)
+
+    # Ranged, multi-stream S3 → SFTP
+    LOG.info("Streaming S3 -> SFTP")
+    conn = sftp_conn(cfg)
+
+    def transfer() -> Dict[str, int]:
+        with run.phase("transfer", bytes=cfg.size_bytes):
+            src_size = int(s3.head_object(Bucket=cfg.s3_bucket, Key=s3_key)["ContentLength"])
+            if src_size != cfg.size_bytes:
+                raise AssertionError(f"Source size mismatch: {src_size} vs expected {cfg.size_bytes}")
+            return s3_to_sftp_ranged(
+                s3, cfg.s3_bucket, s3_key, conn, sftp_path, src_size,
+                part_size=cfg.s3_part_size,
+                concurrency=cfg.s3_range_concurrency,
+                sequential=cfg.sftp_sequential_writes,
+            )
+
+    result = await endpoint_io((s3_ep, sftp_ep), transfer)
+    LOG.info("Transfer complete (%d bytes)", result["bytes"])
+
+    # Verify size + content (spot checks, or the full file)
+    def verify() -> None:
+        with run.phase(f"verify_{cfg.verify_mode}") as phase:
+            with sftp_session(conn) as sftp:
+                size = sftp.stat(sftp_path).st_size
+                if size != cfg.size_bytes:
+                    raise AssertionError("Size mismatch")
+
+                if cfg.verify_mode != "full":
+                    check_len = min(cfg.spot_check_bytes, cfg.size_bytes)
+                    offsets = choose_offsets(cfg.size_bytes, cfg.spot_checks, check_len, seed)
+                    checked = sftp_spot_check(sftp, sftp_path, seed, offsets, check_len, cfg.size_bytes,
+                                              cfg.pattern_version)
+                    phase.bytes, phase.requests = checked["checks"] * check_len, checked["checks"]
+            if cfg.verify_mode == "full":
+                checked = sftp_verify_full(
+                    conn, sftp_path, seed, cfg.size_bytes, cfg.pattern_version,
+                    part_size=cfg.verify_part_size, concurrency=cfg.verify_concurrency,
+                )
+                phase.bytes, phase.requests = cfg.size_bytes, checked["parts"]
+
+    await endpoint_io(sftp_ep, verify)
+    LOG.info("Verification PASSED ✅")
+    return {"test_id": test_id, "key": s3_key, "bytes": cfg.size_bytes, "seconds": time.time() - start}
 
-    # Upload deterministic object to S3
-    s3.upload_fileobj(
-        Fileobj=type("S", (), {"read": lambda _, n=-1: gen_bytes(seed, 0, cfg.size_bytes)})(),
-        Bucket=cfg.s3_bucket,
-        Key=s3_key,
-    )
 
-    # Stream S3 → SFTP
-    LOG.info("Streaming S3 -> SFTP")
-    t, sftp = connect_sftp(cfg)
-    try:
-        with sftp.open(sftp_path, "wb") as wf:
-            resp = s3.get_object(Bucket=cfg.s3_bucket, Key=s3_key)
-            stream = resp["Body"]
-            transferred = 0
-            while True:
-                buf = stream.read(cfg.io_chunk_bytes)
-                if not buf:
-                    break
-                wf.write(buf)
-                transferred += len(buf)
-        LOG.info("Transfer complete (%d bytes)", transferred)
-    finally:
-        sftp.close()
-        t.close()
+def main() -> int:
+    cfg = load_config()
+    setup_logging(cfg.log_level)
 
-    # Verify size + spot checks
-    t, sftp = connect_sftp(cfg)
     try:
-        size = sftp.stat(sftp_path).st_size
-        if size != cfg.size_bytes:
-            raise AssertionError("Size mismatch")
-
-        offsets = choose_offsets(cfg.size_bytes, cfg.spot_checks, cfg.spot_check_bytes, seed)
-        with sftp.open(sftp_path, "rb") as f:
-            for off in offsets:
-                f.seek(off)
-                actual = f.read(cfg.spot_check_bytes)
-                expected = gen_bytes(seed, off, len(actual))
-                if actual != expected:
-                    raise AssertionError(f"Spot check failed at offset {off}")
-        LOG.info("Verification PASSED ✅")
+        run_test(cfg)
     finally:
-        sftp.close()
-        t.close()
-
+        LOG.info("SFTP pool: %s", POOL.stats())
+        POOL.close_all()
+        stats = connection_stats()
+        LOG.info("S3 clients=%d connections_opened=%d", stats["clients"], stats["connections_opened"])
+        METRICS.export()
     return 0
 
 
@@ -9,8 +9,12 @@ What it does:
 4) Verifies:
    - S3 object exists
    - Content-Length matches expected size
-   - Object "stabilizes" (size unchanged for N polls)
-   - Byte-range spot checks (configurable count/bytes)
+   - Object arrived: an S3 ObjectCreated event from S3_EVENTS_QUEUE_URL (SQS)
+     matching size + ETag, or size unchanged for N backoff polls
+     (S3_WAIT_MODE=sweep resolves it from shared listing sweeps instead)
+   - Byte-range spot checks (configurable count/bytes), or with --verify full
+     a streamed hash tree of the whole object against the seed, or with
+     --verify checksum the S3-stored additional checksum (one HeadObject)
 5) Optional cleanup on SFTP + S3
 
 Assumptions:
@@ -25,17 +29,60 @@ Exit codes:
 import os
 import sys
 import time
-import uuid
 import json
+import asyncio
 import argparse
 import logging
 import hashlib
 from dataclasses import dataclass
-from typing import Optional, Tuple, List
-
-import boto3
-import botocore
-import paramiko
+from typing import Dict, Optional
+
+
+from e2e_arrival import (
+    DEFAULT_POLL_INITIAL_SECONDS,
+    DEFAULT_SWEEP_INTERVAL_SECONDS,
+    Arrival,
+    backoff_delays,
+    get_batch_waiter,
+    wait_for_s3_object_async,
+)
+from e2e_discovery import (
+    DEFAULT_DISCOVERY_WORKERS,
+    DEFAULT_HOT_WINDOW_SECONDS,
+    DEFAULT_MAX_INDEXED_KEYS,
+    DEFAULT_SHARD_DEPTH,
+    get_discovery_index,
+)
+from e2e_fixture import DEFAULT_FIXTURE_QUOTA, parse_fixture_dir, use_fixture
+from e2e_limits import endpoint_io, s3_endpoint, sftp_endpoint
+from e2e_metrics import METRICS, RunRecord
+from e2e_payload import (
+    DEFAULT_PATTERN_VERSION,
+    DeterministicStream,
+    choose_offsets,
+    parse_pattern_version,
+)
+from e2e_resume import (
+    DEFAULT_CHECKPOINT_FILE,
+    DEFAULT_CHECKPOINT_MIN_SIZE,
+    RunCheckpoints,
+    checkpointed_run,
+    parse_checkpoint_file,
+)
+from e2e_s3 import DEFAULT_MAX_POOL_CONNECTIONS, client_config, connection_stats, get_client, get_s3_client
+from e2e_s3_calls import S3_CALLS, log_summary
+from e2e_sftp import POOL, SFTPConn, sftp_session
+from e2e_transfer import parallel_sftp_upload
+from e2e_verify import (
+    DEFAULT_FULL_VERIFY_CONCURRENCY,
+    DEFAULT_SPOT_CHECK_CONCURRENCY,
+    DEFAULT_TREE_PART_SIZE,
+    VERIFY_MODES,
+    parse_verify_mode,
+    s3_spot_check,
+    s3_verify_full,
+    s3_verify_stored_checksum,
+)
 
 try:
     from dotenv import load_dotenv
@@ -68,32 +115,56 @@ class Config:
     sftp_private_key_path: str
     sftp_private_key_passphrase: Optional[str]
     sftp_remote_dir: str
+    sftp_upload_parallelism: int
 
     # S3
     aws_region: str
     s3_bucket: str
     s3_prefix: str
+    s3_endpoint_url: Optional[str]
+    aws_profile: Optional[str]
+    s3_max_pool_connections: int
 
     # Transfer/object mapping
     s3_key_mode: str  # "exact" or "discover"
     s3_exact_key: Optional[str]  # if exact mode
+    discovery_shard_depth: int
+    discovery_workers: int
+    discovery_hot_window_seconds: int
+    discovery_max_keys: int
 
     # Test sizing
     size_bytes: int
+    pattern_version: int
 
     # Waiting/polling
     wait_timeout_seconds: int
-    poll_interval_seconds: int
+    poll_initial_seconds: float
+    poll_interval_seconds: int  # backoff cap
     stable_polls_required: int
+    s3_events_queue_url: Optional[str]
+    sqs_endpoint_url: Optional[str]
+    s3_wait_mode: str  # "head" or "sweep"
+    sweep_interval_seconds: float
 
-    # Spot checks
+    # Verification
+    verify_mode: str
     spot_checks: int
     spot_check_bytes: int
+    spot_check_concurrency: int
+    verify_part_size: int
+    verify_concurrency: int
 
     # Cleanup
     cleanup_remote_sftp: bool
     cleanup_s3_object: bool
 
+    checkpoint_file: Optional[str]
+    checkpoint_min_size: int
+
+    fixture_cache_dir: Optional[str]
+    fixture_cache_quota: int
+
     # Runtime
     log_level: str
 
@@ -163,6 +234,7 @@ def load_config(args: argparse.Namespace) -> Config:
     sftp_private_key_path = args.sftp_private_key_path or getenv_required("SFTP_PRIVATE_KEY_PATH")
     sftp_private_key_passphrase = args.sftp_private_key_passphrase or os.getenv("SFTP_PRIVATE_KEY_PASSPHRASE") or None
     sftp_remote_dir = (args.sftp_remote_dir or os.getenv("SFTP_REMOTE_DIR", "/")).rstrip("/") or "/"
+    sftp_upload_parallelism = int(args.upload_parallelism or os.getenv("SFTP_UPLOAD_PARALLELISM", "1"))
 
     # S3
     aws_region = args.aws_region or os.getenv("AWS_REGION", "us-west-2")
@@ -170,29 +242,53 @@ def load_config(args: argparse.Namespace) -> Config:
     s3_prefix = (args.s3_prefix or os.getenv("S3_PREFIX", "")).lstrip("/")
     if s3_prefix and not s3_prefix.endswith("/"):
         s3_prefix += "/"
+    s3_endpoint_url = args.s3_endpoint_url or os.getenv("S3_ENDPOINT_URL") or None
+    aws_profile = args.aws_profile or os.getenv("AWS_PROFILE") or None
+    s3_max_pool_connections = int(os.getenv("S3_MAX_POOL_CONNECTIONS", str(DEFAULT_MAX_POOL_CONNECTIONS)))
 
     # Mapping
     s3_key_mode = args.s3_key_mode or os.getenv("S3_KEY_MODE", "exact").lower()
     if s3_key_mode not in ("exact", "discover"):
         raise ValueError("S3_KEY_MODE must be 'exact' or 'discover'")
     s3_exact_key = args.s3_exact_key or os.getenv("S3_EXACT_KEY") or None
+    discovery_shard_depth = int(os.getenv("DISCOVERY_SHARD_DEPTH", str(DEFAULT_SHARD_DEPTH)))
+    discovery_workers = int(os.getenv("DISCOVERY_WORKERS", str(DEFAULT_DISCOVERY_WORKERS)))
+    discovery_hot_window_seconds = int(os.getenv("DISCOVERY_HOT_WINDOW_SECONDS", str(DEFAULT_HOT_WINDOW_SECONDS)))
+    discovery_max_keys = int(os.getenv("DISCOVERY_MAX_KEYS", str(DEFAULT_MAX_INDEXED_KEYS)))
 
     # Size
     size_bytes = parse_size(args.size or os.getenv("TEST_SIZE", "1MB"))
+    pattern_version = parse_pattern_version(args.pattern_version or os.getenv("PATTERN_VERSION", str(DEFAULT_PATTERN_VERSION)))
 
     # Waiting
     wait_timeout_seconds = int(args.wait_timeout or os.getenv("WAIT_TIMEOUT_SECONDS", "3600"))
+    poll_initial_seconds = float(os.getenv("POLL_INITIAL_SECONDS", str(DEFAULT_POLL_INITIAL_SECONDS)))
     poll_interval_seconds = int(args.poll_interval or os.getenv("POLL_INTERVAL_SECONDS", "10"))
     stable_polls_required = int(args.stable_polls or os.getenv("STABLE_POLLS_REQUIRED", "3"))
-
-    # Spot checks
+    s3_events_queue_url = args.s3_events_queue_url or os.getenv("S3_EVENTS_QUEUE_URL") or None
+    sqs_endpoint_url = os.getenv("SQS_ENDPOINT_URL") or None
+    s3_wait_mode = (args.s3_wait_mode or os.getenv("S3_WAIT_MODE", "head")).lower()
+    if s3_wait_mode not in ("head", "sweep"):
+        raise ValueError("S3_WAIT_MODE must be 'head' or 'sweep'")
+    sweep_interval_seconds = float(os.getenv("SWEEP_INTERVAL_SECONDS", str(DEFAULT_SWEEP_INTERVAL_SECONDS)))
+
+    # Verification
+    verify_mode = parse_verify_mode(args.verify or os.getenv("VERIFY_MODE", "spot"))
     spot_checks = int(args.spot_checks or os.getenv("SPOT_CHECKS", "8"))
     spot_check_bytes = int(args.spot_check_bytes or os.getenv("SPOT_CHECK_BYTES", str(256 * 1024)))
+    spot_check_concurrency = int(os.getenv("SPOT_CHECK_CONCURRENCY", str(DEFAULT_SPOT_CHECK_CONCURRENCY)))
+    verify_part_size = parse_size(os.getenv("VERIFY_PART_SIZE", str(DEFAULT_TREE_PART_SIZE)))
+    verify_concurrency = int(os.getenv("VERIFY_CONCURRENCY", str(DEFAULT_FULL_VERIFY_CONCURRENCY)))
 
     # Cleanup
     cleanup_remote_sftp = args.cleanup_sftp if args.cleanup_sftp is not None else env_bool("CLEANUP_REMOTE_SFTP", False)
     cleanup_s3_object = args.cleanup_s3 if args.cleanup_s3 is not None else env_bool("CLEANUP_S3_OBJECT", False)
 
+    checkpoint_file = parse_checkpoint_file(os.getenv("CHECKPOINT_FILE", DEFAULT_CHECKPOINT_FILE))
+    checkpoint_min_size = parse_size(os.getenv("CHECKPOINT_MIN_SIZE", str(DEFAULT_CHECKPOINT_MIN_SIZE)))
+    fixture_cache_dir = parse_fixture_dir(os.getenv("FIXTURE_CACHE_DIR"))
+    fixture_cache_quota = parse_size(os.getenv("FIXTURE_CACHE_QUOTA", str(DEFAULT_FIXTURE_QUOTA)))
+
     # Logging
     log_level = args.log_level or os.getenv("LOG_LEVEL", "INFO")
 
@@ -203,137 +299,61 @@ def load_config(args: argparse.Namespace) -> Config:
         sftp_private_key_path=sftp_private_key_path,
         sftp_private_key_passphrase=sftp_private_key_passphrase,
         sftp_remote_dir=sftp_remote_dir,
+        sftp_upload_parallelism=sftp_upload_parallelism,
         aws_region=aws_region,
         s3_bucket=s3_bucket,
         s3_prefix=s3_prefix,
+        s3_endpoint_url=s3_endpoint_url,
+        aws_profile=aws_profile,
+        s3_max_pool_connections=s3_max_pool_connections,
         s3_key_mode=s3_key_mode,
         s3_exact_key=s3_exact_key,
+        discovery_shard_depth=discovery_shard_depth,
+        discovery_workers=discovery_workers,
+        discovery_hot_window_seconds=discovery_hot_window_seconds,
+        discovery_max_keys=discovery_max_keys,
         size_bytes=size_bytes,
+        pattern_version=pattern_version,
         wait_timeout_seconds=wait_timeout_seconds,
+        poll_initial_seconds=poll_initial_seconds,
         poll_interval_seconds=poll_interval_seconds,
         stable_polls_required=stable_polls_required,
+        s3_events_queue_url=s3_events_queue_url,
+        sqs_endpoint_url=sqs_endpoint_url,
+        s3_wait_mode=s3_wait_mode,
+        sweep_interval_seconds=sweep_interval_seconds,
+        verify_mode=verify_mode,
         spot_checks=spot_checks,
         spot_check_bytes=spot_check_bytes,
+        spot_check_concurrency=spot_check_concurrency,
+        verify_part_size=verify_part_size,
+        verify_concurrency=verify_concurrency,
         cleanup_remote_sftp=cleanup_remote_sftp,
         cleanup_s3_object=cleanup_s3_object,
+        checkpoint_file=checkpoint_file,
+        checkpoint_min_size=checkpoint_min_size,
+        fixture_cache_dir=fixture_cache_dir,
+        fixture_cache_quota=fixture_cache_quota,
         log_level=log_level,
     )
 
 
-# -----------------------------
-# Deterministic byte stream for huge files
-# -----------------------------
-CHUNK = 1024 * 1024  # 1 MiB
-
-def _chunk_bytes(seed: bytes, chunk_index: int, chunk_len: int) -> bytes:
-    out = bytearray()
-    ctr = 0
-    while len(out) < chunk_len:
-        h = hashlib.blake2b(digest_size=64)
-        h.update(seed)
-        h.update(chunk_index.to_bytes(8, "big"))
-        h.update(ctr.to_bytes(8, "big"))
-        out.extend(h.digest())
-        ctr += 1
-    return bytes(out[:chunk_len])
-
-
-def expected_bytes(seed: bytes, offset: int, length: int, total_size: int) -> bytes:
-    if offset < 0 or length < 0 or offset + length > total_size:
-        raise ValueError("Requested range out of bounds")
-
-    start_chunk = offset // CHUNK
-    end_offset = offset + length
-    end_chunk = (end_offset - 1) // CHUNK
-
-    remaining = length
-    pos = offset
-    pieces = []
-
-    for ci in range(start_chunk, end_chunk + 1):
-        chunk_start = ci * CHUNK
-        chunk_end = min(chunk_start + CHUNK, total_size)
-        this_len = chunk_end - chunk_start
-
-        data = _chunk_bytes(seed, ci, this_len)
-        s = max(0, pos - chunk_start)
-        e = min(this_len, s + remaining)
-        pieces.append(data[s:e])
-
-        took = e - s
-        remaining -= took
-        pos += took
-
-    return b"".join(pieces)
-
-
-class DeterministicStream:
-    def __init__(self, seed: bytes, total_size: int):
-        self.seed = seed
-        self.total_size = total_size
-        self.pos = 0
-
-    def read(self, n: int = -1) -> bytes:
-        if self.pos >= self.total_size:
-            return b""
-        if n is None or n < 0:
-            n = self.total_size - self.pos
-        n = min(n, self.total_size - self.pos)
-        b = expected_bytes(self.seed, self.pos, n, self.total_size)
-        self.pos += n
-        return b
-
-
-def choose_offsets(total_size: int, checks: int, bytes_per_check: int, seed: bytes) -> List[int]:
-    if total_size <= bytes_per_check:
-        return [0]
-    offsets = set()
-    offsets.add(0)
-    offsets.add(max(0, total_size - bytes_per_check))
-
-    i = 0
-    while len(offsets) < max(2, checks):
-        h = hashlib.blake2b(digest_size=8)
-        h.update(seed)
-        h.update(i.to_bytes(8, "big"))
-        candidate = int.from_bytes(h.digest(), "big")
-        off = candidate % (total_size - bytes_per_check + 1)
-        offsets.add(off)
-        i += 1
-
-    return sorted(list(offsets))[:checks]
-
-
 # -----------------------------
 # SFTP (key auth)
 # -----------------------------
-def _load_private_key(path: str, passphrase: Optional[str]) -> paramiko.PKey:
-    loaders = [
-        paramiko.Ed25519Key.from_private_key_file,
-        paramiko.RSAKey.from_private_key_file,
-        paramiko.ECDSAKey.from_private_key_file,
-        paramiko.DSSKey.from_private_key_file,
-    ]
-    last = None
-    for loader in loaders:
-        try:
-            return loader(path, password=passphrase)
-        except Exception as e:
-            last = e
-    raise RuntimeError(f"Unable to load private key from {path}. Last error: {last}")
-
-
-def connect_sftp(cfg: Config) -> Tuple[paramiko.Transport, paramiko.SFTPClient]:
-    t = paramiko.Transport((cfg.sftp_host, cfg.sftp_port))
-    pkey = _load_private_key(cfg.sftp_private_key_path, cfg.sftp_private_key_passphrase)
-    t.connect(username=cfg.sftp_username, pkey=pkey)
-    sftp = paramiko.SFTPClient.from_transport(t)
-    return t, sftp
+def sftp_conn(cfg: Config) -> SFTPConn:
+    return SFTPConn(
+        host=cfg.sftp_host,
+        port=cfg.sftp_port,
+        username=cfg.sftp_username,
+        private_key_path=cfg.sftp_private_key_path,
+        private_key_passphrase=cfg.sftp_private_key_passphrase,
+        remote_dir=cfg.sftp_remote_dir,
+    )
 
 
 def sftp_upload_stream(cfg: Config, stream: DeterministicStream, remote_path: str, total_size: int) -> None:
-    t, sftp = connect_sftp(cfg)
-    try:
+    with sftp_session(sftp_conn(cfg)) as sftp:
         LOG.info("Uploading to SFTP (stream): %s (size=%d bytes)", remote_path, total_size)
 
         last_log = 0
@@ -348,46 +368,26 @@ def sftp_upload_stream(cfg: Config, stream: DeterministicStream, remote_path: st
 
         sftp.putfo(stream, remote_path, file_size=total_size, callback=cb, confirm=True)
         LOG.info("SFTP upload complete")
-    finally:
-        try:
-            sftp.close()
-        except Exception:
-            pass
-        t.close()
+        LOG.info("Generator: generated=%d delivered=%d amplification=%.2fx",
+                 stream.generated_bytes, stream.delivered_bytes, stream.amplification)
 
 
 def sftp_delete(cfg: Config, remote_path: str) -> None:
-    t, sftp = connect_sftp(cfg)
-    try:
+    with sftp_session(sftp_conn(cfg)) as sftp:
         LOG.info("Deleting remote SFTP file: %s", remote_path)
         sftp.remove(remote_path)
-    finally:
-        try:
-            sftp.close()
-        except Exception:
-            pass
-        t.close()
 
 
 # -----------------------------
 # S3
 # -----------------------------
 def s3_client(cfg: Config):
-    return boto3.client("s3", region_name=cfg.aws_region)
-
-
-def s3_head(cfg: Config, key: str) -> dict:
-    return s3_client(cfg).head_object(Bucket=cfg.s3_bucket, Key=key)
-
-
-def s3_get_range(cfg: Config, key: str, start: int, length: int) -> bytes:
-    end = start + length - 1
-    resp = s3_client(cfg).get_object(
-        Bucket=cfg.s3_bucket,
-        Key=key,
-        Range=f"bytes={start}-{end}",
+    return get_s3_client(
+        cfg.aws_region,
+        endpoint_url=cfg.s3_endpoint_url,
+        profile=cfg.aws_profile,
+        config=client_config(cfg.s3_max_pool_connections),
     )
-    return resp["Body"].read()
 
 
 def s3_delete(cfg: Config, key: str) -> None:
@@ -395,97 +395,93 @@ def s3_delete(cfg: Config, key: str) -> None:
     s3_client(cfg).delete_object(Bucket=cfg.s3_bucket, Key=key)
 
 
-def s3_wait_for_object(cfg: Config, key: str) -> dict:
-    deadline = time.time() + cfg.wait_timeout_seconds
-    last_err = None
-    while time.time() < deadline:
-        try:
-            meta = s3_head(cfg, key)
-            return meta
-        except botocore.exceptions.ClientError as e:
-            code = e.response.get("Error", {}).get("Code")
-            if code in ("404", "NoSuchKey", "NotFound"):
-                last_err = e
-                LOG.info("Not in S3 yet (%s). Sleeping %ss...", key, cfg.poll_interval_seconds)
-                time.sleep(cfg.poll_interval_seconds)
-                continue
-            raise
-    raise TimeoutError(f"Timed out waiting for s3://{cfg.s3_bucket}/{key}. Last error: {last_err}")
-
-
-def s3_wait_until_stable_size(cfg: Config, key: str) -> int:
+def sqs_client(cfg: Config):
+    return get_client("sqs", cfg.aws_region, endpoint_url=cfg.sqs_endpoint_url, profile=cfg.aws_profile)
+
+
+async def s3_wait_until_stable_size(cfg: Config, key: str) -> Arrival:
     """
-    Some pipelines write multi-part uploads; this waits for ContentLength
-    to be the expected size and remain unchanged for N polls.
+    Waits for the object to reach the expected size. Completes on a matching
+    ObjectCreated event when S3_EVENTS_QUEUE_URL is set; otherwise (and as a
+    fallback) polls with backoff until the size/ETag held for N polls.
     """
-    stable = 0
-    last_size = None
-    deadline = time.time() + cfg.wait_timeout_seconds
-
-    while time.time() < deadline:
-        meta = s3_wait_for_object(cfg, key)
-        size = int(meta.get("ContentLength", -1))
-        LOG.info("S3 size observed: %d bytes (expected=%d)", size, cfg.size_bytes)
-
-        if size == cfg.size_bytes:
-            if last_size == size:
-                stable += 1
-            else:
-                stable = 1
-            last_size = size
+    arrival = await wait_for_s3_object_async(
+        s3_client(cfg), cfg.s3_bucket, key, cfg.size_bytes,
+        timeout_seconds=cfg.wait_timeout_seconds,
+        sqs=sqs_client(cfg) if cfg.s3_events_queue_url else None,
+        queue_url=cfg.s3_events_queue_url,
+        stable_polls=cfg.stable_polls_required,
+        poll_initial_seconds=cfg.poll_initial_seconds,
+        poll_max_seconds=cfg.poll_interval_seconds,
+    )
+    if arrival.source == "poll":
+        LOG.info("S3 object size stable for %d polls ✅", cfg.stable_polls_required)
+    return arrival
+
+
+def batch_waiter(cfg: Config):
+    return get_batch_waiter(
+        s3_client(cfg),
+        interval_seconds=cfg.sweep_interval_seconds,
+        max_workers=cfg.discovery_workers,
+        shard_depth=cfg.discovery_shard_depth,
+        hot_window_seconds=cfg.discovery_hot_window_seconds,
+        max_keys=cfg.discovery_max_keys,
+    )
 
-            if stable >= cfg.stable_polls_required:
-                LOG.info("S3 object size stable for %d polls ✅", stable)
-                return size
-        else:
-            stable = 0
-            last_size = size
 
-        time.sleep(cfg.poll_interval_seconds)
+async def s3_wait_by_sweep(cfg: Config, key: Optional[str], filename: str) -> Arrival:
+    """
+    Waits through the shared listing-sweep waiter: for `key`, or (discover
+    mode) for `filename` anywhere under the prefix.
+    """
+    return await batch_waiter(cfg).wait_async(
+        cfg.s3_bucket, cfg.size_bytes, cfg.wait_timeout_seconds,
+        key=key,
+        filename=None if key else filename,
+        prefix=None if key else (cfg.s3_prefix or ""),
+    )
+
 
-    raise TimeoutError(f"Timed out waiting for stable expected size on s3://{cfg.s3_bucket}/{key}")
+def record_arrival(run: RunRecord, arrival: Arrival) -> None:
+    """Splits an arrival wait into pipeline latency to first appearance and stabilization."""
+    first_seen = arrival.first_seen_seconds if arrival.first_seen_seconds is not None else arrival.seconds
+    run.record("first_appearance", first_seen, requests=arrival.head_calls + arrival.sqs_receives)
+    run.record("stabilization", arrival.seconds - first_seen, bytes=arrival.size)
+
+
+def discovery_index(cfg: Config):
+    return get_discovery_index(
+        s3_client(cfg), cfg.s3_bucket, cfg.s3_prefix or "",
+        shard_depth=cfg.discovery_shard_depth,
+        max_workers=cfg.discovery_workers,
+        hot_window_seconds=cfg.discovery_hot_window_seconds,
+        max_keys=cfg.discovery_max_keys,
+    )
 
 
 def discover_s3_key_by_filename(cfg: Config, filename: str) -> str:
     """
-    Searches under cfg.s3_prefix for objects that end with the given filename.
+    Finds the key under cfg.s3_prefix whose last path segment is `filename`.
     Good when the pipeline adds date/user folders but preserves the filename.
+    Backed by a shared incremental index, so repeated calls only list what changed.
     """
-    s3 = s3_client(cfg)
-    prefix = cfg.s3_prefix or ""
-    paginator = s3.get_paginator("list_objects_v2")
-
-    best_key = None
-    best_last_modified = None
-
-    LOG.info("Discovering S3 key under prefix '%s' for filename '%s' ...", prefix, filename)
-
-    for page in paginator.paginate(Bucket=cfg.s3_bucket, Prefix=prefix):
-        for obj in page.get("Contents", []):
-            k = obj["Key"]
-            if k.endswith("/" + filename) or k.endswith(filename):
-                lm = obj.get("LastModified")
-                if best_last_modified is None or (lm and lm > best_last_modified):
-                    best_key = k
-                    best_last_modified = lm
+    LOG.info("Discovering S3 key under prefix '%s' for filename '%s' ...", cfg.s3_prefix or "", filename)
+    key = discovery_index(cfg).find(filename)
+    if not key:
+        raise FileNotFoundError(f"Could not discover S3 key for filename '{filename}' under prefix '{cfg.s3_prefix or ''}'")
 
-    if not best_key:
-        raise FileNotFoundError(f"Could not discover S3 key for filename '{filename}' under prefix '{prefix}'")
+    LOG.info("Discovered S3 key: %s", key)
+    return key
 
-    LOG.info("Discovered S3 key: %s", best_key)
-    return best_key
 
-
-# -----------------------------
-# Main test flow
-# -----------------------------
 def build_remote_path(cfg: Config, filename: str) -> str:
     if cfg.sftp_remote_dir == "/":
         return f"/{filename}"
     return f"{cfg.sftp_remote_dir}/{filename}"
 
 
-def main() -> int:
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="E2E Test: SFTP (key auth) -> S3")
     parser.add_argument("--env-file", default=os.getenv("ENV_FILE"), help="Path to .env file (optional)")
     parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "INFO"))
@@ -497,11 +493,14 @@ def main() -> int:
     parser.add_argument("--sftp-private-key-path")
     parser.add_argument("--sftp-private-key-passphrase")
     parser.add_argument("--sftp-remote-dir")
+    parser.add_argument("--upload-parallelism", help="Concurrent SFTP channels for the upload (1 = single stream). Default SFTP_UPLOAD_PARALLELISM")
 
     # S3
     parser.add_argument("--aws-region")
     parser.add_argument("--s3-bucket")
     parser.add_argument("--s3-prefix")
+    parser.add_argument("--s3-endpoint-url", help="Custom S3 endpoint (e.g. local stand-in). Default S3_ENDPOINT_URL")
+    parser.add_argument("--aws-profile", help="AWS profile name. Default AWS_PROFILE")
 
     # Mapping
     parser.add_argument("--s3-key-mode", choices=["exact", "discover"], help="exact: prefix+filename or exact key; discover: search by filename under prefix")
@@ -509,11 +508,15 @@ def main() -> int:
 
     # Size/waiting
     parser.add_argument("--size", help="Test size e.g. 50MB, 1GB, 20GiB (or bytes). Default from TEST_SIZE env.")
+    parser.add_argument("--pattern-version", help="Deterministic payload pattern version (1=legacy, 2=fast). Default PATTERN_VERSION")
     parser.add_argument("--wait-timeout", help="Seconds. Default from WAIT_TIMEOUT_SECONDS")
-    parser.add_argument("--poll-interval", help="Seconds. Default from POLL_INTERVAL_SECONDS")
+    parser.add_argument("--poll-interval", help="Max seconds between backoff polls. Default from POLL_INTERVAL_SECONDS")
+    parser.add_argument("--s3-wait-mode", choices=["head", "sweep"], help="head: per-object HEAD polling/events; sweep: shared listing sweeps. Default S3_WAIT_MODE")
+    parser.add_argument("--s3-events-queue-url", help="SQS queue receiving S3 ObjectCreated notifications. Default S3_EVENTS_QUEUE_URL")
     parser.add_argument("--stable-polls", help="How many consecutive polls size must be stable. Default STABLE_POLLS_REQUIRED")
 
-    # Spot checks
+    # Verification
+    parser.add_argument("--verify", choices=VERIFY_MODES, help="spot: ranged spot checks; full: hash the whole object; checksum: compare the S3-stored checksum. Default VERIFY_MODE")
     parser.add_argument("--spot-checks", help="Number of spot checks. Default SPOT_CHECKS")
     parser.add_argument("--spot-check-bytes", help="Bytes per check. Default SPOT_CHECK_BYTES")
 
@@ -525,13 +528,101 @@ def main() -> int:
     parser.add_argument("--cleanup-s3", action="store_true", help="Delete S3 object after test")
     parser.add_argument("--no-cleanup-s3", dest="cleanup_s3", action="store_false")
     parser.set_defaults(cleanup_s3=None)
+    return parser
 
-    args = parser.parse_args()
 
-    cfg = load_config(args)
-    setup_logging(cfg.log_level)
+def run_test(cfg: Config) -> Dict[str, object]:
+    """
+    One SFTP -> S3 probe. Raises on failure; cleans up its own files. Shared
+    pools are left open so that many probes can run in one process.
+    """
+    return asyncio.run(run_test_async(cfg))
+
+
+async def run_test_async(cfg: Config) -> Dict[str, object]:
+    """run_test as a coroutine, for runners that drive many probes on one event loop."""
+    await asyncio.to_thread(use_fixture, cfg.fixture_cache_dir, cfg.fixture_cache_quota,
+                            cfg.pattern_version, cfg.size_bytes)
+    calls_before = S3_CALLS.snapshot()
+    fingerprint = {
+        "pattern_version": cfg.pattern_version,
+        "sftp": f"{cfg.sftp_username}@{cfg.sftp_host}:{cfg.sftp_port}{cfg.sftp_remote_dir}",
+    }
+    try:
+        with checkpointed_run(cfg.checkpoint_file, cfg.checkpoint_min_size, "sftp-s3", cfg.size_bytes,
+                              fingerprint) as checkpoints, \
+                METRICS.run("sftp-s3", checkpoints.test_id, cfg.size_bytes) as run:
+            return await _run_test(cfg, run, checkpoints)
+    finally:
+        log_summary(LOG, S3_CALLS.since(calls_before), "S3 calls this run")
+
+
+def upload_test_file(cfg: Config, run: RunRecord, checkpoints: RunCheckpoints, seed: bytes, remote_path: str) -> None:
+    with run.phase("upload", bytes=cfg.size_bytes):
+        checkpoint = checkpoints.transfer("upload")
+        if cfg.sftp_upload_parallelism > 1 or checkpoint is not None:
+            # Checkpointed single streams go through here too: the .part
+            # name keeps the pipeline off a file a failed run left behind.
+            parallel_sftp_upload(
+                sftp_conn(cfg), remote_path, seed, cfg.size_bytes,
+                parallelism=cfg.sftp_upload_parallelism,
+                version=cfg.pattern_version,
+                checkpoint=checkpoint,
+            )
+        else:
+            stream = DeterministicStream(seed=seed, total_size=cfg.size_bytes, version=cfg.pattern_version)
+            sftp_upload_stream(cfg, stream, remote_path, cfg.size_bytes)
 
-    test_id = uuid.uuid4().hex
+
+async def discover_key(cfg: Config, run: RunRecord, filename: str) -> str:
+    """discover_s3_key_by_filename, retried on the same backoff as arrival polling."""
+    with run.phase("discovery") as phase:
+        deadline = time.time() + cfg.wait_timeout_seconds
+        delays = backoff_delays(cfg.poll_initial_seconds, cfg.poll_interval_seconds)
+        while time.time() < deadline:
+            phase.requests += 1
+            try:
+                return await endpoint_io(s3_endpoint(cfg.s3_bucket), discover_s3_key_by_filename, cfg, filename,
+                                         slot=False)
+            except FileNotFoundError:
+                delay = next(delays)
+                LOG.info("Discovery: not found yet. Sleeping %.1fs...", delay)
+                await asyncio.sleep(delay)
+        raise TimeoutError("Timed out discovering S3 key by filename")
+
+
+def verify_s3_object(cfg: Config, run: RunRecord, seed: bytes, final_key: str) -> None:
+    """Spot-check ranges, the full object, or the stored checksum."""
+    with run.phase(f"verify_{cfg.verify_mode}") as phase:
+        if cfg.verify_mode == "checksum":
+            result = s3_verify_stored_checksum(
+                s3_client(cfg), cfg.s3_bucket, final_key, seed, cfg.size_bytes, cfg.pattern_version,
+                part_size=cfg.verify_part_size, concurrency=cfg.verify_concurrency,
+            )
+            if "bytes" in result:  # read in full: the stored algorithm is unsupported here
+                phase.bytes, phase.requests = result["bytes"], result["parts"]
+            else:
+                phase.requests = 1
+        elif cfg.verify_mode == "full":
+            LOG.info("Running full verification (%d-byte parts)...", cfg.verify_part_size)
+            result = s3_verify_full(
+                s3_client(cfg), cfg.s3_bucket, final_key, seed, cfg.size_bytes, cfg.pattern_version,
+                part_size=cfg.verify_part_size, concurrency=cfg.verify_concurrency,
+            )
+            phase.bytes, phase.requests = cfg.size_bytes, result["parts"]
+        else:
+            check_len = min(cfg.spot_check_bytes, cfg.size_bytes)
+            offsets = choose_offsets(cfg.size_bytes, cfg.spot_checks, check_len, seed)
+            LOG.info("Running %d spot checks (%d bytes each)...", len(offsets), check_len)
+            result = s3_spot_check(
+                s3_client(cfg), [(cfg.s3_bucket, final_key)], seed, offsets, check_len,
+                cfg.size_bytes, cfg.pattern_version, concurrency=cfg.spot_check_concurrency,
+            )
+            phase.bytes, phase.requests = result["checks"] * check_len, result["checks"]
+
+
+async def _run_test(cfg: Config, run: RunRecord, checkpoints: RunCheckpoints) -> Dict[str, object]:
+    test_id = run.test_id
     filename = f"sftp-s3-test-{test_id}.bin"
 
     # Seed drives deterministic bytes + deterministic spot check offsets
@@ -552,6 +643,7 @@ def main() -> int:
     LOG.info("Test ID: %s", test_id)
     LOG.info("File: %s", filename)
     LOG.info("Size bytes: %d", cfg.size_bytes)
+    LOG.info("Payload pattern: v%d", cfg.pattern_version)
     LOG.info("SFTP: %s@%s:%d  remote=%s", cfg.sftp_username, cfg.sftp_host, cfg.sftp_port, remote_path)
     LOG.info("S3: bucket=%s prefix=%s mode=%s", cfg.s3_bucket, cfg.s3_prefix, cfg.s3_key_mode)
     if expected_key:
@@ -560,49 +652,38 @@ def main() -> int:
     uploaded = False
     final_key = None
 
+    sftp_ep = sftp_endpoint(cfg.sftp_host, cfg.sftp_port)
+    s3_ep = s3_endpoint(cfg.s3_bucket)
+    start = time.time()
+
     try:
         # 1) Upload stream to SFTP
-        stream = DeterministicStream(seed=seed, total_size=cfg.size_bytes)
-        sftp_upload_stream(cfg, stream, remote_path, cfg.size_bytes)
+        await endpoint_io(sftp_ep, upload_test_file, cfg, run, checkpoints, seed, remote_path)
         uploaded = True
 
         # 2) Determine S3 key (exact or discover)
-        if cfg.s3_key_mode == "discover":
-            # Wait a bit before discovery attempts
-            deadline = time.time() + cfg.wait_timeout_seconds
-            while time.time() < deadline:
-                try:
-                    final_key = discover_s3_key_by_filename(cfg, filename)
-                    break
-                except FileNotFoundError:
-                    LOG.info("Discovery: not found yet. Sleeping %ss...", cfg.poll_interval_seconds)
-                    time.sleep(cfg.poll_interval_seconds)
-            if not final_key:
-                raise TimeoutError("Timed out discovering S3 key by filename")
+        if cfg.s3_wait_mode == "sweep":
+            # One step: listing sweeps both find the key and confirm its size
+            arrival = await s3_wait_by_sweep(cfg, expected_key, filename)
+            record_arrival(run, arrival)
+            final_key = arrival.key
+        elif cfg.s3_key_mode == "discover":
+            final_key = await discover_key(cfg, run, filename)
         else:
             final_key = expected_key
 
         # 3) Wait for object + stable expected size
-        s3_wait_until_stable_size(cfg, final_key)
+        if cfg.s3_wait_mode != "sweep":
+            record_arrival(run, await s3_wait_until_stable_size(cfg, final_key))
 
-        # 4) Spot-check ranges
-        check_len = min(cfg.spot_check_bytes, cfg.size_bytes)
-        offsets = choose_offsets(cfg.size_bytes, cfg.spot_checks, check_len, seed)
-        LOG.info("Running %d spot checks (%d bytes each)...", len(offsets), check_len)
-
-        for idx, off in enumerate(offsets, 1):
-            expected = expected_bytes(seed, off, check_len, cfg.size_bytes)
-            actual = s3_get_range(cfg, final_key, off, check_len)
-            if actual != expected:
-                raise AssertionError(f"Spot-check failed at offset={off} (check {idx}/{len(offsets)})")
-            LOG.info("Spot-check %d/%d ✅ (offset=%d)", idx, len(offsets), off)
+        # 4) Verify content
+        await endpoint_io(s3_ep, verify_s3_object, cfg, run, seed, final_key)
 
         LOG.info("✅ PASS: Verified SFTP -> S3 end-to-end")
         LOG.info("S3 object: s3://%s/%s", cfg.s3_bucket, final_key)
-        return 0
+        return {"test_id": test_id, "key": final_key, "bytes": cfg.size_bytes, "seconds": time.time() - start}
 
-    except Exception as e:
-        LOG.error("❌ FAIL: %s", str(e))
+    except Exception:
         # Print helpful context for troubleshooting
         try:
             ctx = {
@@ -616,22 +697,50 @@ def main() -> int:
             LOG.error("Context: %s", json.dumps(ctx, default=str))
         except Exception:
             pass
-        return 2
+        raise
 
     finally:
         # Optional cleanup
-        if cfg.cleanup_remote_sftp and uploaded:
-            try:
-                sftp_delete(cfg, remote_path)
-            except Exception as ce:
-                LOG.warning("Cleanup SFTP failed: %s", ce)
+        with run.phase("cleanup") as phase:
+            if cfg.cleanup_remote_sftp and uploaded:
+                try:
+                    phase.requests += 1
+                    await endpoint_io(sftp_ep, sftp_delete, cfg, remote_path)
+                except Exception as ce:
+                    LOG.warning("Cleanup SFTP failed: %s", ce)
+
+            if cfg.cleanup_s3_object and final_key:
+                try:
+                    phase.requests += 1
+                    await endpoint_io(s3_ep, s3_delete, cfg, final_key)
+                except Exception as ce:
+                    LOG.warning("Cleanup S3 failed: %s", ce)
 
-        if cfg.cleanup_s3_object and final_key:
-            try:
-                s3_delete(cfg, final_key)
-            except Exception as ce:
-                LOG.warning("Cleanup S3 failed: %s", ce)
 
+def main() -> int:
+    args = build_parser().parse_args()
+
+    cfg = load_config(args)
+    setup_logging(cfg.log_level)
+
+    try:
+        run_test(cfg)
+        return 0
+
+    except Exception as e:
+        LOG.error("❌ FAIL: %s", str(e))
+        return 2
+
+    finally:
+        stats = connection_stats()
+        LOG.info("S3 clients=%d connections_opened=%d", stats["clients"], stats["connections_opened"])
+        if cfg.s3_wait_mode == "sweep":
+            LOG.info("Batch waiter: %s", batch_waiter(cfg).stats())
+        elif cfg.s3_key_mode == "discover":
+            LOG.info("Discovery index: %s", discovery_index(cfg).stats())
+        LOG.info("SFTP pool: %s", POOL.stats())
+        POOL.close_all()
+        METRICS.export()
         LOG.info("=== TEST END ===")
 
 
@@ -5,12 +5,13 @@ Production-ready SFTP -> SFTP E2E test (1MB..20GB) for EC2.
 Flow:
 1) Generate deterministic byte stream (no big local files)
 2) Upload to SOURCE SFTP (key auth)
-3) Stream copy SOURCE -> TARGET (SFTP read streaming -> SFTP write streaming)
+3) Stream copy SOURCE -> TARGET (pipelined reader -> bounded ring -> pipelined writer)
 4) Verify TARGET:
    - exists
    - size matches
    - optional stability check (size unchanged N polls)
-   - byte-range spot checks (download tiny ranges and compare to expected bytes)
+   - byte-range spot checks (download tiny ranges and compare to expected bytes),
+     or with VERIFY_MODE=full / --verify full a hash tree of the whole file
 5) Optional cleanup on source/target.
 
 Notes:
@@ -21,15 +22,43 @@ Notes:
 import os
 import sys
 import time
-import uuid
+import asyncio
 import logging
 import hashlib
 import argparse
 from dataclasses import dataclass
-from typing import Optional, Tuple, List
+from typing import Dict, Optional
 
 import paramiko
 
+from e2e_fixture import DEFAULT_FIXTURE_QUOTA, parse_fixture_dir, use_fixture
+from e2e_limits import endpoint_io, sftp_endpoint
+from e2e_metrics import METRICS, RunRecord
+from e2e_payload import (
+    DEFAULT_PATTERN_VERSION,
+    DeterministicStream,
+    choose_offsets,
+    parse_pattern_version,
+)
+from e2e_resume import (
+    DEFAULT_CHECKPOINT_FILE,
+    DEFAULT_CHECKPOINT_MIN_SIZE,
+    Checkpoint,
+    RunCheckpoints,
+    checkpointed_run,
+    parse_checkpoint_file,
+)
+from e2e_sftp import POOL, SFTPConn, sftp_session
+from e2e_transfer import DEFAULT_RING_BUFFERS, parallel_sftp_upload, relay_sftp_to_sftp
+from e2e_verify import (
+    DEFAULT_FULL_VERIFY_CONCURRENCY,
+    DEFAULT_TREE_PART_SIZE,
+    SFTP_VERIFY_MODES,
+    parse_verify_mode,
+    sftp_spot_check,
+    sftp_verify_full,
+)
+
 try:
     from dotenv import load_dotenv
 except Exception:
@@ -94,16 +123,6 @@ def parse_size(size_str: str) -> int:
 # -----------------------------
 # Config
 # -----------------------------
-@dataclass
-class SFTPConn:
-    host: str
-    port: int
-    username: str
-    private_key_path: str
-    private_key_passphrase: Optional[str]
-    remote_dir: str
-
-
 @dataclass
 class Config:
     src: SFTPConn
@@ -111,17 +130,29 @@ class Config:
 
     size_bytes: int
     io_chunk_bytes: int
+    pattern_version: int
+    upload_parallelism: int
+    relay_ring_buffers: int
 
     wait_timeout_seconds: int
     poll_interval_seconds: int
     stable_polls_required: int
 
+    verify_mode: str
     spot_checks: int
     spot_check_bytes: int
+    verify_part_size: int
+    verify_concurrency: int
 
     cleanup_src: bool
     cleanup_tgt: bool
 
+    checkpoint_file: Optional[str]
+    checkpoint_min_size: int
+
+    fixture_cache_dir: Optional[str]
+    fixture_cache_quota: int
+
     log_level: str
 
 
@@ -155,17 +186,28 @@ def load_config(args: argparse.Namespace) -> Config:
 
     size_bytes = parse_size(os.getenv("TEST_SIZE", "1MB"))
     io_chunk_bytes = int(os.getenv("IO_CHUNK_BYTES", str(1024 * 1024)))
+    pattern_version = parse_pattern_version(os.getenv("PATTERN_VERSION", str(DEFAULT_PATTERN_VERSION)))
+    upload_parallelism = int(os.getenv("SFTP_UPLOAD_PARALLELISM", "1"))
+    relay_ring_buffers = int(os.getenv("RELAY_RING_BUFFERS", str(DEFAULT_RING_BUFFERS)))
 
     wait_timeout_seconds = int(os.getenv("WAIT_TIMEOUT_SECONDS", "3600"))
     poll_interval_seconds = int(os.getenv("POLL_INTERVAL_SECONDS", "5"))
     stable_polls_required = int(os.getenv("STABLE_POLLS_REQUIRED", "3"))
 
+    verify_mode = parse_verify_mode(args.verify or os.getenv("VERIFY_MODE", "spot"), SFTP_VERIFY_MODES)
     spot_checks = int(os.getenv("SPOT_CHECKS", "8"))
     spot_check_bytes = int(os.getenv("SPOT_CHECK_BYTES", str(256 * 1024)))
+    verify_part_size = parse_size(os.getenv("VERIFY_PART_SIZE", str(DEFAULT_TREE_PART_SIZE)))
+    verify_concurrency = int(os.getenv("VERIFY_CONCURRENCY", str(DEFAULT_FULL_VERIFY_CONCURRENCY)))
 
     cleanup_src = env_bool("CLEANUP_SRC", False)
     cleanup_tgt = env_bool("CLEANUP_TGT", False)
 
+    checkpoint_file = parse_checkpoint_file(os.getenv("CHECKPOINT_FILE", DEFAULT_CHECKPOINT_FILE))
+    checkpoint_min_size = parse_size(os.getenv("CHECKPOINT_MIN_SIZE", str(DEFAULT_CHECKPOINT_MIN_SIZE)))
+    fixture_cache_dir = parse_fixture_dir(os.getenv("FIXTURE_CACHE_DIR"))
+    fixture_cache_quota = parse_size(os.getenv("FIXTURE_CACHE_QUOTA", str(DEFAULT_FIXTURE_QUOTA)))
+
     log_level = os.getenv("LOG_LEVEL", "INFO")
 
     return Config(
@@ -173,126 +215,30 @@ def load_config(args: argparse.Namespace) -> Config:
         tgt=tgt,
         size_bytes=size_bytes,
         io_chunk_bytes=io_chunk_bytes,
+        pattern_version=pattern_version,
+        upload_parallelism=upload_parallelism,
+        relay_ring_buffers=relay_ring_buffers,
         wait_timeout_seconds=wait_timeout_seconds,
         poll_interval_seconds=poll_interval_seconds,
         stable_polls_required=stable_polls_required,
+        verify_mode=verify_mode,
         spot_checks=spot_checks,
         spot_check_bytes=spot_check_bytes,
+        verify_part_size=verify_part_size,
+        verify_concurrency=verify_concurrency,
         cleanup_src=cleanup_src,
         cleanup_tgt=cleanup_tgt,
+        checkpoint_file=checkpoint_file,
+        checkpoint_min_size=checkpoint_min_size,
+        fixture_cache_dir=fixture_cache_dir,
+        fixture_cache_quota=fixture_cache_quota,
         log_level=log_level,
     )
 
 
-# -----------------------------
-# Deterministic content generator
-# -----------------------------
-CHUNK = 1024 * 1024  # 1 MiB
-
-def _chunk_bytes(seed: bytes, chunk_index: int, chunk_len: int) -> bytes:
-    out = bytearray()
-    ctr = 0
-    while len(out) < chunk_len:
-        h = hashlib.blake2b(digest_size=64)
-        h.update(seed)
-        h.update(chunk_index.to_bytes(8, "big"))
-        h.update(ctr.to_bytes(8, "big"))
-        out.extend(h.digest())
-        ctr += 1
-    return bytes(out[:chunk_len])
-
-
-def expected_bytes(seed: bytes, offset: int, length: int, total_size: int) -> bytes:
-    if offset < 0 or length < 0 or offset + length > total_size:
-        raise ValueError("Range out of bounds")
-
-    start_chunk = offset // CHUNK
-    end_offset = offset + length
-    end_chunk = (end_offset - 1) // CHUNK
-
-    remaining = length
-    pos = offset
-    pieces = []
-
-    for ci in range(start_chunk, end_chunk + 1):
-        chunk_start = ci * CHUNK
-        chunk_end = min(chunk_start + CHUNK, total_size)
-        this_len = chunk_end - chunk_start
-
-        data = _chunk_bytes(seed, ci, this_len)
-        s = max(0, pos - chunk_start)
-        e = min(this_len, s + remaining)
-        pieces.append(data[s:e])
-
-        took = e - s
-        remaining -= took
-        pos += took
-
-    return b"".join(pieces)
-
-
-class DeterministicStream:
-    """
-    Sequential read stream for upload to source SFTP.
-    """
-    def __init__(self, seed: bytes, total_size: int):
-        self.seed = seed
-        self.total_size = total_size
-        self.pos = 0
-
-    def read(self, n: int = -1) -> bytes:
-        if self.pos >= self.total_size:
-            return b""
-        if n is None or n < 0:
-            n = self.total_size - self.pos
-        n = min(n, self.total_size - self.pos)
-        data = expected_bytes(self.seed, self.pos, n, self.total_size)
-        self.pos += n
-        return data
-
-
-def choose_offsets(total_size: int, checks: int, bytes_per_check: int, seed: bytes) -> List[int]:
-    if total_size <= bytes_per_check:
-        return [0]
-    offsets = {0, max(0, total_size - bytes_per_check)}
-    i = 0
-    while len(offsets) < max(2, checks):
-        h = hashlib.blake2b(digest_size=8)
-        h.update(seed)
-        h.update(i.to_bytes(8, "big"))
-        off = int.from_bytes(h.digest(), "big") % (total_size - bytes_per_check + 1)
-        offsets.add(off)
-        i += 1
-    return sorted(list(offsets))[:checks]
-
-
 # -----------------------------
 # SFTP connect + ops (key auth)
 # -----------------------------
-def _load_private_key(path: str, passphrase: Optional[str]) -> paramiko.PKey:
-    loaders = [
-        paramiko.Ed25519Key.from_private_key_file,
-        paramiko.RSAKey.from_private_key_file,
-        paramiko.ECDSAKey.from_private_key_file,
-        paramiko.DSSKey.from_private_key_file,
-    ]
-    last = None
-    for loader in loaders:
-        try:
-            return loader(path, password=passphrase)
-        except Exception as e:
-            last = e
-    raise RuntimeError(f"Unable to load private key from {path}. Last error: {last}")
-
-
-def connect_sftp(conn: SFTPConn) -> Tuple[paramiko.Transport, paramiko.SFTPClient]:
-    t = paramiko.Transport((conn.host, conn.port))
-    pkey = _load_private_key(conn.private_key_path, conn.private_key_passphrase)
-    t.connect(username=conn.username, pkey=pkey)
-    sftp = paramiko.SFTPClient.from_transport(t)
-    return t, sftp
-
-
 def remote_path(conn: SFTPConn, filename: str) -> str:
     if conn.remote_dir == "/":
         return f"/{filename}"
@@ -303,17 +249,24 @@ def sftp_stat_size(sftp: paramiko.SFTPClient, path: str) -> int:
     return int(sftp.stat(path).st_size)
 
 
-def sftp_wait_until_stable_size(cfg: Config, sftp: paramiko.SFTPClient, path: str) -> int:
+def sftp_path_size(conn: SFTPConn, path: str) -> int:
+    with sftp_session(conn) as sftp:
+        return sftp_stat_size(sftp, path)
+
+
+async def sftp_wait_until_stable_size(cfg: Config, conn: SFTPConn, path: str) -> int:
+    """Polls the size between asyncio sleeps; each stat borrows a pooled channel."""
+    endpoint = sftp_endpoint(conn.host, conn.port)
     deadline = time.time() + cfg.wait_timeout_seconds
     stable = 0
     last = None
 
     while time.time() < deadline:
         try:
-            size = sftp_stat_size(sftp, path)
+            size = await endpoint_io(endpoint, sftp_path_size, conn, path, slot=False)
         except FileNotFoundError:
             LOG.info("Target not found yet. Sleeping %ss...", cfg.poll_interval_seconds)
-            time.sleep(cfg.poll_interval_seconds)
+            await asyncio.sleep(cfg.poll_interval_seconds)
             continue
 
         LOG.info("Target size observed: %d bytes (expected=%d)", size, cfg.size_bytes)
@@ -331,145 +284,141 @@ def sftp_wait_until_stable_size(cfg: Config, sftp: paramiko.SFTPClient, path: st
             stable = 0
             last = size
 
-        time.sleep(cfg.poll_interval_seconds)
+        await asyncio.sleep(cfg.poll_interval_seconds)
 
     raise TimeoutError(f"Timed out waiting for stable expected size on target: {path}")
 
 
 def sftp_delete(conn: SFTPConn, path: str) -> None:
-    t, sftp = connect_sftp(conn)
-    try:
+    with sftp_session(conn) as sftp:
         LOG.info("Deleting %s:%s", conn.host, path)
         sftp.remove(path)
-    finally:
-        try:
-            sftp.close()
-        except Exception:
-            pass
-        t.close()
 
 
 # -----------------------------
 # Transfer logic
 # -----------------------------
-def upload_to_source(cfg: Config, seed: bytes, src_path: str) -> None:
-    t, sftp = connect_sftp(cfg.src)
-    try:
+def upload_to_source(cfg: Config, seed: bytes, src_path: str, checkpoint: Optional[Checkpoint] = None) -> None:
+    if cfg.upload_parallelism > 1 or checkpoint is not None:
+        parallel_sftp_upload(
+            cfg.src, src_path, seed, cfg.size_bytes,
+            parallelism=cfg.upload_parallelism,
+            version=cfg.pattern_version,
+            io_chunk_bytes=cfg.io_chunk_bytes,
+            checkpoint=checkpoint,
+        )
+        return
+
+    with sftp_session(cfg.src) as sftp:
         LOG.info("Uploading to SOURCE: %s:%s (size=%d)", cfg.src.host, src_path, cfg.size_bytes)
-        stream = DeterministicStream(seed, cfg.size_bytes)
+        stream = DeterministicStream(seed, cfg.size_bytes, cfg.pattern_version)
+        buf = memoryview(bytearray(cfg.io_chunk_bytes))
         with sftp.open(src_path, "wb") as f:
             written = 0
             last_log = time.time()
             while True:
-                chunk = stream.read(cfg.io_chunk_bytes)
-                if not chunk:
+                n = stream.readinto(buf)
+                if not n:
                     break
-                f.write(chunk)
-                written += len(chunk)
+                f.write(buf[:n])
+                written += n
                 now = time.time()
                 if now - last_log >= 10:
                     LOG.info("Source upload progress: %.2f%% (%d/%d)", 100.0 * written / cfg.size_bytes, written, cfg.size_bytes)
                     last_log = now
         LOG.info("Source upload complete ✅")
-    finally:
-        try:
-            sftp.close()
-        except Exception:
-            pass
-        t.close()
-
-
-def stream_copy_source_to_target(cfg: Config, src_path: str, tgt_path: str) -> None:
-    src_t, src_sftp = connect_sftp(cfg.src)
-    tgt_t, tgt_sftp = connect_sftp(cfg.tgt)
-    try:
-        LOG.info("Streaming copy SOURCE -> TARGET")
-        LOG.info("  SOURCE: %s:%s", cfg.src.host, src_path)
-        LOG.info("  TARGET: %s:%s", cfg.tgt.host, tgt_path)
-
-        start = time.time()
-        transferred = 0
-        last_log = time.time()
-
-        with src_sftp.open(src_path, "rb") as rf, tgt_sftp.open(tgt_path, "wb") as wf:
-            while True:
-                data = rf.read(cfg.io_chunk_bytes)
-                if not data:
-                    break
-                wf.write(data)
-                transferred += len(data)
-                now = time.time()
-                if now - last_log >= 10:
-                    rate = transferred / max(1e-9, (now - start))
-                    LOG.info(
-                        "Copy progress: %.2f%% (%d/%d)  rate=%.2f MB/s",
-                        100.0 * transferred / cfg.size_bytes,
-                        transferred,
-                        cfg.size_bytes,
-                        rate / (1024 * 1024),
-                    )
-                    last_log = now
-
-        elapsed = time.time() - start
-        LOG.info("Copy complete ✅  transferred=%d bytes  time=%.1fs  avg=%.2f MB/s",
-                 transferred, elapsed, (transferred / max(1e-9, elapsed)) / (1024 * 1024))
+        LOG.info("Generator: generated=%d delivered=%d amplification=%.2fx",
+                 stream.generated_bytes, stream.delivered_bytes, stream.amplification)
+
+
+def stream_copy_source_to_target(cfg: Config, src_path: str, tgt_path: str,
+                                 checkpoint: Optional[Checkpoint] = None) -> None:
+    LOG.info("Streaming copy SOURCE -> TARGET")
+    LOG.info("  SOURCE: %s:%s", cfg.src.host, src_path)
+    LOG.info("  TARGET: %s:%s", cfg.tgt.host, tgt_path)
+
+    with sftp_session(cfg.src) as src_sftp:
+        src_size = sftp_stat_size(src_sftp, src_path)
+    if src_size != cfg.size_bytes:
+        raise AssertionError(f"Source size mismatch: {src_size} vs expected {cfg.size_bytes}")
+
+    result = relay_sftp_to_sftp(
+        cfg.src, src_path, cfg.tgt, tgt_path, src_size,
+        io_chunk_bytes=cfg.io_chunk_bytes,
+        ring_buffers=cfg.relay_ring_buffers,
+        checkpoint=checkpoint,
+    )
 
-        if transferred != cfg.size_bytes:
-            raise AssertionError(f"Transferred bytes mismatch: {transferred} vs expected {cfg.size_bytes}")
+    transferred = result["bytes"] + result["resumed_bytes"]
+    if transferred != cfg.size_bytes:
+        raise AssertionError(f"Transferred bytes mismatch: {transferred} vs expected {cfg.size_bytes}")
 
-    finally:
-        for c in (src_sftp, tgt_sftp):
-            try:
-                c.close()
-            except Exception:
-                pass
-        src_t.close()
-        tgt_t.close()
 
+async def verify_target(cfg: Config, seed: bytes, tgt_path: str, run: RunRecord) -> None:
+    # wait size stable
+    with run.phase("stabilization", bytes=cfg.size_bytes):
+        await sftp_wait_until_stable_size(cfg, cfg.tgt, tgt_path)
+    await endpoint_io(sftp_endpoint(cfg.tgt.host, cfg.tgt.port), check_target, cfg, seed, tgt_path, run)
+    LOG.info("Target verification PASSED ✅")
 
-def verify_target_spot_checks(cfg: Config, seed: bytes, tgt_path: str) -> None:
-    t, sftp = connect_sftp(cfg.tgt)
-    try:
-        # wait size stable
-        sftp_wait_until_stable_size(cfg, sftp, tgt_path)
 
+def check_target(cfg: Config, seed: bytes, tgt_path: str, run: RunRecord) -> None:
+    if cfg.verify_mode != "full":
         check_len = min(cfg.spot_check_bytes, cfg.size_bytes)
         offsets = choose_offsets(cfg.size_bytes, cfg.spot_checks, check_len, seed)
         LOG.info("Running %d spot checks (%d bytes each) on TARGET...", len(offsets), check_len)
 
-        with sftp.open(tgt_path, "rb") as f:
-            for i, off in enumerate(offsets, 1):
-                f.seek(off)
-                actual = f.read(check_len)
-                expected = expected_bytes(seed, off, check_len, cfg.size_bytes)
-                if actual != expected:
-                    raise AssertionError(f"Spot-check failed at offset={off} (check {i}/{len(offsets)})")
-                LOG.info("Spot-check %d/%d ✅ (offset=%d)", i, len(offsets), off)
+        with sftp_session(cfg.tgt) as sftp, run.phase("verify_spot") as phase:
+            checked = sftp_spot_check(sftp, tgt_path, seed, offsets, check_len, cfg.size_bytes, cfg.pattern_version)
+            phase.bytes, phase.requests = checked["checks"] * check_len, checked["checks"]
 
-        LOG.info("Target verification PASSED ✅")
-    finally:
-        try:
-            sftp.close()
-        except Exception:
-            pass
-        t.close()
+    if cfg.verify_mode == "full":
+        LOG.info("Running full verification on TARGET (%d-byte parts)...", cfg.verify_part_size)
+        with run.phase("verify_full", bytes=cfg.size_bytes) as phase:
+            checked = sftp_verify_full(
+                cfg.tgt, tgt_path, seed, cfg.size_bytes, cfg.pattern_version,
+                part_size=cfg.verify_part_size, concurrency=cfg.verify_concurrency,
+            )
+            phase.requests = checked["parts"]
 
 
 # -----------------------------
 # Main
 # -----------------------------
-def main() -> int:
+def build_parser() -> argparse.ArgumentParser:
     ap = argparse.ArgumentParser(description="SFTP -> SFTP E2E test (large-file safe)")
     ap.add_argument("--env-file", default=os.getenv("ENV_FILE", ".env"), help="Path to .env (optional)")
-    args = ap.parse_args()
+    ap.add_argument("--verify", choices=SFTP_VERIFY_MODES, help="spot: ranged spot checks; full: hash the whole target. Default VERIFY_MODE")
+    return ap
 
-    if args.env_file and load_dotenv:
-        load_dotenv(args.env_file)
 
-    cfg = load_config(args)
-    setup_logging(cfg.log_level)
+def run_test(cfg: Config) -> Dict[str, object]:
+    """
+    One SFTP -> SFTP probe. Raises on failure; cleans up its own files.
+    Pooled connections are left open so that many probes can run in one process.
+    With CHECKPOINT_FILE set, large runs are checkpointed; a rerun after a failed
+    upload or relay resumes it.
+    """
+    return asyncio.run(run_test_async(cfg))
 
-    test_id = uuid.uuid4().hex
+
+async def run_test_async(cfg: Config) -> Dict[str, object]:
+    """run_test as a coroutine, for runners that drive many probes on one event loop."""
+    await asyncio.to_thread(use_fixture, cfg.fixture_cache_dir, cfg.fixture_cache_quota,
+                            cfg.pattern_version, cfg.size_bytes)
+    fingerprint = {
+        "pattern_version": cfg.pattern_version,
+        "src": f"{cfg.src.host}:{cfg.src.port}{cfg.src.remote_dir}",
+        "tgt": f"{cfg.tgt.host}:{cfg.tgt.port}{cfg.tgt.remote_dir}",
+    }
+    with checkpointed_run(cfg.checkpoint_file, cfg.checkpoint_min_size, "sftp-sftp", cfg.size_bytes,
+                          fingerprint) as checkpoints, \
+            METRICS.run("sftp-sftp", checkpoints.test_id, cfg.size_bytes) as run:
+        return await _run_test(cfg, run, checkpoints)
+
+
+async def _run_test(cfg: Config, run: RunRecord, checkpoints: RunCheckpoints) -> Dict[str, object]:
+    test_id = run.test_id
     filename = f"sftp-sftp-test-{test_id}.bin"
 
     # Deterministic content seed
@@ -482,25 +431,68 @@ def main() -> int:
     LOG.info("Test ID: %s", test_id)
     LOG.info("File: %s", filename)
     LOG.info("Size: %d bytes", cfg.size_bytes)
+    LOG.info("Payload pattern: v%d", cfg.pattern_version)
     LOG.info("SOURCE: %s@%s:%d %s", cfg.src.username, cfg.src.host, cfg.src.port, src_path)
     LOG.info("TARGET: %s@%s:%d %s", cfg.tgt.username, cfg.tgt.host, cfg.tgt.port, tgt_path)
 
     src_uploaded = False
     tgt_written = False
+    src_ep = sftp_endpoint(cfg.src.host, cfg.src.port)
+    tgt_ep = sftp_endpoint(cfg.tgt.host, cfg.tgt.port)
+    start = time.time()
 
     try:
         # 1) Upload to source (stream)
-        upload_to_source(cfg, seed, src_path)
+        def upload() -> None:
+            with run.phase("upload", bytes=cfg.size_bytes):
+                upload_to_source(cfg, seed, src_path, checkpoints.transfer("upload"))
+
+        await endpoint_io(src_ep, upload)
         src_uploaded = True
 
         # 2) Copy source -> target (stream)
-        stream_copy_source_to_target(cfg, src_path, tgt_path)
+        def relay() -> None:
+            with run.phase("relay", bytes=cfg.size_bytes):
+                stream_copy_source_to_target(cfg, src_path, tgt_path, checkpoints.transfer("relay"))
+
+        await endpoint_io((src_ep, tgt_ep), relay)
         tgt_written = True
 
         # 3) Verify target
-        verify_target_spot_checks(cfg, seed, tgt_path)
+        await verify_target(cfg, seed, tgt_path, run)
 
         LOG.info("✅ PASS: Verified SFTP -> SFTP end-to-end")
+        return {"test_id": test_id, "key": tgt_path, "bytes": cfg.size_bytes, "seconds": time.time() - start}
+
+    finally:
+        # Optional cleanup (kept while a checkpointed relay can still resume)
+        with run.phase("cleanup") as phase:
+            if cfg.cleanup_src and src_uploaded and not checkpoints.resumable:
+                try:
+                    phase.requests += 1
+                    await endpoint_io(src_ep, sftp_delete, cfg.src, src_path)
+                except Exception as ce:
+                    LOG.warning("Cleanup SRC failed: %s", ce)
+
+            if cfg.cleanup_tgt and tgt_written:
+                try:
+                    phase.requests += 1
+                    await endpoint_io(tgt_ep, sftp_delete, cfg.tgt, tgt_path)
+                except Exception as ce:
+                    LOG.warning("Cleanup TGT failed: %s", ce)
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+
+    if args.env_file and load_dotenv:
+        load_dotenv(args.env_file)
+
+    cfg = load_config(args)
+    setup_logging(cfg.log_level)
+
+    try:
+        run_test(cfg)
         return 0
 
     except Exception as e:
@@ -508,19 +500,9 @@ def main() -> int:
         return 2
 
     finally:
-        # Optional cleanup
-        if cfg.cleanup_src and src_uploaded:
-            try:
-                sftp_delete(cfg.src, src_path)
-            except Exception as ce:
-                LOG.warning("Cleanup SRC failed: %s", ce)
-
-        if cfg.cleanup_tgt and tgt_written:
-            try:
-                sftp_delete(cfg.tgt, tgt_path)
-            except Exception as ce:
-                LOG.warning("Cleanup TGT failed: %s", ce)
-
+        LOG.info("SFTP pool: %s", POOL.stats())
+        POOL.close_all()
+        METRICS.export()
         LOG.info("=== TEST END ===")
 
 
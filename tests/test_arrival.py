@@ -0,0 +1,154 @@
+import json
+import random
+import time
+
+import boto3
+import pytest
+
+import e2e_arrival
+from e2e_arrival import BatchWaiter, wait_for_s3_object
+from e2e_discovery import get_discovery_index
+
+BUCKET = "arrivals"
+
+
+@pytest.fixture
+def bucket(s3):
+    s3.create_bucket(Bucket=BUCKET)
+    return s3
+
+
+def _event(key: str, size: int, etag: str) -> str:
+    # S3 URL-encodes keys in notifications, with '+' for spaces
+    return json.dumps({"Records": [{
+        "eventName": "ObjectCreated:Put",
+        "s3": {"bucket": {"name": BUCKET},
+               "object": {"key": key.replace(" ", "+"), "size": size, "eTag": etag}},
+    }]})
+
+
+# -----------------------------
+# SQS events
+# -----------------------------
+def test_event_completes_and_releases_other_messages(bucket):
+    sqs = boto3.client("sqs", region_name="us-east-1")
+    queue_url = sqs.create_queue(QueueName="arrivals", Attributes={"VisibilityTimeout": "60"})["QueueUrl"]
+    key = "in box/file 1.bin"
+    etag = bucket.put_object(Bucket=BUCKET, Key=key, Body=b"x" * 100)["ETag"].strip('"')
+    other = _event("in box/other.bin", 5, "abc")
+    sqs.send_message(QueueUrl=queue_url, MessageBody=other)
+    sqs.send_message(QueueUrl=queue_url, MessageBody=_event(key, 100, etag))
+
+    # The first HEAD already sees the object, but two stable polls are needed
+    # and the next one is a minute away: only the event can complete in time.
+    arrival = wait_for_s3_object(bucket, BUCKET, key, 100, timeout_seconds=30,
+                                 sqs=sqs, queue_url=queue_url, stable_polls=2,
+                                 poll_initial_seconds=60, poll_max_seconds=60)
+
+    assert (arrival.source, arrival.size, arrival.etag) == ("event", 100, etag)
+    assert arrival.head_calls == 2 and arrival.sqs_receives == 1
+    # The event for our key was deleted; the other one was made visible again
+    # at once despite the queue's 60s visibility timeout.
+    left = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10, WaitTimeSeconds=0)
+    assert [m["Body"] for m in left.get("Messages", [])] == [other]
+
+
+def test_event_for_an_older_version_is_ignored(bucket):
+    sqs = boto3.client("sqs", region_name="us-east-1")
+    queue_url = sqs.create_queue(QueueName="stale")["QueueUrl"]
+    bucket.put_object(Bucket=BUCKET, Key="obj", Body=b"y" * 10)
+    sqs.send_message(QueueUrl=queue_url, MessageBody=_event("obj", 100, "stale"))
+
+    with pytest.raises(TimeoutError):
+        wait_for_s3_object(bucket, BUCKET, "obj", 100, timeout_seconds=1,
+                           sqs=sqs, queue_url=queue_url,
+                           poll_initial_seconds=60, poll_max_seconds=60)
+    left = sqs.receive_message(QueueUrl=queue_url, WaitTimeSeconds=0)
+    assert not left.get("Messages")
+
+
+# -----------------------------
+# HeadObject fallback
+# -----------------------------
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class LateObject:
+    """HeadObject proxy that writes the object just before the `appear_at`-th call."""
+
+    def __init__(self, s3, clock: FakeClock, key: str, appear_at: int):
+        self.s3, self.clock, self.key, self.appear_at = s3, clock, key, appear_at
+        self.calls = []
+
+    def head_object(self, **kwargs):
+        self.calls.append(self.clock.now)
+        if len(self.calls) == self.appear_at:
+            self.s3.put_object(Bucket=BUCKET, Key=self.key, Body=b"z" * 100)
+        return self.s3.head_object(**kwargs)
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(e2e_arrival, "time", clock)
+    monkeypatch.setattr(random, "uniform", lambda a, b: b)  # no jitter: each delay is its upper bound
+    return clock
+
+
+def test_poll_backs_off_until_stable(bucket, fake_clock):
+    s3 = LateObject(bucket, fake_clock, "late", appear_at=4)
+    arrival = wait_for_s3_object(s3, BUCKET, "late", 100, timeout_seconds=60, stable_polls=2,
+                                 poll_initial_seconds=0.5, poll_max_seconds=2.0)
+
+    assert fake_clock.sleeps == [0.5, 1.0, 2.0, 2.0]
+    assert s3.calls == [0.0, 0.5, 1.5, 3.5, 5.5]
+    assert arrival.source == "poll" and arrival.head_calls == 5
+    assert (arrival.first_seen_seconds, arrival.seconds) == (3.5, 5.5)
+
+
+def test_poll_times_out_at_the_deadline(bucket, fake_clock):
+    s3 = LateObject(bucket, fake_clock, "never", appear_at=0)
+    with pytest.raises(TimeoutError):
+        wait_for_s3_object(s3, BUCKET, "never", 100, timeout_seconds=5,
+                           poll_initial_seconds=1.0, poll_max_seconds=10.0)
+    # 1 + 2 + last sleep cut short by the deadline
+    assert fake_clock.sleeps == [1.0, 2.0, 2.0]
+    assert fake_clock.now == 5.0
+
+
+# -----------------------------
+# Batch waiter
+# -----------------------------
+def test_batch_waiter_finds_keys_behind_the_watermark(bucket):
+    for i in range(20):
+        bucket.put_object(Bucket=BUCKET, Key=f"batch/sftp-s3-test-f{i:02d}.bin", Body=b"x")
+    bucket.put_object(Bucket=BUCKET, Key="batch/zzz.bin", Body=b"x")
+    # No full relisting during the test: only the probe can find the late key
+    waiter = BatchWaiter(bucket, interval_seconds=0.05, full_resweep_every=1000)
+    assert waiter.wait(BUCKET, 1, 5, key="batch/zzz.bin").source == "sweep"
+    index = get_discovery_index(bucket, BUCKET, "batch/")
+
+    late = "batch/sftp-s3-test-0a.bin"
+    future = waiter.register(BUCKET, 1, 5, key=late)
+    time.sleep(0.2)
+    bucket.put_object(Bucket=BUCKET, Key=late, Body=b"y")
+    arrival = future.result(timeout=5)
+    assert (arrival.key, arrival.source) == (late, "sweep")
+
+    # Once nothing waits for it, a sweep is the continuation alone again
+    deadline = time.monotonic() + 5
+    while index.stats()["watched"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    before = index.list_requests
+    index.sweep()
+    assert index.list_requests - before == 1
@@ -0,0 +1,50 @@
+import logging
+
+import pytest
+
+from e2e_bench import CONFIG_NOISE_FLOOR_MS, Metric, compare, pick_baseline
+
+SETTINGS = {"groups": ["payload"], "size": 16 * 1024 * 1024, "repeats": 3, "rtt_ms": 0.0, "bandwidth_mbps": None}
+
+
+def _run(timestamp: float, **settings) -> dict:
+    return {"timestamp": timestamp, "settings": {**SETTINGS, **settings}, "metrics": {}}
+
+
+def test_baseline_is_the_latest_comparable_run():
+    runs = {
+        "old": _run(1),
+        "other-size": _run(3, size=8 * 1024 * 1024),
+        "other-groups": _run(2, groups=["payload", "config"]),
+        "head": _run(4),
+    }
+    # Groups may differ (only shared metrics are compared); size may not
+    assert pick_baseline(runs, "head", None, SETTINGS) == "other-groups"
+    assert pick_baseline(runs, "head", None, {**SETTINGS, "repeats": 1}) is None
+    assert pick_baseline({"legacy": {"timestamp": 9, "metrics": {}}}, "head", None, SETTINGS) is None
+
+    assert pick_baseline(runs, "head", "old", SETTINGS) == "old"
+    with pytest.raises(ValueError, match="not comparable"):
+        pick_baseline(runs, "head", "other-size", SETTINGS)
+    with pytest.raises(ValueError, match="matches 2"):
+        pick_baseline(runs, "head", "other", SETTINGS)
+
+
+def test_compare_flags_regressions_above_threshold_and_noise_floor(caplog):
+    baseline = {
+        "chunk_bytes_mb_s": {"value": 1000.0},
+        "config_s3_to_s3_ms": {"value": 0.2},
+        "s3_spot_check_16_ms": {"value": 10.0},
+    }
+    current = {
+        "chunk_bytes_mb_s": Metric(800.0, "MB/s", True),
+        # 3x slower, but by less than the floor
+        "config_s3_to_s3_ms": Metric(0.6, "ms", False, CONFIG_NOISE_FLOOR_MS),
+        "s3_spot_check_16_ms": Metric(11.0, "ms", False),
+        "stream_readinto_64k_mb_s": Metric(5000.0, "MB/s", True),
+    }
+    with caplog.at_level(logging.INFO, logger="e2e-bench"):
+        regressions = compare(current, baseline, 0.15, {"s3_spot_check_16_ms": 0.05})
+
+    assert [r.split(":")[0] for r in regressions] == ["chunk_bytes_mb_s", "s3_spot_check_16_ms"]
+    assert "stream_readinto_64k_mb_s" in caplog.text and "no baseline yet" in caplog.text
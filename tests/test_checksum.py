@@ -0,0 +1,209 @@
+import base64
+import hashlib
+import random
+import zlib
+
+import pytest
+from boto3.s3.transfer import TransferConfig
+
+import e2e_checksum
+from e2e_checksum import (
+    COMPOSITE,
+    FULL_OBJECT,
+    MIN_PART_SIZE,
+    _CRC_POLYS,
+    checksum_supported,
+    crc_combine,
+    expected_s3_checksum,
+    s3_object_checksum,
+    transfer_part_sizes,
+)
+from e2e_payload import DeterministicStream, expected_bytes
+from e2e_transfer import s3_multipart_copy, s3_multipart_upload
+from e2e_verify import s3_verify_checksum, s3_verify_stored_checksum
+
+SEED = b"c" * 32
+MiB = 1024 * 1024
+SIZE = 2 * MIN_PART_SIZE + 12345
+PART = MIN_PART_SIZE
+BUCKET = "checksums"
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii")
+
+
+def _crc64nvme(data: bytes, crc: int = 0) -> int:
+    """Bitwise reference CRC-64/NVME (reflected, init and xorout all ones)."""
+    crc ^= 0xFFFFFFFFFFFFFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ (_CRC_POLYS["CRC64NVME"] if crc & 1 else 0)
+    return crc ^ 0xFFFFFFFFFFFFFFFF
+
+
+# -----------------------------
+# Layout and CRC math
+# -----------------------------
+def test_transfer_part_sizes():
+    assert transfer_part_sizes(SIZE, SIZE + 1, PART) == []
+    assert transfer_part_sizes(SIZE, 1, PART) == [PART, PART, 12345]
+    assert transfer_part_sizes(SIZE, 1, 1) == [PART, PART, 12345]  # clamped to the 5 MiB minimum
+    sizes = transfer_part_sizes(10001 * PART, 1, PART)
+    assert len(sizes) <= 10000 and sum(sizes) == 10001 * PART
+
+
+@pytest.mark.parametrize("split", [1, 7, 4096, 100000])
+def test_crc32_combine_matches_whole(split):
+    data = random.Random(split).randbytes(200000)
+    a, b = data[:split], data[split:]
+    combined = crc_combine(zlib.crc32(a), zlib.crc32(b), len(b), _CRC_POLYS["CRC32"])
+    assert combined == zlib.crc32(data)
+
+
+def test_crc64nvme_reference_and_combine():
+    assert _crc64nvme(b"123456789") == 0xAE8B14860A799888
+    data = random.Random(64).randbytes(5000)
+    for split in (1, 1000, 4999):
+        a, b = data[:split], data[split:]
+        combined = crc_combine(_crc64nvme(a), _crc64nvme(b), len(b), _CRC_POLYS["CRC64NVME"], 64)
+        assert combined == _crc64nvme(data)
+
+
+def test_full_object_multipart_crc_equals_whole_object_crc():
+    whole = zlib.crc32(expected_bytes(SEED, 0, SIZE, SIZE))
+    expected = expected_s3_checksum(SEED, SIZE, "CRC32", [PART, PART, 12345], checksum_type=FULL_OBJECT)
+    assert expected.value == _b64(whole.to_bytes(4, "big"))
+    assert expected.part_count == 3
+    assert expected.header_value == expected.value
+
+
+def test_composite_is_checksum_of_part_checksums():
+    data = expected_bytes(SEED, 0, SIZE, SIZE)
+    parts = [data[:PART], data[PART:2 * PART], data[2 * PART:]]
+    raw = [hashlib.sha256(p).digest() for p in parts]
+    expected = expected_s3_checksum(SEED, SIZE, "SHA256", [len(p) for p in parts])
+    assert expected.checksum_type == COMPOSITE
+    assert expected.value == _b64(hashlib.sha256(b"".join(raw)).digest())
+    assert expected.part_checksums == [_b64(r) for r in raw]
+    assert expected.header_value == f"{expected.value}-3"
+
+
+def test_single_part_is_full_object():
+    expected = expected_s3_checksum(SEED, SIZE, "CRC32")
+    assert expected.checksum_type == FULL_OBJECT
+    assert expected.value == _b64(zlib.crc32(expected_bytes(SEED, 0, SIZE, SIZE)).to_bytes(4, "big"))
+
+
+def test_crc64nvme_multipart_defaults_to_full_object(monkeypatch):
+    monkeypatch.setattr(e2e_checksum, "_crc_function", lambda algorithm: lambda data, crc: _crc64nvme(bytes(data), crc))
+    expected = expected_s3_checksum(SEED, 3 * 4096, "CRC64NVME", [4096] * 3)
+    whole = _crc64nvme(expected_bytes(SEED, 0, 3 * 4096, 3 * 4096))
+    assert expected.checksum_type == FULL_OBJECT
+    assert expected.value == _b64(whole.to_bytes(8, "big"))
+    with pytest.raises(ValueError):
+        expected_s3_checksum(SEED, 3 * 4096, "CRC64NVME", [4096] * 3, checksum_type=COMPOSITE)
+
+
+def test_unsupported_algorithms_are_reported():
+    assert checksum_supported("CRC32") and checksum_supported("SHA256")
+    assert not checksum_supported("SHA1")
+    assert checksum_supported("CRC64NVME") == (e2e_checksum._crt_checksums is not None)
+
+
+# -----------------------------
+# Against moto
+# -----------------------------
+@pytest.fixture
+def bucket(s3):
+    s3.create_bucket(Bucket=BUCKET)
+    return s3
+
+
+def _upload(s3, key: str, algorithm: str, part_sizes, **extra) -> None:
+    config = TransferConfig(multipart_threshold=SIZE + 1 if not part_sizes else 1, multipart_chunksize=PART)
+    s3.upload_fileobj(DeterministicStream(SEED, SIZE), BUCKET, key,
+                      ExtraArgs={"ChecksumAlgorithm": algorithm, **extra}, Config=config)
+
+
+@pytest.mark.parametrize("algorithm", ["CRC32", "SHA256"])
+@pytest.mark.parametrize("multipart", [False, True])
+def test_stored_checksum_matches(bucket, algorithm, multipart):
+    part_sizes = transfer_part_sizes(SIZE, 1, PART) if multipart else []
+    _upload(bucket, "obj", algorithm, part_sizes)
+    expected = expected_s3_checksum(SEED, SIZE, algorithm, part_sizes)
+    assert expected.checksum_type == (COMPOSITE if multipart else FULL_OBJECT)
+    s3_verify_checksum(bucket, BUCKET, "obj", expected)
+    s3_verify_stored_checksum(bucket, BUCKET, "obj", SEED, SIZE)
+
+
+def test_full_object_multipart_upload(bucket):
+    part_sizes = transfer_part_sizes(SIZE, 1, PART)
+    data = expected_bytes(SEED, 0, SIZE, SIZE)
+    upload = bucket.create_multipart_upload(Bucket=BUCKET, Key="full", ChecksumAlgorithm="CRC32",
+                                            ChecksumType="FULL_OBJECT")
+    parts, pos = [], 0
+    for number, size in enumerate(part_sizes, 1):
+        resp = bucket.upload_part(Bucket=BUCKET, Key="full", UploadId=upload["UploadId"], PartNumber=number,
+                                  Body=data[pos:pos + size], ChecksumAlgorithm="CRC32")
+        parts.append({"PartNumber": number, "ETag": resp["ETag"], "ChecksumCRC32": resp["ChecksumCRC32"]})
+        pos += size
+    whole = _b64(zlib.crc32(data).to_bytes(4, "big"))
+    bucket.complete_multipart_upload(Bucket=BUCKET, Key="full", UploadId=upload["UploadId"],
+                                     MultipartUpload={"Parts": parts}, ChecksumCRC32=whole,
+                                     ChecksumType="FULL_OBJECT")
+
+    assert s3_object_checksum(bucket, BUCKET, "full") == ("CRC32", whole, FULL_OBJECT)
+    s3_verify_checksum(bucket, BUCKET, "full",
+                       expected_s3_checksum(SEED, SIZE, "CRC32", part_sizes, checksum_type=FULL_OBJECT))
+    s3_verify_stored_checksum(bucket, BUCKET, "full", SEED, SIZE)
+
+
+def _created_checksum_types(s3) -> list:
+    types = []
+    s3.meta.events.register("before-call.s3.CreateMultipartUpload",
+                            lambda params, **kwargs: types.append(params["headers"].get("x-amz-checksum-type")))
+    return types
+
+
+def test_crc64nvme_multipart_copy_is_full_object(bucket):
+    # S3 rejects CRC64NVME with COMPOSITE; UploadPartCopy needs no local CRC64NVME
+    types = _created_checksum_types(bucket)
+    bucket.put_object(Bucket=BUCKET, Key="src", Body=expected_bytes(SEED, 0, SIZE, SIZE))
+    s3_multipart_copy(bucket, BUCKET, "src", BUCKET, "nvme", transfer_part_sizes(SIZE, 1, PART),
+                      extra_args={"ChecksumAlgorithm": "CRC64NVME"})
+
+    assert types == [FULL_OBJECT]
+    head = bucket.head_object(Bucket=BUCKET, Key="nvme", ChecksumMode="ENABLED")
+    assert "ChecksumCRC64NVME" in head and head["ContentLength"] == SIZE
+
+
+@pytest.mark.parametrize("algorithm", ["CRC32", "CRC64NVME"])
+def test_multipart_upload_checksum_type_matches_expected(bucket, algorithm):
+    if not checksum_supported(algorithm):
+        pytest.skip(f"{algorithm} needs awscrt")
+    types = _created_checksum_types(bucket)
+    part_sizes = transfer_part_sizes(SIZE, 1, PART)
+    s3_multipart_upload(bucket, BUCKET, "obj", SEED, SIZE, part_sizes, extra_args={"ChecksumAlgorithm": algorithm})
+
+    assert types == [expected_s3_checksum(SEED, SIZE, algorithm, part_sizes).checksum_type]
+
+
+def test_mismatch_names_the_bad_part(bucket):
+    part_sizes = transfer_part_sizes(SIZE, 1, PART)
+    _upload(bucket, "obj", "SHA256", part_sizes)
+    wrong = expected_s3_checksum(b"x" * 32, SIZE, "SHA256", part_sizes)
+    with pytest.raises(AssertionError, match="mismatch"):
+        s3_verify_checksum(bucket, BUCKET, "obj", wrong)
+
+
+def test_unsupported_stored_checksum_falls_back_to_full_verify(bucket, caplog):
+    bucket.put_object(Bucket=BUCKET, Key="sha1", Body=expected_bytes(SEED, 0, SIZE, SIZE), ChecksumAlgorithm="SHA1")
+    assert s3_object_checksum(bucket, BUCKET, "sha1")[0] == "SHA1"
+    result = s3_verify_stored_checksum(bucket, BUCKET, "sha1", SEED, SIZE, part_size=4 * MiB)
+    assert result["bytes"] == SIZE
+    assert "falling back to full verification" in caplog.text
+
+    with pytest.raises(AssertionError):
+        s3_verify_stored_checksum(bucket, BUCKET, "sha1", b"x" * 32, SIZE, part_size=4 * MiB)
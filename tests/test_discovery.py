@@ -0,0 +1,91 @@
+import pytest
+
+from e2e_discovery import DiscoveryIndex
+
+BUCKET = "landing"
+
+
+@pytest.fixture
+def bucket(s3):
+    s3.create_bucket(Bucket=BUCKET)
+    return s3
+
+
+def _put(s3, *keys: str) -> None:
+    for key in keys:
+        s3.put_object(Bucket=BUCKET, Key=key, Body=b"x")
+
+
+def _requests(index: DiscoveryIndex) -> int:
+    before = index.list_requests
+    index.sweep()
+    return index.list_requests - before
+
+
+def test_flat_prefix_is_continued_not_relisted(bucket):
+    _put(bucket, *(f"flat/{i:05d}.bin" for i in range(2500)))
+    index = DiscoveryIndex(bucket, BUCKET, "flat/", range_keys=1000, full_resweep_every=3)
+
+    assert _requests(index) == 3
+    _put(bucket, "flat/09999.bin")
+    # The object is hot, yet only the tail after the watermark is listed
+    assert _requests(index) == 1
+    assert index.find("09999.bin", refresh=False) == "flat/09999.bin"
+
+    # A key behind the watermark waits for the full resweep, which is split
+    # into key ranges at the keys seen by the previous full listing
+    _put(bucket, "flat/00000-late.bin")
+    assert _requests(index) == 1
+    assert index.lookup("00000-late.bin") is None
+    # Three ranges; the first one now holds 1001 keys, so two pages
+    assert _requests(index) == 4
+    assert index.lookup("00000-late.bin") == "flat/00000-late.bin"
+    assert index.stats()["keys"] == 2502
+
+
+def test_new_folders_are_found_by_continuation(bucket):
+    _put(bucket, "in/2026-10-16/a.bin", "in/2026-10-16/b.bin", "in/loose.bin")
+    index = DiscoveryIndex(bucket, BUCKET, "in/", shard_depth=1)
+    index.sweep()
+    assert index.stats()["shards"] == 1
+    assert index.lookup("loose.bin") == "in/loose.bin"
+
+    _put(bucket, "in/2026-10-17/c.bin")
+    # Root continuation + the known shard + the new shard's first listing
+    assert _requests(index) == 3
+    assert index.stats()["shards"] == 2
+    assert index.lookup("c.bin") == "in/2026-10-17/c.bin"
+
+
+def test_indexed_keys_are_capped(bucket):
+    _put(bucket, *(f"cap/{i}.bin" for i in range(5)))
+    index = DiscoveryIndex(bucket, BUCKET, "cap/", shard_depth=0, max_keys=3)
+    index.sweep()
+    _put(bucket, "cap/9.bin")
+    index.sweep()
+
+    stats = index.stats()
+    assert (stats["keys"], stats["filenames"]) == (3, 3)
+    # What was discovered first goes first
+    assert index.object_for_key("cap/9.bin") is not None
+    assert index.object_for_key("cap/0.bin") is None
+
+
+def test_watched_keys_behind_the_watermark_are_probed(bucket):
+    _put(bucket, "w/2026-10-16/a.bin", "w/2026-10-17/b.bin")
+    index = DiscoveryIndex(bucket, BUCKET, "w/", shard_depth=1, full_resweep_every=1000)
+    index.sweep()
+
+    # Behind both the root's last folder and the shard's last key
+    index.watch_key("w/2026-10-17/0.bin")
+    index.watch_key("w/2026-01-01/0.bin")
+    _put(bucket, "w/2026-10-17/0.bin", "w/2026-01-01/0.bin")
+    index.sweep()
+    assert index.lookup("0.bin") is not None
+    assert index.object_for_key("w/2026-10-17/0.bin") is not None
+    assert index.object_for_key("w/2026-01-01/0.bin") is not None
+
+    index.unwatch_key("w/2026-10-17/0.bin")
+    index.unwatch_key("w/2026-01-01/0.bin")
+    # Root continuation + one per shard
+    assert _requests(index) == 3
@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+import e2e_fixture
+from conftest import ROOT
+from e2e_fixture import FIXTURE_TIERS, FixtureCache, cached_range_digest, size_tier, use_fixture
+from e2e_payload import FIXTURE_SALT_BYTES, PATTERN_V2, PATTERN_V3
+
+GiB = 1024 ** 3
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(e2e_fixture, "_CACHES", {})
+    monkeypatch.setattr(e2e_fixture, "_ACTIVE", {})
+
+
+class Computed:
+    """compute() stand-in that counts its calls."""
+
+    def __init__(self, raw: bytes = b"\x01\x02"):
+        self.raw = raw
+        self.calls = 0
+
+    def __call__(self) -> bytes:
+        self.calls += 1
+        return self.raw
+
+
+def test_tier_selection(tmp_path):
+    assert size_tier(1) == size_tier(GiB // 4) == GiB // 4
+    assert size_tier(GiB // 4 + 1) == GiB
+    assert size_tier(20 * GiB) == 20 * GiB
+    assert size_tier(FIXTURE_TIERS[-1] + 1) is None
+
+    cache = FixtureCache(str(tmp_path))
+    entry = cache.open(PATTERN_V3, 3 * GiB)
+    assert entry.tier == 5 * GiB and entry.path.endswith(f"v{PATTERN_V3}-{5 * GiB}.digests.json")
+    assert cache.open(PATTERN_V3, 4 * GiB) is entry
+    assert cache.open(PATTERN_V3, FIXTURE_TIERS[-1] + 1) is None
+    assert cache.open(PATTERN_V2, GiB) is None  # unsalted payloads share nothing across runs
+
+
+def test_memo_over_quota_is_not_saved(tmp_path, caplog):
+    cache = FixtureCache(str(tmp_path), quota=64)
+    entry = cache.open(PATTERN_V3, GiB)
+    for i in range(4):
+        entry.digest("SHA256", (i + 1) * 8192, (i + 2) * 8192, Computed(bytes(32)))
+    with caplog.at_level(logging.WARNING, logger="e2e-fixture"):
+        entry.save(force=True)
+    assert "more than the 64 byte quota" in caplog.text
+    assert not os.path.exists(entry.path)
+    # Still memoized for this process
+    again = Computed()
+    entry.digest("SHA256", 8192, 16384, again)
+    assert again.calls == 0
+
+
+def test_least_recently_used_memos_are_evicted(tmp_path):
+    cache = FixtureCache(str(tmp_path))
+    entries = {tier: cache.open(PATTERN_V3, tier) for tier in FIXTURE_TIERS[:3]}
+    for n, (tier, entry) in enumerate(entries.items()):
+        entry.digest("CRC32", FIXTURE_SALT_BYTES, tier, Computed())
+        entry.save(force=True)
+        os.utime(entry.path, (1000 + n, 1000 + n))
+    size = os.path.getsize(entries[FIXTURE_TIERS[0]].path)
+
+    # Using the oldest one makes the second oldest the eviction candidate
+    cache.open(PATTERN_V3, FIXTURE_TIERS[0])
+    cache.quota = 3 * size + size // 2
+    big = cache.open(PATTERN_V3, FIXTURE_TIERS[3])
+    big.digest("CRC32", FIXTURE_SALT_BYTES, FIXTURE_TIERS[3], Computed())
+    big.save(force=True)
+
+    left = sorted(name for name in os.listdir(tmp_path) if name.endswith(".digests.json"))
+    assert left == sorted(os.path.basename(cache._path(PATTERN_V3, t))
+                          for t in (FIXTURE_TIERS[0], FIXTURE_TIERS[2], FIXTURE_TIERS[3]))
+
+
+def test_salted_and_out_of_tier_ranges_are_not_memoized(tmp_path):
+    use_fixture(str(tmp_path), e2e_fixture.DEFAULT_FIXTURE_QUOTA, PATTERN_V3, GiB)
+    for start, end in ((0, 8192), (FIXTURE_SALT_BYTES - 1, 8192), (GiB - 8192, GiB + 8192)):
+        compute = Computed()
+        cached_range_digest(PATTERN_V3, "SHA256", start, end, compute)
+        cached_range_digest(PATTERN_V3, "SHA256", start, end, compute)
+        assert compute.calls == 2, (start, end)
+
+    compute = Computed()
+    cached_range_digest(PATTERN_V3, "SHA256", FIXTURE_SALT_BYTES, 8192, compute)
+    cached_range_digest(PATTERN_V3, "SHA256", FIXTURE_SALT_BYTES, 8192, compute)
+    assert compute.calls == 1
+    # Other versions never go through the cache
+    cached_range_digest(PATTERN_V2, "SHA256", FIXTURE_SALT_BYTES, 8192, compute)
+    assert compute.calls == 2
+
+
+WRITER = r"""
+import sys
+from e2e_fixture import DEFAULT_FIXTURE_QUOTA, cached_range_digest, use_fixture
+directory, start = sys.argv[1], int(sys.argv[2])
+use_fixture(directory, DEFAULT_FIXTURE_QUOTA, 3, 1 << 30)
+cached_range_digest(3, "SHA256", start, start + 8192, lambda: start.to_bytes(4, "big"))
+"""  # saved by the atexit hook
+
+
+def test_digests_are_reused_across_processes(tmp_path):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    for start in (8192, 16384):
+        subprocess.run([sys.executable, "-c", WRITER, str(tmp_path), str(start)], env=env, cwd=ROOT, check=True)
+
+    # Both processes' digests are in the memo: the second merged, not replaced
+    memo = json.loads((tmp_path / f"v{PATTERN_V3}-{GiB}.digests.json").read_text())
+    assert memo == {"SHA256:8192:16384": (8192).to_bytes(4, "big").hex(),
+                    "SHA256:16384:24576": (16384).to_bytes(4, "big").hex()}
+
+    use_fixture(str(tmp_path), e2e_fixture.DEFAULT_FIXTURE_QUOTA, PATTERN_V3, GiB)
+    compute = Computed()
+    assert cached_range_digest(PATTERN_V3, "SHA256", 16384, 24576, compute) == (16384).to_bytes(4, "big")
+    assert compute.calls == 0
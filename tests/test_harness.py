@@ -0,0 +1,105 @@
+import socket
+import threading
+import time
+
+import boto3
+import pytest
+
+from e2e_arrival import wait_for_s3_object
+from e2e_harness import LocalHarness, Throttle, ThrottledProxy
+from e2e_payload import expected_bytes
+from e2e_sftp import POOL, SFTPConn
+from e2e_transfer import parallel_sftp_upload
+
+SEED = b"h" * 32
+MiB = 1024 * 1024
+
+
+# -----------------------------
+# Throttling proxy
+# -----------------------------
+@pytest.fixture
+def echo_server():
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def serve() -> None:
+        while True:
+            try:
+                client, _ = server.accept()
+            except OSError:
+                return
+            with client:
+                while data := client.recv(65536):
+                    client.sendall(data)
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield server.getsockname()[1]
+    server.close()
+
+
+def _round_trip(port: int, payload: bytes) -> float:
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        start = time.monotonic()
+        sock.sendall(payload)
+        got = b""
+        while len(got) < len(payload):
+            got += sock.recv(65536)
+        elapsed = time.monotonic() - start
+    assert got == payload
+    return elapsed
+
+
+def test_throttle_adds_round_trip_latency(echo_server):
+    direct = _round_trip(echo_server, b"ping")
+    proxy = ThrottledProxy("127.0.0.1", echo_server, Throttle(rtt_seconds=0.2)).start()
+    try:
+        proxied = _round_trip(proxy.port, b"ping")
+    finally:
+        proxy.close()
+    assert proxied - direct >= 0.15
+    assert 0.2 <= proxied < 1.0
+    assert proxy.connections == 1
+
+
+def test_throttle_caps_bandwidth(echo_server):
+    # 256 KiB each way at 1 MB/s per direction; both directions overlap
+    proxy = ThrottledProxy("127.0.0.1", echo_server, Throttle(bandwidth_bytes_per_s=1e6)).start()
+    try:
+        elapsed = _round_trip(proxy.port, b"x" * (256 * 1024))
+    finally:
+        proxy.close()
+    assert elapsed >= 0.2
+
+
+# -----------------------------
+# Harness
+# -----------------------------
+@pytest.fixture(scope="module")
+def harness():
+    with LocalHarness() as h:
+        yield h
+    POOL.close_all()
+
+
+def test_parallel_upload_is_delivered_by_the_pipeline(harness):
+    env = harness.env()
+    conn = SFTPConn(host=env["SFTP_HOST"], port=int(env["SFTP_PORT"]), username=env["SFTP_USERNAME"],
+                    private_key_path=env["SFTP_PRIVATE_KEY_PATH"], private_key_passphrase=None,
+                    remote_dir=env["SFTP_REMOTE_DIR"])
+    size = 3 * MiB + 123
+    result = parallel_sftp_upload(conn, f"{conn.remote_dir}/harness.bin", SEED, size, 4)
+    assert result["bytes"] == size
+    # Through the source proxy: one connection per stream at most
+    assert 1 <= harness.proxy_connections()["sftp-src"] <= 4
+
+    s3 = boto3.client("s3", region_name=env["AWS_REGION"], endpoint_url=env["S3_ENDPOINT_URL"],
+                      aws_access_key_id=env["AWS_ACCESS_KEY_ID"], aws_secret_access_key=env["AWS_SECRET_ACCESS_KEY"])
+    key = f"{env['S3_PREFIX']}harness.bin"
+    arrival = wait_for_s3_object(s3, env["S3_BUCKET"], key, size, timeout_seconds=30,
+                                 poll_initial_seconds=0.1, poll_max_seconds=0.5)
+    assert arrival.size == size
+    assert s3.get_object(Bucket=env["S3_BUCKET"], Key=key)["Body"].read() == expected_bytes(SEED, 0, size, size)
+    # The pipeline skips the in-progress .part file
+    listed = s3.list_objects_v2(Bucket=env["S3_BUCKET"], Prefix=env["S3_PREFIX"])["Contents"]
+    assert [o["Key"] for o in listed] == [key]
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import e2e_limits
+from e2e_arrival import wait_for_s3_object_async
+from e2e_limits import endpoint_io, set_endpoint_limit, shutdown_executors
+
+BUCKET = "limits"
+
+
+@pytest.fixture(autouse=True)
+def fresh_executors():
+    yield
+    set_endpoint_limit("sftp://slow:22", None)
+    shutdown_executors()
+
+
+class Tracker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = self.peak = 0
+        self.threads = set()
+
+    def call(self, seconds: float) -> str:
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.threads.add(threading.current_thread().name)
+        time.sleep(seconds)
+        with self.lock:
+            self.active -= 1
+        return threading.current_thread().name
+
+
+def test_endpoint_io_is_bounded_per_endpoint():
+    set_endpoint_limit("sftp://slow:22", 2)
+    slow, fast = Tracker(), Tracker()
+
+    async def main():
+        started = time.monotonic()
+        # Four calls queue on the slow endpoint; the other endpoint is not held up
+        slow_calls = asyncio.gather(*(endpoint_io("sftp://slow:22", slow.call, 0.3) for _ in range(4)))
+        await endpoint_io("s3://fast", fast.call, 0.0)
+        fast_done = time.monotonic() - started
+        await slow_calls
+        return fast_done
+
+    fast_done = asyncio.run(main())
+    assert slow.peak == 2 and len(slow.threads) == 2
+    assert all(name.startswith("sftp_slow_22-io") for name in slow.threads)
+    assert fast_done < 0.2
+
+
+def test_waits_hold_no_thread_between_polls(s3):
+    s3.create_bucket(Bucket=BUCKET)
+    waiters = 64
+
+    async def main():
+        waits = asyncio.gather(*(
+            wait_for_s3_object_async(s3, BUCKET, f"k{i}", 1, timeout_seconds=30,
+                                     poll_initial_seconds=0.05, poll_max_seconds=0.1)
+            for i in range(waiters)
+        ))
+        await asyncio.sleep(0.3)
+        for i in range(waiters):
+            s3.put_object(Bucket=BUCKET, Key=f"k{i}", Body=b"x")
+        return await waits
+
+    arrivals = asyncio.run(main())
+    assert [a.source for a in arrivals] == ["poll"] * waiters
+    # HeadObject calls ran on the bucket's poll executor, far fewer threads than waiters
+    poll = e2e_limits._EXECUTORS[(f"s3://{BUCKET}", False)]
+    assert len(poll._threads) <= e2e_limits.DEFAULT_POLL_WORKERS < waiters
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+import e2e_load
+from e2e_load import (
+    LoadSample,
+    SizeBucket,
+    Weighted,
+    latency_histogram,
+    parse_size_distribution,
+    route_report,
+)
+from e2e_runner import Scenario, ScenarioResult
+
+
+# -----------------------------
+# Distributions
+# -----------------------------
+def test_default_sizes_parse_for_every_route():
+    # The default uses KB, which not every route's own parser knows
+    default = e2e_load.build_parser().get_default("sizes")
+    sizes = parse_size_distribution(default)
+    assert [b.low for b in sizes.items] == [1000, 1000 ** 2, 100 * 1000 ** 2]
+    assert sizes.weights == [70.0, 25.0, 5.0]
+
+
+def test_size_distribution_spec():
+    sizes = parse_size_distribution("512B:1, 1KiB-1MiB:3,20GB:0")
+    # Zero weights are dropped
+    assert sizes.items == [SizeBucket(512, 512), SizeBucket(1024, 1024 ** 2)]
+    assert sizes.weights == [1.0, 3.0]
+    with pytest.raises(ValueError, match="reversed"):
+        parse_size_distribution("100MB-1MB:1")
+    with pytest.raises(ValueError, match="positive weight"):
+        parse_size_distribution("1MB:0")
+
+
+def test_size_distribution_file(tmp_path):
+    path = tmp_path / "sizes.txt"
+    path.write_text("# size weight\n1KB,70\n1MB 25   # mid\n\n100MB\t5\n2GiB\n", encoding="utf-8")
+    sizes = parse_size_distribution(f"@{path}")
+    assert [b.low for b in sizes.items] == [1000, 1000 ** 2, 100 * 1000 ** 2, 2 * 1024 ** 3]
+    assert sizes.weights == [70.0, 25.0, 5.0, 1.0]
+
+
+def test_weighted_sampling_follows_weights():
+    rng = random.Random(7)
+    mix = Weighted([("a", 3), ("b", 1), ("never", 0)])
+    picks = [mix.sample(rng) for _ in range(20000)]
+    assert set(picks) == {"a", "b"}
+    assert picks.count("a") / len(picks) == pytest.approx(0.75, abs=0.02)
+
+
+def test_size_bucket_is_log_uniform():
+    rng = random.Random(3)
+    bucket = SizeBucket(1000, 1000 ** 3)
+    samples = [bucket.sample(rng) for _ in range(10000)]
+    assert all(1000 <= s <= 1000 ** 3 for s in samples)
+    # Half land in the lower three of the six decades, not nearly all in the top one
+    assert sum(s < 1000 ** 2 for s in samples) / len(samples) == pytest.approx(0.5, abs=0.03)
+    assert SizeBucket(42, 42).sample(rng) == 42
+
+
+# -----------------------------
+# Stats
+# -----------------------------
+def _sample(latency: float, ok: bool = True, size: int = 100) -> LoadSample:
+    return LoadSample(ScenarioResult(Scenario("s3-s3", size), ok, latency), latency)
+
+
+def test_route_report_percentiles():
+    samples = [_sample(float(i)) for i in range(1, 101)] + [_sample(1000.0, ok=False)]
+    report = route_report(samples, elapsed=10.0)
+    # Nearest rank over passed scenarios only
+    assert (report["p50_seconds"], report["p95_seconds"], report["p99_seconds"]) == (50.0, 95.0, 99.0)
+    assert (report["passed"], report["failed"], report["max_seconds"]) == (100, 1, 100.0)
+    assert report["files_per_second"] == 10.0 and report["bytes_per_second"] == 1000.0
+
+    empty = route_report([], elapsed=0.0)
+    assert empty["p99_seconds"] == 0.0 and empty["latency_histogram"] == {}
+
+
+def test_latency_histogram_power_of_two_buckets():
+    assert latency_histogram([0.0, 0.3, 0.5, 0.7, 1.0, 3.0, 4.0, 5.0]) == {
+        "<=0s": 1, "<=0.5s": 2, "<=1s": 2, "<=4s": 2, "<=8s": 1,
+    }
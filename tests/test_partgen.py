@@ -0,0 +1,57 @@
+"""
+Parts generated into shared memory are uploaded from views of the slot and
+the views are revoked before the slot is reused. The uploads go to moto's
+server over HTTP: in-process moto wants request bodies to read as bytes.
+"""
+
+import boto3
+import pytest
+
+from e2e_checksum import transfer_part_sizes
+from e2e_partgen import SharedPartGenerator, SharedPartReader
+from e2e_payload import expected_bytes
+from e2e_transfer import s3_multipart_upload
+
+MiB = 1024 ** 2
+SEED = b"p" * 32
+
+
+def test_reader_hands_out_views_of_the_slot():
+    slot = bytearray(b"abcdefgh")
+    reader = SharedPartReader(memoryview(slot))
+    head = reader.read(3)
+    slot[0:1] = b"A"
+    assert isinstance(head, memoryview) and bytes(head) == b"Abc"
+
+    into = bytearray(8)
+    assert reader.readinto(into) == 5 and bytes(into[:5]) == b"defgh"
+    assert reader.seek(0) == 0 and bytes(reader.read()) == b"Abcdefgh"
+
+    reader.release()
+    with pytest.raises(ValueError):
+        bytes(head)
+
+
+def test_slices_do_not_outlive_their_part():
+    with SharedPartGenerator(SEED, 3 * MiB, MiB, slots=1, processes=1) as generator:
+        with generator.part(MiB, 2 * MiB) as (body, checksum):
+            data = body.read(100)
+            assert checksum is None and bytes(data) == expected_bytes(SEED, MiB, 100, 3 * MiB)
+        # The slot is free again; a leftover slice must not see the next part
+        with pytest.raises(ValueError):
+            bytes(data)
+        with generator.part(0, MiB) as (body, _):
+            assert bytes(body.read(100)) == expected_bytes(SEED, 0, 100, 3 * MiB)
+
+
+@pytest.mark.parametrize("processes", [0, 1])
+def test_parts_upload_from_shared_memory(aws_env, moto_server, processes):
+    s3 = boto3.client("s3", endpoint_url=moto_server)
+    bucket = f"partgen-{processes}"
+    s3.create_bucket(Bucket=bucket)
+    size = 11 * MiB
+    part_sizes = transfer_part_sizes(size, 5 * MiB, 5 * MiB)
+    s3_multipart_upload(s3, bucket, "obj", SEED, size, part_sizes, extra_args={"ChecksumAlgorithm": "CRC32"},
+                        concurrency=2, generate_processes=processes)
+
+    assert s3.get_object(Bucket=bucket, Key="obj")["Body"].read() == expected_bytes(SEED, 0, size, size)
@@ -0,0 +1,84 @@
+import hashlib
+
+import pytest
+
+import e2e_payload
+from e2e_payload import (
+    CHUNK,
+    DEFAULT_PAD_CACHE_SEEDS,
+    PATTERN_V2,
+    PATTERN_V3,
+    DeterministicStream,
+    expected_bytes,
+    expected_into,
+    set_pad_cache_size,
+)
+
+SEEDS = [hashlib.sha256(f"seed-{i}".encode()).digest() for i in range(2 * DEFAULT_PAD_CACHE_SEEDS)]
+SIZE = 3 * CHUNK + 12345
+
+
+@pytest.fixture
+def pad_builds(monkeypatch):
+    """Counts pad generations; starts from an empty cache."""
+    monkeypatch.setattr(e2e_payload, "_PADS", type(e2e_payload._PADS)())
+    monkeypatch.setattr(e2e_payload, "_LIVE_PADS", type(e2e_payload._LIVE_PADS)())
+    built = []
+    real = e2e_payload._Pad
+
+    class CountingPad(real):
+        __slots__ = ()
+
+        def __init__(self, seed):
+            built.append(seed)
+            super().__init__(seed)
+
+    monkeypatch.setattr(e2e_payload, "_Pad", CountingPad)
+    yield built
+    set_pad_cache_size(DEFAULT_PAD_CACHE_SEEDS)
+
+
+@pytest.mark.parametrize("version", [PATTERN_V2, PATTERN_V3])
+def test_interleaved_streams_generate_each_pad_once(pad_builds, version):
+    streams = [DeterministicStream(seed, SIZE, version) for seed in SEEDS]
+    out = {seed: bytearray() for seed in SEEDS}
+    for _ in range(0, SIZE, 256 * 1024):
+        for seed, stream in zip(SEEDS, streams):
+            out[seed] += stream.read(256 * 1024)
+
+    assert len(pad_builds) == len(set(pad_builds))
+    for seed in SEEDS:
+        assert bytes(out[seed]) == expected_bytes(seed, 0, SIZE, SIZE, version)
+    assert len(pad_builds) == len(set(pad_builds))
+
+
+def test_interleaved_ranges_within_cache_size(pad_builds):
+    set_pad_cache_size(len(SEEDS))
+    buf = bytearray(4096)
+    for off in range(0, SIZE - len(buf), CHUNK // 2):
+        for seed in SEEDS:
+            expected_into(buf, seed, off, SIZE, PATTERN_V2)
+            assert buf == expected_bytes(seed, off, len(buf), SIZE, PATTERN_V2)
+    assert sorted(pad_builds) == sorted(SEEDS)
+
+
+def test_shrinking_cache_evicts_unpinned_pads(pad_builds):
+    set_pad_cache_size(len(SEEDS))
+    for seed in SEEDS:
+        expected_bytes(seed, 0, 16, SIZE, PATTERN_V2)
+    set_pad_cache_size(2)
+    assert list(e2e_payload._PADS) == SEEDS[-2:]
+
+
+@pytest.mark.parametrize("version", [1, PATTERN_V2, PATTERN_V3])
+def test_readinto_matches_read(version):
+    seed = SEEDS[0]
+    a = DeterministicStream(seed, SIZE, version)
+    b = DeterministicStream(seed, SIZE, version)
+    buf = bytearray(300 * 1024)
+    while True:
+        n = b.readinto(buf)
+        data = a.read(len(buf))
+        assert bytes(buf[:n]) == bytes(data)
+        if not n:
+            break
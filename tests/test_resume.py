@@ -0,0 +1,76 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+
+from e2e_resume import DEFAULT_CHECKPOINT_FILE, CheckpointStore, checkpointed_run, parse_checkpoint_file
+
+FINGERPRINT = {"size_bytes": 1 << 30, "pattern_version": 1}
+
+
+def _runs(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["runs"]
+
+
+def test_checkpoints_are_opt_in():
+    # Without CHECKPOINT_FILE even huge runs keep the plain, uncheckpointed transfers
+    path = parse_checkpoint_file(DEFAULT_CHECKPOINT_FILE)
+    with checkpointed_run(path, 0, "sftp-s3", 1 << 40, {}) as run:
+        assert path is None and run.transfer("upload") is None
+
+
+def test_stores_sharing_a_file_merge_their_runs(tmp_path):
+    path = str(tmp_path / "cp.json")
+    a, b = CheckpointStore(path), CheckpointStore(path)
+    run_a = a.open_run("sftp-s3", FINGERPRINT)
+    run_b = b.open_run("s3-s3", FINGERPRINT)
+    run_a.transfer("upload").record("parts", "1", "etag-a")
+    run_b.transfer("copy").update(force=True, offset=10)
+    run_a.transfer("upload").update(force=True, offset=20)
+
+    runs = _runs(path)
+    assert runs[run_a.test_id]["transfers"]["upload"] == {"parts": {"1": "etag-a"}, "offset": 20}
+    assert runs[run_b.test_id]["transfers"]["copy"] == {"offset": 10}
+
+    # A finished run is removed without dropping the other store's run
+    a.close_run(run_a.test_id, ok=True)
+    b.save(force=True)
+    assert list(_runs(path)) == [run_b.test_id]
+
+
+def test_claimed_runs_are_not_resumed_elsewhere(tmp_path):
+    path = str(tmp_path / "cp.json")
+    a, b = CheckpointStore(path), CheckpointStore(path)
+    run = a.open_run("sftp-s3", FINGERPRINT)
+    run.transfer("upload").update(force=True, offset=5)
+    assert _runs(path)[run.test_id]["claim"] == {"host": socket.gethostname(), "pid": os.getpid()}
+
+    # Still open in a live process: a second process starts its own run
+    other = b.open_run("sftp-s3", FINGERPRINT)
+    assert not other.resumed and other.test_id != run.test_id
+    b.close_run(other.test_id, ok=True)
+
+    # Failed and released: the next process resumes it
+    a.close_run(run.test_id, ok=False)
+    assert "claim" not in _runs(path)[run.test_id]
+    resumed = CheckpointStore(path).open_run("sftp-s3", FINGERPRINT)
+    assert resumed.resumed and resumed.test_id == run.test_id
+    assert resumed.transfer("upload").state == {"offset": 5}
+
+
+def test_claims_of_dead_processes_are_ignored(tmp_path):
+    path = str(tmp_path / "cp.json")
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"format": 1, "runs": {"crashed": {
+            "route": "sftp-s3", "fingerprint": FINGERPRINT, "updated": 1.0,
+            "transfers": {"upload": {"offset": 7}},
+            "claim": {"host": socket.gethostname(), "pid": dead.pid},
+        }}}, f)
+
+    run = CheckpointStore(path).open_run("sftp-s3", FINGERPRINT)
+    assert run.resumed and run.test_id == "crashed"
+    assert _runs(path)["crashed"]["claim"]["pid"] == os.getpid()
@@ -0,0 +1,62 @@
+import os
+import time
+
+import paramiko
+import pytest
+
+from e2e_harness import LocalSFTPServer
+from e2e_sftp import SFTPConn, SFTPPool
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    root = tmp_path_factory.mktemp("sftp")
+    key = paramiko.RSAKey.generate(2048)
+    key_path = str(root / "id_rsa")
+    key.write_private_key_file(key_path)
+    os.makedirs(root / "files")
+    server = LocalSFTPServer(str(root / "files"), "e2e", key).start()
+    try:
+        yield SFTPConn("127.0.0.1", server.port, "e2e", key_path, None, "/")
+    finally:
+        server.close()
+
+
+def test_status_errors_keep_the_channel(conn):
+    pool = SFTPPool()
+    try:
+        for _ in range(3):
+            with pytest.raises(FileNotFoundError):
+                with pool.session(conn) as sftp:
+                    sftp.stat("/missing")
+        with pool.session(conn) as sftp:
+            sftp.listdir("/")
+        assert pool.stats() == {"handshakes": 1, "channels_opened": 1, "reuses": 3}
+    finally:
+        pool.close_all()
+
+
+def test_transport_errors_drop_the_channel(conn):
+    pool = SFTPPool()
+    try:
+        with pytest.raises(EOFError):
+            with pool.session(conn):
+                raise EOFError("connection lost")
+        with pool.session(conn) as sftp:
+            sftp.listdir("/")
+        assert pool.stats()["channels_opened"] == 2
+    finally:
+        pool.close_all()
+
+
+def test_idle_channels_are_evicted_on_acquire(conn):
+    pool = SFTPPool(idle_timeout_seconds=0.2)
+    try:
+        with pool.session(conn) as first:
+            pass
+        time.sleep(0.3)  # expires after release's eviction pass
+        with pool.session(conn) as second:
+            assert second is not first
+        assert first.get_channel().closed
+    finally:
+        pool.close_all()
@@ -0,0 +1,87 @@
+"""
+Streams a multi-GiB deterministic object into S3 (moto, in its own process)
+the way the S3 scripts create their source objects, and asserts the
+client's peak RSS stays within the planned part buffers plus a fixed
+allowance, i.e. does not grow with the object size.
+
+moto assembles a completed multipart upload in memory (about three times
+the object), which a multi-GiB object does not survive on a small host, so
+the upload is stopped at CompleteMultipartUpload: every part has been
+generated and sent by then; the parts moto holds are checked and the upload
+is aborted.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from conftest import AWS_ENV, ROOT
+
+GiB = 1024 ** 3
+MiB = 1024 ** 2
+SIZE = int(os.getenv("E2E_MEMORY_TEST_BYTES", str(3 * GiB)))
+MEMORY_BUDGET = 64 * MiB
+ALLOWANCE = 96 * MiB  # interpreter, botocore/urllib3 buffers, the pattern pad
+
+CLIENT = r"""
+import json, resource, sys
+import boto3
+from e2e_payload import expected_bytes
+from e2e_planner import UPLOAD, plan_multipart
+from e2e_transfer import s3_multipart_upload
+
+
+class StopAtComplete(Exception):
+    pass
+
+
+def peak_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+endpoint, size, budget = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+s3 = boto3.client("s3", endpoint_url=endpoint)
+s3.create_bucket(Bucket="mem")
+seed = b"m" * 32
+expected_bytes(seed, 0, 1, 1)  # warm the pattern pad
+baseline = peak_rss()
+result = {}
+
+
+def at_complete(params, **kwargs):
+    result["peak"] = peak_rss()
+    raise StopAtComplete()
+
+
+s3.meta.events.register("before-call.s3.CompleteMultipartUpload", at_complete)
+plan = plan_multipart(UPLOAD, size, memory_budget=budget)
+try:
+    s3_multipart_upload(s3, "mem", "obj", seed, size, plan.part_sizes, concurrency=plan.max_concurrency,
+                        initial_concurrency=plan.concurrency)
+except StopAtComplete:
+    pass
+upload_id = s3.list_multipart_uploads(Bucket="mem")["Uploads"][0]["UploadId"]
+parts = s3.list_parts(Bucket="mem", Key="obj", UploadId=upload_id, MaxParts=10000)["Parts"]
+s3.abort_multipart_upload(Bucket="mem", Key="obj", UploadId=upload_id)
+result.update(baseline=baseline, parts=len(parts), planned_parts=len(plan.part_sizes),
+              stored=sum(p["Size"] for p in parts), planned=plan.memory_bytes)
+print(json.dumps(result))
+"""
+
+
+def test_streaming_upload_peak_rss_is_bounded(moto_server):
+    env = dict(os.environ, **AWS_ENV, PYTHONPATH=ROOT)
+    env.pop("AWS_PROFILE", None)
+    out = subprocess.run([sys.executable, "-c", CLIENT, moto_server, str(SIZE), str(MEMORY_BUDGET)],
+                         env=env, cwd=ROOT, capture_output=True, text=True, timeout=1800)
+    assert out.returncode == 0, out.stderr[-4000:]
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+
+    assert result["parts"] == result["planned_parts"] > 1
+    assert result["stored"] == SIZE
+    assert result["planned"] <= MEMORY_BUDGET
+    growth = result["peak"] - result["baseline"]
+    assert growth <= MEMORY_BUDGET + ALLOWANCE, (
+        f"peak RSS grew {growth / MiB:.0f} MiB streaming {SIZE / GiB:.1f} GiB "
+        f"(bound {(MEMORY_BUDGET + ALLOWANCE) / MiB:.0f} MiB)")
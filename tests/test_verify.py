@@ -0,0 +1,47 @@
+import io
+
+import pytest
+from botocore.response import StreamingBody
+
+from e2e_payload import choose_offsets, expected_bytes
+from e2e_verify import s3_spot_check
+
+SEED = b"v" * 32
+SIZE = 3 * 1024 * 1024 + 17
+LENGTH = 64 * 1024
+
+
+@pytest.fixture
+def uploaded(s3):
+    s3.create_bucket(Bucket="spot")
+    s3.put_object(Bucket="spot", Key="k", Body=expected_bytes(SEED, 0, SIZE, SIZE))
+    return s3
+
+
+def test_spot_check_passes(uploaded):
+    offsets = choose_offsets(SIZE, 8, LENGTH, SEED)
+    assert s3_spot_check(uploaded, [("spot", "k")], SEED, offsets, LENGTH, SIZE)["checks"] == len(offsets)
+
+
+def test_spot_check_catches_corruption(uploaded):
+    data = bytearray(expected_bytes(SEED, 0, SIZE, SIZE))
+    data[SIZE // 2] ^= 0xFF
+    uploaded.put_object(Bucket="spot", Key="k", Body=bytes(data))
+    with pytest.raises(AssertionError, match="spot-check"):
+        s3_spot_check(uploaded, [("spot", "k")], SEED, [SIZE // 2 - 10], LENGTH, SIZE)
+
+
+class _IgnoresRange:
+    """Answers every GET with the whole object, as a server without Range support does."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def get_object(self, Bucket, Key, Range=None):
+        return {"Body": StreamingBody(io.BytesIO(self.data), len(self.data)), "ContentLength": len(self.data)}
+
+
+def test_spot_check_rejects_ignored_range():
+    s3 = _IgnoresRange(expected_bytes(SEED, 0, SIZE, SIZE))
+    with pytest.raises(AssertionError, match="spot-check"):
+        s3_spot_check(s3, [("spot", "k")], SEED, [0], LENGTH, SIZE)